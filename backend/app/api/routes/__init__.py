@@ -1,5 +1,5 @@
 """API routes package."""
 
-from . import health, tasks, projects, workflow, sync, session, notifications
+from . import health, tasks, projects, workflow, sync, session, notifications, jobs
 
-__all__ = ["health", "tasks", "projects", "workflow", "sync", "session", "notifications"]
+__all__ = ["health", "tasks", "projects", "workflow", "sync", "session", "notifications", "jobs"]
@@ -0,0 +1,119 @@
+"""Background job endpoints."""
+
+import asyncio
+import logging
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+
+from app.api.sse import sse_response
+from app.services.jobs import Job, jobs
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+def accepted(job: Job, deduplicated: bool) -> dict:
+    """Response body for an endpoint that started (or joined) a job."""
+    return {"success": True, **job.to_dict(), "deduplicated": deduplicated}
+
+
+@router.get("")
+async def list_jobs():
+    """List this worker's recent jobs, newest first."""
+    return {"jobs": [job.to_dict() for job in jobs.list()]}
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """Get a job's status."""
+    job = await jobs.lookup(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    job.pop("response", None)
+    return job
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Get what the endpoint that started the job would have returned."""
+    job = await jobs.lookup(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job["status"] in ("queued", "running"):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job['status']}")
+    if job["status"] == "cancelled":
+        raise HTTPException(status_code=409, detail=f"Job {job_id} was cancelled")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=400, detail=job["error"])
+    return job["response"]
+
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a job, killing its command if it is running."""
+    job = await jobs.cancel_anywhere(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@router.websocket("/{job_id}/output")
+async def follow_job_output_ws(websocket: WebSocket, job_id: str, after: int = 0):
+    """
+    WebSocket feed of a streamed job's output as the command prints it.
+
+    Protocol:
+    - Server sends {"type": "output", "lines": [{"seq", "stream", "text"}], "seq": n}:
+      output so far, then new lines as they are printed
+    - Server sends {"type": "skipped", "count": n} for lines no longer kept
+    - Server sends {"type": "end", ...job} when the job finishes, then closes
+    - Reconnect with ?after=<last seq> to receive only what was missed
+    - Server sends {"type": "error", "message": "..."} for an unknown job
+    """
+    await websocket.accept()
+
+    async def forward():
+        try:
+            async for message in jobs.follow_output(job_id, after):
+                await websocket.send_json(message)
+        except KeyError:
+            await websocket.send_json({"type": "error", "message": f"Job {job_id} not found"})
+        await websocket.close()
+
+    async def wait_for_disconnect():
+        # Clients never need to send anything; this just notices the close
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    try:
+        tasks = [asyncio.create_task(forward()), asyncio.create_task(wait_for_disconnect())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error("Job output WebSocket error: %s", e)
+
+
+@router.get("/{job_id}/output")
+async def follow_job_output_sse(request: Request, job_id: str, after: int = 0):
+    """
+    Server-Sent Events version of the /jobs/{job_id}/output WebSocket.
+
+    Same JSON messages as `data:` lines; output events carry `id: <seq>`, so
+    EventSource reconnects resume via Last-Event-ID.
+    """
+    if await jobs.lookup(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        after = int(last_event_id)
+    return sse_response(
+        jobs.follow_output(job_id, after), "seq",
+        errors=(KeyError,), error_message=lambda e: f"Job {job_id} not found",
+    )
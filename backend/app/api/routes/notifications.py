@@ -1,33 +1,42 @@
-"""WebSocket endpoint for real-time notifications."""
+"""WebSocket and SSE endpoints for real-time notifications."""
 
 import asyncio
 import logging
+from typing import Optional
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 
-from app.services.notifications import manager, notify
+from app.services.notifications import Subscription, manager, notify
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["notifications"])
 
 KEEPALIVE_INTERVAL = 30  # seconds
+SSE_HEARTBEAT_INTERVAL = 15  # seconds; comment frames keep proxies from timing out
+SSE_RETRY_MS = 3000
 
 
 @router.get("/api/notifications/debug")
 async def debug_notifications():
-    """Show connected WebSocket clients for debugging."""
+    """Show connected notification clients for debugging."""
     clients_info = []
-    for ws in manager._clients:
-        client = ws.client
-        clients_info.append(f"{client.host}:{client.port}" if client else "unknown")
-    return {"connected_clients": len(manager._clients), "clients": clients_info}
+    for client in manager.clients:
+        clients_info.append({
+            "address": client.address,
+            "transport": client.transport,
+            "queued": client.queued,
+            "sent": client.sent,
+            "dropped": client.dropped,
+        })
+    return {"connected_clients": len(clients_info), "clients": clients_info}
 
 
 @router.post("/api/notifications/test")
 async def test_notification():
-    """Broadcast a test notification to all connected WebSocket clients."""
-    clients = len(manager._clients)
+    """Broadcast a test notification to all connected clients."""
+    clients = len(manager.clients)
     await notify("test", detail="Test notification from ATW")
     return {"success": True, "message": "Test notification sent", "connected_clients": clients}
 
@@ -38,41 +47,114 @@ async def notifications_ws(websocket: WebSocket):
     WebSocket endpoint for real-time push notifications.
 
     Protocol:
-    - Server sends {"type": "connected"} on connect
+    - Server sends {"type": "connected", "seq": N} on connect; N is the latest
+      event sequence number
+    - Every event carries "seq". Reconnect with ?since=<last seen seq> to get
+      the missed events first, or {"type": "resync", "seq": N} if they are no
+      longer buffered (refetch state instead). A subscribe message may also
+      carry "since" to replay the gap under the new filters
     - Server sends {"type": "ping"} every 30s; client must reply {"type": "pong"}
-    - Server broadcasts notification events to all connected clients
+    - Client sends {"type": "subscribe", "task_ids": [...], "projects": [...],
+      "events": [...]} to receive only matching events (omitted or empty lists
+      match anything); server replies {"type": "subscribed", ...}
+    - Server broadcasts notification events to every client whose subscription
+      matches (all events until the client subscribes)
+    - workflow_state_change events are coalesced for
+      settings.notification_coalesce_window: one event per task with the
+      latest state ("merged": N when several were combined); events flushed
+      together arrive as {"type": "batch", "events": [...]}
     """
     await websocket.accept()
-    await manager.connect(websocket)
+    since = websocket.query_params.get("since")
+    client = await manager.connect(websocket)
 
     try:
-        await websocket.send_json({"type": "connected"})
+        # All sends go through the client's queue so they never interleave
+        client.send_json({"type": "connected", "seq": manager.last_seq})
+        if since is not None and since.isdigit():
+            manager.replay(client, int(since))
 
         async def keepalive():
-            while True:
+            while not client.closed:
                 await asyncio.sleep(KEEPALIVE_INTERVAL)
-                try:
-                    await websocket.send_json({"type": "ping"})
-                except Exception:
-                    break
+                client.send_json({"type": "ping"})
 
         async def receive_messages():
             while True:
                 try:
                     data = await websocket.receive_json()
+                    if data.get("type") == "subscribe":
+                        subscription = Subscription.from_message(data)
+                        manager.subscribe(client, subscription)
+                        client.send_json({"type": "subscribed", **subscription.to_dict()})
+                        if isinstance(data.get("since"), int):
+                            manager.replay(client, data["since"])
                     # Client pong or any other message - just keep connection alive
-                    if data.get("type") == "pong":
-                        continue
                 except WebSocketDisconnect:
                     break
                 except Exception:
                     break
 
-        await asyncio.gather(keepalive(), receive_messages(), return_exceptions=True)
+        keepalive_task = asyncio.create_task(keepalive())
+        try:
+            await receive_messages()
+        finally:
+            keepalive_task.cancel()
 
     except WebSocketDisconnect:
         pass
     except Exception as e:
         logger.error("Notification WebSocket error: %s", e)
     finally:
-        await manager.disconnect(websocket)
+        await manager.disconnect(client)
+
+
+def _query_list(request: Request, key: str) -> list[str]:
+    """Values of a repeated and/or comma-separated query parameter."""
+    return [v for raw in request.query_params.getlist(key) for v in raw.split(",") if v]
+
+
+@router.get("/api/notifications/stream")
+async def notifications_stream(request: Request, since: Optional[int] = None):
+    """
+    Server-Sent Events stream of the same notifications as /ws/notifications.
+
+    - Each event is a `data:` line with the same JSON as the WebSocket frames
+      (including connected, resync and batch); events carry `id: <seq>`
+    - Resumes from the Last-Event-ID header (sent by EventSource on reconnect)
+      or ?since=<seq>
+    - Filters: ?task_ids=..&projects=..&events=.. (repeated or comma-separated)
+    - A `: keepalive` comment is sent after 15s without events
+    """
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+
+    addr = request.client
+    client = await manager.connect_stream(f"{addr.host}:{addr.port}" if addr else "unknown")
+    manager.subscribe(client, Subscription.from_message({
+        key: _query_list(request, key) for key in ("task_ids", "projects", "events")
+    }))
+    client.send_json({"type": "connected", "seq": manager.last_seq})
+    if since is not None:
+        manager.replay(client, since)
+
+    async def stream():
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            while not client.closed:
+                item = await client.next(SSE_HEARTBEAT_INTERVAL)
+                if item is None:
+                    if not client.closed:
+                        yield ": keepalive\n\n"
+                    continue
+                seq, text = item
+                yield (f"id: {seq}\n" if seq is not None else "") + f"data: {text}\n\n"
+        finally:
+            await manager.disconnect(client)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,9 +1,12 @@
 """Project management endpoints."""
 
+import os
 from fastapi import APIRouter, HTTPException
 from typing import Optional
 
 from app.services.atw_client import atw_client
+from app.services.disk_usage import disk_usage
+from app.services.result_cache import result_cache
 
 router = APIRouter(prefix="/projects", tags=["projects"])
 
@@ -11,7 +14,7 @@ router = APIRouter(prefix="/projects", tags=["projects"])
 @router.get("")
 async def list_projects(domain: Optional[str] = None):
     """List all projects."""
-    result = atw_client.projects_list(domain=domain)
+    result = await result_cache.fetch("projects", atw_client.projects_list, domain=domain)
 
     if not result.success:
         raise HTTPException(status_code=500, detail=result.error)
@@ -22,9 +25,25 @@ async def list_projects(domain: Optional[str] = None):
 @router.get("/{name}")
 async def get_project(name: str):
     """Get project details."""
-    result = atw_client.project_show(name)
+    result = await result_cache.fetch("projects", atw_client.project_show, name)
 
     if not result.success:
         raise HTTPException(status_code=404, detail=result.error or "Project not found")
 
     return result.data
+
+
+@router.get("/{name}/usage")
+async def get_project_usage(name: str):
+    """Get disk usage of the project's resources folder."""
+    result = await result_cache.fetch("projects", atw_client.project_show, name)
+
+    if not result.success or not result.data:
+        raise HTTPException(status_code=404, detail=result.error or "Project not found")
+
+    resources_path = result.data.get("resources")
+    if not resources_path or not os.path.isdir(resources_path):
+        raise HTTPException(status_code=404, detail="Project has no resources folder")
+
+    usage = await disk_usage.usage(resources_path)
+    return {"project": name, "resources_path": resources_path, **usage}
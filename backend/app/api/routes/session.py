@@ -1,18 +1,28 @@
 """Interactive terminal session WebSocket endpoint."""
 
 import asyncio
+import codecs
 import fcntl
+import json
 import logging
 import os
 import pty
-import select
 import signal
 import struct
 import termios
 import time
-from typing import Optional
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Optional
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse
+
+from app.config import settings
+from app.services.ipc_bus import worker_bus
+from app.services.procfs import CpuSampler, read_process_stats
+from app.services.recording import SessionRecorder, list_recordings, recording_path, seek_recording
 
 logger = logging.getLogger(__name__)
 
@@ -22,19 +32,187 @@ router = APIRouter(tags=["session"])
 BUFFER_FLUSH_INTERVAL = 0.016  # ~60fps, smooth for TUI rendering
 BUFFER_MAX_SIZE = 16384  # Flush when buffer exceeds this size
 READ_CHUNK_SIZE = 8192  # Larger reads to reduce syscall overhead
+SCROLLBACK_MAX_SIZE = 256 * 1024  # Recent output kept per session for reattach
+
+# Flow control: while the writer has more than SESSION_BYTE_BUDGET bytes queued
+# (its socket is not draining) the PTY is not read, so the kernel buffer fills
+# and the child blocks. Reading resumes once the backlog halves. Viewers never
+# stall the session; past VIEWER_MAX_QUEUED they are resynced from scrollback.
+SESSION_BYTE_BUDGET = 1024 * 1024
+VIEWER_MAX_QUEUED = 1024 * 1024
+COALESCE_MAX_SIZE = 64 * 1024  # Queued chunks are merged into frames up to this size
+
+# Binary protocol (?encoding=binary): every binary frame starts with a one-byte
+# frame type; control messages (ready/exit/error) stay JSON text frames.
+FRAME_OUTPUT = 0x00  # Raw PTY bytes follow
+FRAME_REPLAY = 0x01  # Scrollback replayed on reattach; client resets its screen first
+# With &compress=deflate, frames carry raw-deflate data from one zlib stream per
+# connection, sync-flushed per frame: the window persists across frames, so
+# repetitive TUI redraws compress against earlier output.
+FRAME_OUTPUT_DEFLATE = 0x02
+FRAME_REPLAY_DEFLATE = 0x03
+COMPRESSION_METHODS = {"deflate"}
+# Client -> server binary frames: FRAME_INPUT byte + raw stdin bytes
+FRAME_INPUT = 0x00
+
+# Input is queued and written when the PTY is writable, so keystrokes and paste
+# chunks arriving together go out in one write. Past INPUT_MAX_PENDING the
+# socket is not read until the child catches up.
+INPUT_MAX_PENDING = 1024 * 1024
+MAX_TERMINAL_DIMENSION = 0xFFFF  # Largest rows/cols a resize may ask for
+
+# Process lifecycle
+STOP_TIMEOUT = 1.0  # Seconds to wait after SIGTERM (and again after SIGKILL)
+EXIT_POLL_INTERVAL = 0.25  # waitpid polling when pidfd_open is unavailable
+EXIT_CODE_WAIT = 1.0  # How long the exit frame waits for the child to be reaped
+IDLE_CHECK_INTERVAL = 60.0
+
+# Close code for a viewer whose session lives in another worker; reconnecting
+# may land on the right one
+CLOSE_SESSION_ELSEWHERE = 4409
+
+# Queued to a client's output queue to stop forwarding to that client
+_DETACHED = object()
+
+
+@dataclass
+class _Replay:
+    """Queue item asking the client to redraw from a scrollback snapshot."""
+
+    data: bytes
+
+
+class SessionClient:
+    """A WebSocket attached to a session: the single writer or a read-only viewer.
+
+    Queue items are output bytes, a _Replay, a JSON control dict, None (output
+    ended) or _DETACHED. Output bytes are accounted in ``queued_bytes``.
+    """
+
+    def __init__(self, writer: bool):
+        self.writer = writer
+        self.queued_bytes = 0
+        self.on_drain: Optional[Callable[[], None]] = None
+        self._items: deque = deque()
+        self._ready = asyncio.Event()
+
+    def put(self, item):
+        self._items.append(item)
+        if isinstance(item, bytes):
+            self.queued_bytes += len(item)
+        self._ready.set()
+
+    def clear(self):
+        self._items.clear()
+        self.queued_bytes = 0
+
+    async def get(self):
+        """Next item; consecutive output chunks are coalesced into one frame."""
+        while not self._items:
+            self._ready.clear()
+            await self._ready.wait()
+
+        item = self._items.popleft()
+        if isinstance(item, bytes):
+            parts = [item]
+            size = len(item)
+            while (
+                self._items
+                and isinstance(self._items[0], bytes)
+                and size + len(self._items[0]) <= COALESCE_MAX_SIZE
+            ):
+                part = self._items.popleft()
+                parts.append(part)
+                size += len(part)
+            self.queued_bytes -= size
+            if len(parts) > 1:
+                item = b"".join(parts)
+            if self.on_drain:
+                self.on_drain()
+        return item
+
+
+@dataclass
+class SessionMetrics:
+    """Output pipeline counters for one session."""
 
-# Active session registry for cleanup
-_active_sessions: dict[str, "TerminalSession"] = {}
+    bytes_read: int = 0
+    frames_flushed: int = 0
+    pauses: int = 0
+    paused_seconds: float = 0.0
+    viewer_resyncs: int = 0
+    compressed_in: int = 0
+    compressed_out: int = 0
+    compress_seconds: float = 0.0
+    bytes_written: int = 0
+    input_messages: int = 0
+    input_writes: int = 0
+
+
+class ScrollbackBuffer:
+    """Bounded ring of the most recent output chunks."""
+
+    def __init__(self, max_size: int = SCROLLBACK_MAX_SIZE):
+        self.max_size = max_size
+        self._chunks: deque[bytes] = deque()
+        self._size = 0
+
+    def append(self, data: bytes):
+        self._chunks.append(data)
+        self._size += len(data)
+        while self._size > self.max_size and len(self._chunks) > 1:
+            self._size -= len(self._chunks.popleft())
+        if self._size > self.max_size:
+            # A single chunk larger than the whole buffer: keep its tail
+            tail = self._chunks.pop()[-self.max_size:]
+            self._chunks.append(tail)
+            self._size = len(tail)
+
+    def snapshot(self) -> bytes:
+        return b"".join(self._chunks)
 
 
 class TerminalSession:
-    """Manages a PTY session for interactive terminal access."""
+    """Manages a PTY session for interactive terminal access.
 
-    def __init__(self, task_id: str):
+    The session outlives its WebSocket: when the client drops, output keeps
+    accumulating in the scrollback and the process is only stopped if no client
+    reattaches within ``settings.session_detach_grace`` seconds.
+    """
+
+    def __init__(self, task_id: str, record: bool = False):
         self.task_id = task_id
+        self.record = record
+        self.recorder: Optional[SessionRecorder] = None
         self.master_fd: Optional[int] = None
         self.pid: Optional[int] = None
         self.running = False
+        # Event-driven output path: the loop calls _on_readable when the PTY has
+        # data, chunks are coalesced in _buffer and flushed on a timer into the
+        # scrollback and every attached client's queue. The PTY is read once no
+        # matter how many clients watch.
+        self.clients: list[SessionClient] = []
+        self.scrollback = ScrollbackBuffer()
+        self._buffer = bytearray()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reading = False
+        self._paused_since: Optional[float] = None
+        self._expire_handle: Optional[asyncio.TimerHandle] = None
+        self.metrics = SessionMetrics()
+        # The child is reaped as soon as it exits (pidfd readable), not polled
+        self.exit_code: Optional[int] = None
+        self._exited: Optional[asyncio.Future] = None
+        self._pidfd: Optional[int] = None
+        self._poll_handle: Optional[asyncio.TimerHandle] = None
+        self._stop_task: Optional[asyncio.Task] = None
+        self._cpu = CpuSampler()
+        self._input = bytearray()
+        self._input_scheduled = False
+        self._input_waiting = False  # Writer callback registered for the PTY
+        self._input_drained = asyncio.Event()
+        self._input_drained.set()
+        self.last_activity = time.monotonic()
 
     def start(self) -> bool:
         """Start the PTY process."""
@@ -68,8 +246,15 @@ class TerminalSession:
             # Set non-blocking mode
             flags = fcntl.fcntl(master_fd, fcntl.F_GETFL)
             fcntl.fcntl(master_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
-            # Register in active sessions
-            _active_sessions[self.task_id] = self
+            if self.record:
+                try:
+                    self.recorder = SessionRecorder(self.task_id)
+                except (OSError, ValueError) as e:
+                    logger.warning("Cannot record session for task %s: %s", self.task_id, e)
+            self._loop = asyncio.get_running_loop()
+            self._exited = self._loop.create_future()
+            self._watch_exit()
+            session_manager.register(self)
             logger.info("Session started for task %s (pid=%d)", self.task_id, pid)
             return True
 
@@ -78,86 +263,340 @@ class TerminalSession:
         if self.master_fd:
             winsize = struct.pack("HHHH", rows, cols, 0, 0)
             fcntl.ioctl(self.master_fd, termios.TIOCSWINSZ, winsize)
+            if self.recorder:
+                self.recorder.resize(rows, cols)
 
     def write(self, data: bytes):
-        """Write data to the PTY."""
-        if self.master_fd and self.running:
-            os.write(self.master_fd, data)
+        """Queue input for the PTY; written on the next loop iteration."""
+        if not (self.master_fd and self.running and data):
+            return
+        self.metrics.input_messages += 1
+        self.last_activity = time.monotonic()
+        self._input += data
+        if len(self._input) > INPUT_MAX_PENDING:
+            self._input_drained.clear()
+        if not (self._input_scheduled or self._input_waiting):
+            self._input_scheduled = True
+            self._loop.call_soon(self._drain_input)
 
-    def read(self) -> Optional[bytes]:
-        """Read available data from the PTY."""
-        if not self.master_fd or not self.running:
-            return None
+    async def wait_input_drained(self):
+        """Block while more than INPUT_MAX_PENDING bytes are waiting for the PTY."""
+        await self._input_drained.wait()
+
+    def _drain_input(self):
+        """Write as much queued input as the PTY accepts in one call."""
+        self._input_scheduled = False
+        if not self.master_fd:
+            return
         try:
-            return os.read(self.master_fd, READ_CHUNK_SIZE)
-        except (OSError, IOError):
-            return None
+            written = os.write(self.master_fd, self._input) if self._input else 0
+        except BlockingIOError:
+            written = 0
+        except OSError:
+            self._input.clear()  # Child is gone
+            written = 0
+        if written:
+            del self._input[:written]
+            self.metrics.bytes_written += written
+            self.metrics.input_writes += 1
 
-    def read_all_available(self) -> Optional[bytes]:
-        """Read all currently available data from the PTY (drains buffer)."""
-        if not self.master_fd or not self.running:
-            return None
+        if self._input and not self._input_waiting:
+            # PTY input buffer is full: resume when the child reads
+            self._loop.add_writer(self.master_fd, self._drain_input)
+            self._input_waiting = True
+        elif not self._input and self._input_waiting:
+            self._loop.remove_writer(self.master_fd)
+            self._input_waiting = False
+        if len(self._input) <= INPUT_MAX_PENDING // 2:
+            self._input_drained.set()
 
-        chunks = []
-        total_size = 0
+    def _stop_input(self):
+        if self._input_waiting and self._loop and self.master_fd:
+            self._loop.remove_writer(self.master_fd)
+        self._input_waiting = False
+        self._input.clear()
+        self._input_drained.set()
 
-        while total_size < BUFFER_MAX_SIZE:
-            try:
-                # Check if data is available without blocking (timeout=0)
-                readable, _, _ = select.select([self.master_fd], [], [], 0)
-                if not readable:
-                    break
+    def start_reading(self):
+        """Register the PTY with the event loop; idle sessions cost no wakeups."""
+        if not self.master_fd or self._reading:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self.master_fd, self._on_readable)
+        self._reading = True
 
-                chunk = os.read(self.master_fd, READ_CHUNK_SIZE)
-                if not chunk:
-                    break
+    def _on_readable(self):
+        """Loop callback: read one chunk and schedule a flush."""
+        try:
+            data = os.read(self.master_fd, READ_CHUNK_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO: the child closed its side of the PTY
+            data = b""
+
+        if not data:
+            self._on_eof()
+            return
+
+        self.metrics.bytes_read += len(data)
+        self.last_activity = time.monotonic()
+        self._buffer += data
+        if len(self._buffer) >= BUFFER_MAX_SIZE:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(BUFFER_FLUSH_INTERVAL, self._flush)
+
+    def _flush(self):
+        """Move buffered output to the scrollback and fan it out as one frame."""
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._buffer:
+            data = bytes(self._buffer)
+            self._buffer.clear()
+            self.scrollback.append(data)
+            self.metrics.frames_flushed += 1
+            if self.recorder:
+                self.recorder.output(data)
+                if self.recorder.keyframe_due():
+                    self.recorder.keyframe(self.scrollback.snapshot())
+            for client in self.clients:
+                self._deliver(client, data)
+            self._apply_backpressure()
+
+    def _deliver(self, client: SessionClient, data: bytes):
+        """Queue output for one client, resyncing a viewer that has fallen behind."""
+        if client.writer or client.queued_bytes + len(data) <= VIEWER_MAX_QUEUED:
+            client.put(data)
+            return
+        # Too slow to keep up: drop its backlog and redraw from the scrollback,
+        # which already includes `data`.
+        client.clear()
+        client.put(_Replay(self.scrollback.snapshot()))
+        self.metrics.viewer_resyncs += 1
+
+    # -------------------- flow control --------------------
+
+    def _writer_backlog(self) -> int:
+        return sum(c.queued_bytes for c in self.clients if c.writer)
+
+    def _apply_backpressure(self):
+        """Pause or resume PTY reads based on the writer's unsent backlog."""
+        if not self._reading:
+            return
+        backlog = self._writer_backlog()
+        if self._paused_since is None and backlog >= SESSION_BYTE_BUDGET:
+            self._loop.remove_reader(self.master_fd)
+            self._paused_since = time.monotonic()
+            self.metrics.pauses += 1
+            logger.debug("Paused PTY reads for task %s (%d bytes queued)", self.task_id, backlog)
+        elif self._paused_since is not None and backlog <= SESSION_BYTE_BUDGET // 2:
+            self._resume_reading()
+
+    def _resume_reading(self):
+        if self._paused_since is None:
+            return
+        self.metrics.paused_seconds += time.monotonic() - self._paused_since
+        self._paused_since = None
+        if self._reading:
+            self._loop.add_reader(self.master_fd, self._on_readable)
+
+    @property
+    def paused(self) -> bool:
+        return self._paused_since is not None
+
+    def metrics_snapshot(self) -> dict:
+        paused_seconds = self.metrics.paused_seconds
+        if self._paused_since is not None:
+            paused_seconds += time.monotonic() - self._paused_since
+        return {
+            "bytes_read": self.metrics.bytes_read,
+            "frames_flushed": self.metrics.frames_flushed,
+            "bytes_queued": sum(c.queued_bytes for c in self.clients),
+            "paused": self.paused,
+            "pauses": self.metrics.pauses,
+            "paused_seconds": round(paused_seconds, 3),
+            "viewer_resyncs": self.metrics.viewer_resyncs,
+            "compression": {
+                "bytes_in": self.metrics.compressed_in,
+                "bytes_out": self.metrics.compressed_out,
+                "ratio": (
+                    round(self.metrics.compressed_in / self.metrics.compressed_out, 2)
+                    if self.metrics.compressed_out else None
+                ),
+                "cpu_ms": round(self.metrics.compress_seconds * 1000, 1),
+            },
+            "input": {
+                "messages": self.metrics.input_messages,
+                "writes": self.metrics.input_writes,
+                "bytes": self.metrics.bytes_written,
+                "pending": len(self._input),
+            },
+        }
+
+    def stop_reading(self):
+        """Detach from the loop, flush what is left and signal end of output."""
+        if not self._reading:
+            return
+        self._resume_reading()
+        self._reading = False
+        if self._loop and self.master_fd:
+            self._loop.remove_reader(self.master_fd)
+        self._flush()
+        for client in self.clients:
+            client.put(None)
+
+    def _on_eof(self):
+        """The child closed its side of the PTY: end output and clean up."""
+        self.stop_reading()
+        self.running = False
+        if not self.clients:
+            # Nobody attached to see the exit; clean up right away
+            self.request_stop()
+
+    def attach(self, writer: bool = True) -> tuple[SessionClient, bytes]:
+        """Attach a client and return it with the scrollback to replay first.
+
+        A new writer takes input control; the previous writer becomes a viewer.
+        """
+        if writer:
+            for other in self.clients:
+                if other.writer:
+                    other.writer = False
+                    other.put({"type": "role", "writer": False})
+        if self._expire_handle:
+            self._expire_handle.cancel()
+            self._expire_handle = None
+        client = SessionClient(writer=writer)
+        client.on_drain = self._apply_backpressure
+        self.clients.append(client)
+        self._apply_backpressure()
+        return client, self.scrollback.snapshot()
+
+    def detach(self, client: SessionClient):
+        """Detach a client; stop the process if nobody reattaches in time."""
+        if client not in self.clients:
+            return
+        self.clients.remove(client)
+        client.on_drain = None
+        client.put(_DETACHED)
+        self._apply_backpressure()
+        if not self.clients and self.running and self._loop:
+            grace = settings.session_detach_grace
+            self._expire_handle = self._loop.call_later(grace, self._expire)
+            logger.info("Session for task %s detached (grace %ds)", self.task_id, grace)
 
-                chunks.append(chunk)
-                total_size += len(chunk)
-            except (OSError, IOError):
-                break
+    def _expire(self):
+        self._expire_handle = None
+        if not self.clients:
+            logger.info("Session for task %s expired without reattach", self.task_id)
+            self.request_stop()
 
-        return b"".join(chunks) if chunks else None
+    @property
+    def attached(self) -> bool:
+        return bool(self.clients)
 
     def is_alive(self) -> bool:
         """Check if the process is still running."""
-        if self.pid is None:
-            return False
+        return self.pid is not None and self._exited is not None and not self._exited.done()
+
+    # -------------------- process lifecycle --------------------
+
+    def _watch_exit(self):
+        """Get notified when the child exits: pidfd on Linux 5.3+, else polling."""
+        try:
+            self._pidfd = os.pidfd_open(self.pid)
+        except (AttributeError, OSError):
+            self._pidfd = None
+        if self._pidfd is not None:
+            self._loop.add_reader(self._pidfd, self._reap)
+        else:
+            self._poll_handle = self._loop.call_later(EXIT_POLL_INTERVAL, self._reap)
+
+    def _unwatch_exit(self):
+        if self._pidfd is not None:
+            self._loop.remove_reader(self._pidfd)
+            os.close(self._pidfd)
+            self._pidfd = None
+        if self._poll_handle:
+            self._poll_handle.cancel()
+            self._poll_handle = None
+
+    def _reap(self):
+        """Collect the child's exit status without blocking."""
         try:
             pid, status = os.waitpid(self.pid, os.WNOHANG)
-            if pid == self.pid:
-                self.running = False
-                return False
-            return True
         except ChildProcessError:
-            self.running = False
-            return False
+            pid, status = self.pid, None  # Reaped elsewhere; status is lost
+        if pid == 0:
+            if self._pidfd is None:
+                self._poll_handle = self._loop.call_later(EXIT_POLL_INTERVAL, self._reap)
+            return
 
-    def stop(self):
-        """Stop the terminal session."""
+        self._unwatch_exit()
         self.running = False
-        if self.pid:
-            try:
-                os.kill(self.pid, signal.SIGTERM)
-                # Give process time to terminate gracefully
-                for _ in range(20):
-                    time.sleep(0.05)
-                    try:
-                        pid, _ = os.waitpid(self.pid, os.WNOHANG)
-                        if pid == self.pid:
-                            break
-                    except ChildProcessError:
-                        break
-                else:
-                    # Force kill if still running after 1s
-                    try:
-                        os.kill(self.pid, signal.SIGKILL)
-                        os.waitpid(self.pid, 0)
-                    except (ProcessLookupError, ChildProcessError):
-                        pass
-            except (ProcessLookupError, ChildProcessError):
-                pass
+        if status is not None:
+            self.exit_code = os.waitstatus_to_exitcode(status)
+        if not self._exited.done():
+            self._exited.set_result(self.exit_code)
+        logger.info("Process for task %s exited (code=%s)", self.task_id, self.exit_code)
+
+    async def wait_exit(self, timeout: float) -> Optional[int]:
+        """Exit code once the child is reaped, or None if it is still running."""
+        if self._exited is None:
+            return self.exit_code
+        try:
+            await asyncio.wait_for(asyncio.shield(self._exited), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.exit_code
+
+    def process_stats(self) -> Optional[dict]:
+        """CPU and memory use of the session's process, from /proc."""
+        if not self.is_alive():
+            return None
+        stats = read_process_stats(self.pid)
+        if stats is None:
+            return None
+        return {
+            "cpu_seconds": round(stats.cpu_seconds, 2),
+            "cpu_percent": self._cpu.sample(stats),
+            "rss_bytes": stats.rss_bytes,
+            "uptime_seconds": round(stats.uptime_seconds, 1),
+        }
+
+    def request_stop(self) -> asyncio.Task:
+        """Start stopping the session (idempotent) and return the stop task."""
+        if self._stop_task is None:
+            self._stop_task = asyncio.ensure_future(self._stop())
+        return self._stop_task
+
+    async def stop(self):
+        """Stop the terminal session and wait until the process is reaped."""
+        # Shielded: a cancelled caller must not leave a half-stopped session
+        await asyncio.shield(self.request_stop())
+
+    async def _stop(self):
+        self.running = False
+        if self._expire_handle:
+            self._expire_handle.cancel()
+            self._expire_handle = None
+        self.stop_reading()
+        if self.is_alive():
+            # Ask politely, then force; each signal gets STOP_TIMEOUT to take
+            for sig in (signal.SIGTERM, signal.SIGKILL):
+                try:
+                    os.kill(self.pid, sig)
+                except ProcessLookupError:
+                    break
+                await self.wait_exit(STOP_TIMEOUT)
+                if not self.is_alive():
+                    break
             logger.info("Session stopped for task %s (pid=%s)", self.task_id, self.pid)
+        if self._loop:
+            self._unwatch_exit()
+        self._stop_input()
         if self.master_fd:
             try:
                 os.close(self.master_fd)
@@ -165,17 +604,127 @@ class TerminalSession:
                 pass
         self.master_fd = None
         self.pid = None
-        # Remove from active sessions
-        _active_sessions.pop(self.task_id, None)
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+        session_manager.unregister(self)
 
 
-def _blocking_select(fd: int, timeout: float) -> bool:
-    """Blocking select wrapper to run in executor. Returns True if readable."""
-    try:
-        readable, _, _ = select.select([fd], [], [], timeout)
-        return bool(readable)
-    except (ValueError, OSError):
-        return False
+class SessionManager:
+    """Registry of live sessions: admission cap, idle reaping and shutdown."""
+
+    def __init__(self):
+        self._sessions: dict[str, TerminalSession] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    def get(self, task_id: str) -> Optional[TerminalSession]:
+        return self._sessions.get(task_id)
+
+    def items(self) -> list[tuple[str, TerminalSession]]:
+        return list(self._sessions.items())
+
+    def register(self, session: TerminalSession):
+        self._sessions[session.task_id] = session
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_idle())
+
+    def unregister(self, session: TerminalSession):
+        if self._sessions.get(session.task_id) is session:
+            self._sessions.pop(session.task_id, None)
+
+    async def make_room(self) -> bool:
+        """Check a new session fits under the cap, evicting a detached one if needed."""
+        live = [s for s in self._sessions.values() if s.is_alive()]
+        if len(live) < settings.max_terminal_sessions:
+            return True
+        detached = sorted((s for s in live if not s.attached), key=lambda s: s.last_activity)
+        if not detached:
+            return False
+        logger.info("Session limit reached; stopping detached session for task %s", detached[0].task_id)
+        await detached[0].stop()
+        return True
+
+    async def _reap_idle(self):
+        """Stop sessions without input or output for settings.session_idle_timeout."""
+        while self._sessions:
+            await asyncio.sleep(IDLE_CHECK_INTERVAL)
+            timeout = settings.session_idle_timeout
+            if timeout <= 0:
+                continue
+            now = time.monotonic()
+            idle = [s for s in self._sessions.values() if now - s.last_activity > timeout]
+            for sess in idle:
+                logger.info("Stopping session for task %s after %ds idle", sess.task_id, timeout)
+            await asyncio.gather(*(s.stop() for s in idle), return_exceptions=True)
+
+    async def stop_all(self):
+        """Stop every session concurrently."""
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        sessions = list(self._sessions.values())
+        await asyncio.gather(*(s.stop() for s in sessions), return_exceptions=True)
+        self._sessions.clear()
+
+
+session_manager = SessionManager()
+
+
+class OutputEncoder:
+    """Turns PTY output chunks into WebSocket frames for one client."""
+
+    def __init__(
+        self,
+        binary: bool,
+        compress: Optional[str] = None,
+        metrics: Optional[SessionMetrics] = None,
+    ):
+        self.binary = binary
+        self.compress = compress if binary and compress in COMPRESSION_METHODS else None
+        self.metrics = metrics
+        # Incremental so multibyte characters split across chunks survive
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._compressor = None
+        if self.compress == "deflate":
+            self._compressor = zlib.compressobj(settings.terminal_compression_level, zlib.DEFLATED, -15)
+
+    def _binary_frame(self, frame_type: int, compressed_type: int, data: bytes) -> bytes:
+        if self._compressor is None:
+            return bytes((frame_type,)) + data
+        started = time.thread_time()
+        payload = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if self.metrics:
+            self.metrics.compress_seconds += time.thread_time() - started
+            self.metrics.compressed_in += len(data)
+            self.metrics.compressed_out += len(payload)
+        return bytes((compressed_type,)) + payload
+
+    def encode(self, data: bytes, final: bool = False) -> Optional[bytes | dict]:
+        """Return a binary frame, a JSON message, or None if nothing to send yet."""
+        if self.binary:
+            return self._binary_frame(FRAME_OUTPUT, FRAME_OUTPUT_DEFLATE, data) if data else None
+        text = self._decoder.decode(data, final=final)
+        return {"type": "output", "data": text} if text else None
+
+    def encode_replay(self, data: bytes) -> bytes | dict:
+        """Frame scrollback as a single replay message."""
+        if self.binary:
+            return self._binary_frame(FRAME_REPLAY, FRAME_REPLAY_DEFLATE, data)
+        # Live output resumes after the snapshot; drop any half-decoded character
+        self._decoder.reset()
+        return {"type": "replay", "data": data.decode("utf-8", errors="replace")}
+
+
+def _valid_dimension(value) -> bool:
+    """A terminal size the TIOCSWINSZ struct (unsigned shorts) can hold."""
+    return isinstance(value, int) and not isinstance(value, bool) and 0 < value <= MAX_TERMINAL_DIMENSION
+
+
+async def _send_frame(websocket: WebSocket, frame: bytes | dict):
+    if isinstance(frame, bytes):
+        await websocket.send_bytes(frame)
+    else:
+        await websocket.send_json(frame)
 
 
 @router.websocket("/ws/session/{task_id}")
@@ -186,142 +735,200 @@ async def terminal_session(websocket: WebSocket, task_id: str):
     Protocol:
     - Client sends JSON: {"type": "input", "data": "..."} for stdin
     - Client sends JSON: {"type": "resize", "rows": N, "cols": N} for resize
-    - Server sends JSON: {"type": "output", "data": "..."} for stdout/stderr
-    - Server sends JSON: {"type": "exit", "code": N} when process exits
-    - Server sends JSON: {"type": "ready", "task_id": "..."} when session starts
+    - Client may instead send stdin as a binary frame: FRAME_INPUT byte + raw
+      bytes (no JSON or UTF-8 round trip)
+    - Server sends JSON: {"type": "output", "data": "..."} for stdout/stderr, or
+      with ?encoding=binary a binary frame: FRAME_OUTPUT byte + raw PTY bytes
+    - Client sends JSON: {"type": "stop"} to end the session (closing the socket
+      without it only detaches; the process survives for a grace period)
+    - Server sends JSON: {"type": "exit", "code": N} when process exits (negative
+      N: killed by that signal; null if it could not be reaped in time)
+    - Server sends JSON: {"type": "ready", "task_id": "...", "resumed": bool,
+      "writer": bool, "compress": "deflate" | null} when the session starts or
+      is reattached
+    - With ?encoding=binary&compress=deflate, output/replay frames use
+      FRAME_OUTPUT_DEFLATE/FRAME_REPLAY_DEFLATE: one raw-deflate stream per
+      connection, sync-flushed at the end of every frame
+    - Server sends JSON: {"type": "replay", "data": "..."} (binary: FRAME_REPLAY
+      frame) with buffered scrollback after a resumed ready, or when the client
+      fell too far behind the live stream
+    - Server sends JSON: {"type": "role", "writer": false} when another writer
+      takes input control
     - Server sends JSON: {"type": "error", "message": "..."} on error
+    - ?record=1 / ?record=0 overrides settings.session_recording for a newly
+      started session
+    - A viewer whose session runs in another worker gets an error and close
+      code CLOSE_SESSION_ELSEWHERE; a writer replaces that session instead
+
+    Several clients can share one session: the most recent one connected
+    without ?mode=view is the writer (input, resize, stop); the rest are
+    read-only viewers. Viewers never start a process.
     """
     await websocket.accept()
+    binary = websocket.query_params.get("encoding") == "binary"
+    compress = websocket.query_params.get("compress")
+    writer = websocket.query_params.get("mode") != "view"
+    record_param = websocket.query_params.get("record")
+    record = settings.session_recording if record_param is None else record_param in ("1", "true")
 
-    # Kill any existing session for this task
-    existing = _active_sessions.get(task_id)
-    if existing:
-        logger.info("Killing existing session for task %s", task_id)
-        existing.stop()
+    # Reattach to a live session for this task, or start a fresh one
+    session = session_manager.get(task_id)
+    resumed = session is not None and session.is_alive()
+    if session and not resumed:
+        await session.stop()
 
-    session = TerminalSession(task_id)
+    if not resumed:
+        # This socket cannot reach a session in another worker
+        remote = await _find_remote_session(task_id)
+        if remote is not None and not writer:
+            await websocket.send_json({
+                "type": "error",
+                "message": f"Session for task {task_id} is running in worker {remote['worker']}",
+            })
+            await websocket.close(code=CLOSE_SESSION_ELSEWHERE)
+            return
+        if remote is not None:
+            # A new writer replaces the old session, so only one process runs per task
+            logger.info("Killing session for task %s in worker %s", task_id, remote["worker"])
+            await worker_bus.request("sessions.kill", task_id, timeout=5.0)
+
+    if not resumed and not writer:
+        await websocket.send_json({"type": "error", "message": "No active session to view"})
+        await websocket.close()
+        return
+
+    if not resumed:
+        if not await session_manager.make_room():
+            await websocket.send_json({
+                "type": "error",
+                "message": f"Too many active sessions (limit {settings.max_terminal_sessions})",
+            })
+            await websocket.close()
+            return
+        session = TerminalSession(task_id, record=record)
+
+    encoder = OutputEncoder(binary=binary, compress=compress, metrics=session.metrics)
+    client: Optional[SessionClient] = None
+    stop_requested = False
 
     try:
         # Start the terminal process
-        if not session.start():
+        if not resumed and not session.start():
             await websocket.send_json({"type": "error", "message": "Failed to start session"})
             await websocket.close()
             return
 
-        # Send initial ready message
-        await websocket.send_json({"type": "ready", "task_id": task_id})
-
-        async def read_output():
-            """Read output from PTY and send to WebSocket with buffering."""
-            loop = asyncio.get_event_loop()
-            output_buffer = []
-            last_flush_time = time.monotonic()
+        client, replay = session.attach(writer=writer)
+        if resumed:
+            logger.info(
+                "Client attached to session for task %s as %s (%d clients)",
+                task_id, "writer" if writer else "viewer", len(session.clients),
+            )
 
-            while session.running:
-                if not session.master_fd:
-                    break
+        # Send initial ready message, then the scrollback in one frame
+        await websocket.send_json({
+            "type": "ready",
+            "task_id": task_id,
+            "resumed": resumed,
+            "writer": writer,
+            "compress": encoder.compress,
+        })
+        if resumed and replay:
+            await _send_frame(websocket, encoder.encode_replay(replay))
 
-                try:
-                    # Use run_in_executor to avoid blocking the event loop.
-                    # This allows handle_input() to process resize/input messages
-                    # while we wait for PTY data.
-                    has_data = await loop.run_in_executor(
-                        None, _blocking_select, session.master_fd, BUFFER_FLUSH_INTERVAL
-                    )
-
-                    if has_data:
-                        # read_all_available uses select with timeout=0 (non-blocking)
-                        data = session.read_all_available()
-                        if data:
-                            output_buffer.append(data)
-
-                    current_time = time.monotonic()
-                    buffer_size = sum(len(chunk) for chunk in output_buffer)
-                    time_since_flush = current_time - last_flush_time
-
-                    # Flush buffer if:
-                    # 1. Buffer has data AND enough time has passed, OR
-                    # 2. Buffer exceeds max size
-                    should_flush = output_buffer and (
-                        time_since_flush >= BUFFER_FLUSH_INTERVAL or
-                        buffer_size >= BUFFER_MAX_SIZE
-                    )
-
-                    if should_flush:
-                        combined_data = b"".join(output_buffer)
-                        output_buffer.clear()
-                        last_flush_time = current_time
-
-                        await websocket.send_json({
-                            "type": "output",
-                            "data": combined_data.decode("utf-8", errors="replace"),
-                        })
-
-                except (ValueError, OSError):
-                    break
+        async def read_output():
+            """Forward this client's share of the PTY output to the WebSocket."""
+            session.start_reading()
 
-                # Check if process exited on its own
-                if not session.is_alive():
-                    # Flush any remaining buffered output
-                    if output_buffer:
-                        combined_data = b"".join(output_buffer)
-                        await websocket.send_json({
-                            "type": "output",
-                            "data": combined_data.decode("utf-8", errors="replace"),
-                        })
-                    await websocket.send_json({"type": "exit", "code": 0})
+            while True:
+                item = await client.get()
+                if item is _DETACHED:
                     return
+                if item is None:
+                    break
+                if isinstance(item, _Replay):
+                    frame = encoder.encode_replay(item.data)
+                elif isinstance(item, dict):
+                    frame = item
+                else:
+                    frame = encoder.encode(item)
+                if frame is not None:
+                    await _send_frame(websocket, frame)
 
-            # Loop exited because session.running was set to False (stop requested
-            # or WebSocket disconnect). Flush remaining output and notify client.
-            if output_buffer:
-                try:
-                    combined_data = b"".join(output_buffer)
-                    await websocket.send_json({
-                        "type": "output",
-                        "data": combined_data.decode("utf-8", errors="replace"),
-                    })
-                except Exception:
-                    pass
+            # Output ended: either the process exited on its own or a stop was
+            # requested (stop message or WebSocket disconnect).
             try:
-                await websocket.send_json({"type": "exit", "code": 0})
+                frame = encoder.encode(b"", final=True)
+                if frame is not None:
+                    await _send_frame(websocket, frame)
+                code = await session.wait_exit(EXIT_CODE_WAIT)
+                await websocket.send_json({"type": "exit", "code": code})
             except Exception:
                 pass
 
         async def handle_input():
-            """Handle input from WebSocket."""
-            while session.running:
-                try:
-                    message = await asyncio.wait_for(
-                        websocket.receive_json(), timeout=0.1
-                    )
+            """Handle input from WebSocket.
+
+            Blocks on the socket; cancelled once output ends instead of
+            waking periodically to check whether the session is still running.
+            """
+            nonlocal stop_requested
+            try:
+                while True:
+                    # Hold off reading while the child is not consuming its input
+                    await session.wait_input_drained()
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        raise WebSocketDisconnect(message.get("code", 1000))
+
+                    if message.get("bytes") is not None:
+                        frame = message["bytes"]
+                        if client.writer and frame[:1] == bytes([FRAME_INPUT]):
+                            session.write(frame[1:])
+                        continue
+
+                    try:
+                        message = json.loads(message.get("text") or "{}")
+                    except json.JSONDecodeError:
+                        continue
+                    if not isinstance(message, dict):
+                        continue  # One bad frame must not drop the connection
                     msg_type = message.get("type")
 
+                    if msg_type in ("input", "resize", "stop") and not client.writer:
+                        # Viewers are read-only
+                        continue
+
                     if msg_type == "input":
                         data = message.get("data", "")
-                        if data:
+                        if isinstance(data, str) and data:
                             session.write(data.encode("utf-8"))
 
                     elif msg_type == "resize":
                         rows = message.get("rows", 24)
                         cols = message.get("cols", 80)
-                        session.resize(rows, cols)
+                        if _valid_dimension(rows) and _valid_dimension(cols):
+                            session.resize(rows, cols)
 
                     elif msg_type == "stop":
-                        # Signal read_output to exit; actual process cleanup
-                        # happens in the finally block of terminal_session.
-                        session.running = False
-                        break
-
-                except asyncio.TimeoutError:
-                    continue
-                except WebSocketDisconnect:
-                    break
-                except Exception:
-                    break
+                        # Ends output for every client; read_output then
+                        # reports the exit code of the reaped process.
+                        stop_requested = True
+                        await session.stop()
+                        return
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Disconnect: keep the process for a reattach
+                session.detach(client)
 
-        # Run both tasks concurrently
-        await asyncio.gather(read_output(), handle_input(), return_exceptions=True)
+        # Output ends on exit, stop or detach; that also ends input handling
+        input_task = asyncio.create_task(handle_input())
+        try:
+            await read_output()
+        finally:
+            input_task.cancel()
+            await asyncio.gather(input_task, return_exceptions=True)
 
     except WebSocketDisconnect:
         pass
@@ -331,40 +938,119 @@ async def terminal_session(websocket: WebSocket, task_id: str):
         except Exception:
             pass
     finally:
-        session.stop()
+        if stop_requested or not session.is_alive():
+            await session.stop()
+        elif client is not None:
+            # Dropped connection: keep the process for a reattach
+            session.detach(client)
         try:
             await websocket.close()
         except Exception:
             pass
 
 
-@router.get("/api/sessions")
-async def list_sessions():
-    """List active terminal sessions."""
+def _local_sessions() -> list[dict]:
     sessions = []
-    for task_id, sess in list(_active_sessions.items()):
+    for task_id, sess in session_manager.items():
         alive = sess.is_alive()
         sessions.append({
             "task_id": task_id,
+            "worker": os.getpid(),
             "pid": sess.pid,
             "alive": alive,
+            "attached": sess.attached,
+            "clients": len(sess.clients),
+            "recording": sess.recorder.name if sess.recorder else None,
+            "exit_code": sess.exit_code,
+            "idle_seconds": round(time.monotonic() - sess.last_activity, 1),
+            "process": sess.process_stats(),
+            "metrics": sess.metrics_snapshot(),
         })
+    return sessions
+
+
+async def _remote_list(_payload) -> list[dict]:
+    return _local_sessions()
+
+
+async def _find_remote_session(task_id: str) -> Optional[dict]:
+    """The live session for a task in another worker, if any."""
+    for remote in await worker_bus.request("sessions.list"):
+        for sess in remote or []:
+            if sess["task_id"] == task_id and sess["alive"]:
+                return sess
+    return None
+
+
+async def _remote_kill(task_id: str) -> Optional[str]:
+    sess = session_manager.get(task_id)
+    if not sess:
+        return None
+    await sess.stop()
+    return "killed"
+
+
+# Sessions live in the worker that spawned them; other workers reach them over the bus
+worker_bus.on_request("sessions.list", _remote_list)
+worker_bus.on_request("sessions.kill", _remote_kill)
+
+
+@router.get("/api/sessions")
+async def list_sessions():
+    """List active terminal sessions (of every worker)."""
+    sessions = _local_sessions()
+    for remote in await worker_bus.request("sessions.list"):
+        sessions.extend(remote or [])
     return {"sessions": sessions}
 
 
+@router.get("/api/sessions/recordings")
+async def get_recordings(task_id: Optional[str] = None):
+    """List session recordings, newest first."""
+    recordings = await asyncio.to_thread(list_recordings, task_id)
+    return {"recordings": recordings}
+
+
+@router.get("/api/sessions/recordings/{task_id}/{name}")
+async def download_recording(task_id: str, name: str):
+    """Full asciicast v2 file, for players that stream it from the start."""
+    path = recording_path(task_id, name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Recording not found")
+    return FileResponse(path, media_type="application/x-asciicast", filename=path.name)
+
+
+@router.get("/api/sessions/recordings/{task_id}/{name}/seek")
+async def seek_session_recording(
+    task_id: str,
+    name: str,
+    t: float = Query(0.0, ge=0, description="Position in seconds"),
+    duration: float = Query(30.0, gt=0, le=600, description="Seconds of events to return"),
+):
+    """Screen contents at `t` plus the events that follow.
+
+    Starts from the nearest keyframe instead of replaying from the beginning,
+    so seeking costs the same anywhere in the recording.
+    """
+    path = recording_path(task_id, name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Recording not found")
+    return await asyncio.to_thread(seek_recording, path, t, duration)
+
+
 @router.delete("/api/sessions/{task_id}")
 async def kill_session(task_id: str):
     """Kill a specific terminal session."""
-    sess = _active_sessions.get(task_id)
+    sess = session_manager.get(task_id)
     if not sess:
+        if "killed" in await worker_bus.request("sessions.kill", task_id, timeout=5.0):
+            return {"status": "killed", "task_id": task_id}
         return {"status": "not_found"}
-    sess.stop()
+    await sess.stop()
     return {"status": "killed", "task_id": task_id}
 
 
 async def cleanup_all_sessions():
-    """Stop all active sessions. Called on app shutdown."""
-    for task_id, sess in list(_active_sessions.items()):
-        logger.info("Cleaning up session for task %s", task_id)
-        sess.stop()
-    _active_sessions.clear()
+    """Stop all active sessions in parallel. Called on app shutdown."""
+    logger.info("Cleaning up %d sessions", len(session_manager.items()))
+    await session_manager.stop_all()
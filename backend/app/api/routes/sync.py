@@ -1,10 +1,12 @@
 """Sync endpoints."""
 
-import asyncio
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter
 from pydantic import BaseModel
 
-from app.services.atw_client import atw_client
+from app.api.routes.jobs import accepted
+from app.services.atw_client import ATWResult, atw_client
+from app.services.jobs import jobs
+from app.services.result_cache import result_cache
 
 router = APIRouter(prefix="/sync", tags=["sync"])
 
@@ -15,30 +17,33 @@ class SyncOptions(BaseModel):
     from_remote: bool = False
 
 
-@router.post("/data")
-async def sync_data(options: SyncOptions = SyncOptions()):
-    """Sync data folder."""
-    # Run in thread pool to avoid blocking the event loop (can take up to 120s)
-    result = await asyncio.to_thread(
-        atw_client.sync_data,
-        options.dry_run,
-        options.to_remote,
-        options.from_remote,
-    )
-
-    if not result.success:
-        raise HTTPException(status_code=400, detail=result.error)
-
+async def _synced(result: ATWResult) -> dict:
+    await result_cache.invalidate()
     return {"success": True, "output": result.raw_output}
 
 
-@router.post("/tasks")
-async def sync_tasks():
-    """Sync tasks from Odoo."""
-    # Run in thread pool to avoid blocking the event loop (can take up to 120s)
-    result = await asyncio.to_thread(atw_client.sync_tasks)
+@router.post("/data", status_code=202)
+async def sync_data(options: SyncOptions = SyncOptions()):
+    """Sync data folder (as a background job)."""
+    job, deduplicated = jobs.submit(
+        "sync_data",
+        atw_client.sync_data_command(options.dry_run, options.to_remote, options.from_remote),
+        label="Data sync",
+        on_success=_synced,
+        stream=True,
+        notice={"event_type": "async_task_complete", "detail": "Data synced"},
+    )
+    return accepted(job, deduplicated)
 
-    if not result.success:
-        raise HTTPException(status_code=400, detail=result.error)
 
-    return {"success": True, "output": result.raw_output}
+@router.post("/tasks", status_code=202)
+async def sync_tasks():
+    """Sync tasks from Odoo (as a background job)."""
+    job, deduplicated = jobs.submit(
+        "sync_tasks",
+        atw_client.sync_tasks_command(),
+        label="Task sync",
+        on_success=_synced,
+        notice={"event_type": "async_task_complete", "detail": "Tasks synced"},
+    )
+    return accepted(job, deduplicated)
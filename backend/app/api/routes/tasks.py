@@ -1,15 +1,24 @@
 """Task management endpoints."""
 
 import asyncio
+import logging
 import os
+import zipfile
 from pathlib import Path
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import FileResponse, PlainTextResponse
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from typing import Optional, List
 from pydantic import BaseModel
 
-from app.services.atw_client import atw_client
+from app.api.routes.jobs import accepted
+from app.services.atw_client import ATWResult, atw_client
+from app.services.disk_usage import disk_usage
+from app.services.file_watcher import file_watchers, FileChange
+from app.services.jobs import jobs
 from app.services.notifications import notify
+from app.services.result_cache import result_cache
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
 
@@ -50,7 +59,9 @@ async def list_tasks(
     limit: int = Query(default=100, le=500),
 ):
     """List tasks with optional filters."""
-    result = atw_client.tasks_list(
+    result = await result_cache.fetch(
+        "tasks",
+        atw_client.tasks_list,
         project=project,
         status=status,
         task_type=type,
@@ -67,7 +78,7 @@ async def list_tasks(
 @router.get("/dashboard")
 async def get_dashboard(progress: bool = False):
     """Get kanban-style dashboard data grouped by workflow state."""
-    result = atw_client.tasks_dashboard(show_progress=progress)
+    result = await result_cache.fetch("tasks", atw_client.tasks_dashboard, show_progress=progress)
 
     if not result.success:
         raise HTTPException(status_code=500, detail=result.error)
@@ -78,7 +89,7 @@ async def get_dashboard(progress: bool = False):
 @router.get("/summary")
 async def get_summary():
     """Get detailed statistics for dashboards."""
-    result = atw_client.tasks_summary()
+    result = await result_cache.fetch("tasks", atw_client.tasks_summary)
 
     if not result.success:
         raise HTTPException(status_code=500, detail=result.error)
@@ -89,7 +100,7 @@ async def get_summary():
 @router.get("/blocked")
 async def get_blocked():
     """Get blocked tasks with their blockers."""
-    result = atw_client.tasks_blocked()
+    result = await result_cache.fetch("tasks", atw_client.tasks_blocked)
 
     if not result.success:
         raise HTTPException(status_code=500, detail=result.error)
@@ -112,13 +123,14 @@ async def register_task(body: TaskRegisterRequest):
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("tasks", "projects")
     return {"success": True, "message": "Task registered", "data": result.data}
 
 
 @router.get("/{task_id}")
 async def get_task_detail(task_id: str):
     """Get detailed task information."""
-    result = atw_client.task_detail(task_id)
+    result = await result_cache.fetch("tasks", atw_client.task_detail, task_id)
 
     if not result.success:
         raise HTTPException(status_code=404, detail=result.error or "Task not found")
@@ -134,6 +146,7 @@ async def approve_task(task_id: str):
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("tasks", "workflow")
     await notify("workflow_state_change", task_id=task_id, new_status="ready", detail="Task approved")
     return {"success": True, "message": f"Task {task_id} approved"}
 
@@ -146,6 +159,7 @@ async def reset_task(task_id: str):
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("tasks", "workflow")
     await notify("workflow_state_change", task_id=task_id, new_status="redo", detail="Task reset")
     return {"success": True, "message": f"Task {task_id} reset to REDO"}
 
@@ -158,6 +172,7 @@ async def finish_task(task_id: str):
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("tasks", "workflow")
     await notify("workflow_state_change", task_id=task_id, new_status="conclude", detail="Task set to conclude")
     return {"success": True, "message": f"Task {task_id} set to CONCLUDE"}
 
@@ -170,6 +185,7 @@ async def workflow_approve(task_id: str):
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("tasks", "workflow")
     await notify("workflow_state_change", task_id=task_id, detail="Workflow approved")
     return {"success": True, "message": f"Task {task_id} workflow approved"}
 
@@ -182,6 +198,7 @@ async def mark_done(task_id: str):
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("tasks", "workflow")
     await notify("workflow_state_change", task_id=task_id, new_status="done", detail="Task completed")
     return {"success": True, "message": f"Task {task_id} marked as done"}
 
@@ -194,6 +211,7 @@ async def set_priority(task_id: str, body: PriorityUpdate):
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("tasks", "workflow")
     return {"success": True, "message": f"Task {task_id} priority set to {body.priority}"}
 
 
@@ -205,20 +223,27 @@ async def set_type(task_id: str, body: TypeUpdate):
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("tasks", "workflow")
     return {"success": True, "message": f"Task {task_id} type set to {body.type}"}
 
 
-@router.post("/{task_id}/categorize")
+@router.post("/{task_id}/categorize", status_code=202)
 async def categorize_task(task_id: str):
-    """Run AI categorization on task."""
-    # Run in thread pool to avoid blocking the event loop (can take up to 60s)
-    result = await asyncio.to_thread(atw_client.task_categorize, task_id)
-
-    if not result.success:
-        raise HTTPException(status_code=400, detail=result.error)
-
-    await notify("async_task_complete", task_id=task_id, detail="Task categorized")
-    return {"success": True, "message": f"Task {task_id} categorized", "output": result.raw_output}
+    """Run AI categorization on task (as a background job)."""
+
+    async def categorized(result: ATWResult) -> dict:
+        await result_cache.invalidate("tasks")
+        return {"success": True, "message": f"Task {task_id} categorized", "output": result.raw_output}
+
+    job, deduplicated = jobs.submit(
+        "categorize",
+        atw_client.task_categorize_command(task_id),
+        task_id=task_id,
+        label="Categorization",
+        on_success=categorized,
+        notice={"event_type": "async_task_complete", "detail": "Task categorized"},
+    )
+    return accepted(job, deduplicated)
 
 
 @router.delete("/{task_id}")
@@ -229,6 +254,7 @@ async def delete_task(task_id: str):
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate()
     return {"success": True, "message": f"Task {task_id} deleted"}
 
 
@@ -286,6 +312,26 @@ def _list_directory(base_path: str, relative_path: str = "") -> List[FileInfo]:
     return files
 
 
+def _stat_file_info(base_path: str, relative_path: str) -> Optional[FileInfo]:
+    """Build FileInfo for a single path, or None if it no longer exists."""
+    full_path = os.path.join(base_path, relative_path)
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        return None
+
+    is_dir = os.path.isdir(full_path)
+    name = os.path.basename(relative_path)
+    return FileInfo(
+        name=name,
+        path=relative_path,
+        type="directory" if is_dir else "file",
+        size=0 if is_dir else stat.st_size,
+        extension="" if is_dir else Path(name).suffix.lower(),
+        modified=stat.st_mtime,
+    )
+
+
 @router.get("/{task_id}/files")
 async def list_task_files(task_id: str, path: str = ""):
     """
@@ -373,6 +419,36 @@ async def read_task_file(task_id: str, path: str):
     }
 
 
+@router.get("/{task_id}/files/usage")
+async def get_task_files_usage(task_id: str, path: str = ""):
+    """
+    Disk usage of task's resources folder from the background usage index.
+
+    Args:
+        task_id: The task identifier
+        path: Relative directory within resources folder (optional, defaults to root)
+
+    Returns:
+        Total size and file count, plus per-subdirectory totals
+    """
+    resources_path = _get_task_resources_path(task_id)
+
+    if path:
+        # Security: Normalize and check for path traversal
+        normalized = os.path.normpath(path)
+        if normalized.startswith('..') or os.path.isabs(normalized):
+            raise HTTPException(status_code=400, detail="Invalid path")
+
+    if not os.path.isdir(resources_path):
+        raise HTTPException(status_code=404, detail="Resources folder not found")
+
+    usage = await disk_usage.usage(resources_path, path)
+    if usage is None:
+        raise HTTPException(status_code=404, detail="Directory not found")
+
+    return {"task_id": task_id, "resources_path": resources_path, **usage}
+
+
 IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".bmp", ".ico"}
 MIME_TYPES = {
     ".png": "image/png",
@@ -425,3 +501,236 @@ async def read_task_file_raw(task_id: str, path: str):
     media_type = MIME_TYPES.get(ext, "application/octet-stream")
 
     return FileResponse(full_path, media_type=media_type)
+
+
+# ==================== Archive Download ====================
+
+ARCHIVE_CHUNK_SIZE = 64 * 1024  # Read/flush granularity for streamed archives
+
+# Formats that are already compressed; deflating them again only burns CPU
+STORED_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar",
+    ".mp3", ".mp4", ".mkv", ".mov", ".webm", ".ogg",
+    ".pdf", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".jar", ".whl",
+}
+
+
+class _ZipStreamBuffer:
+    """Write-only sink for ZipFile that hands out written bytes on demand.
+
+    It has no ``tell``/``seek``, so ZipFile treats it as unseekable and writes
+    data descriptors after each entry instead of seeking back to patch headers.
+    """
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _iter_archive_entries(root: str):
+    """Yield (full_path, archive_name, stat) for every visible file under root."""
+    stack = [""]
+    while stack:
+        relative = stack.pop()
+        directory = os.path.join(root, relative) if relative else root
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except (PermissionError, FileNotFoundError):
+            continue
+        for entry in entries:
+            if entry.name.startswith('.') or entry.name == '__pycache__':
+                continue
+            rel_path = os.path.join(relative, entry.name) if relative else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(rel_path)
+                elif entry.is_file(follow_symlinks=False):
+                    # Symlinks are skipped: they may point outside the task folder
+                    yield entry.path, rel_path, entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+
+
+def _stream_zip(root: str):
+    """Build a ZIP archive of root incrementally, yielding bytes as they are produced.
+
+    Memory use is bounded by ARCHIVE_CHUNK_SIZE (plus the deflate window) no
+    matter how large the folder is, and nothing is written to disk.
+    """
+    sink = _ZipStreamBuffer()
+    with zipfile.ZipFile(sink, mode="w", allowZip64=True) as archive:
+        for full_path, arcname, stat in _iter_archive_entries(root):
+            # Files deleted or made unreadable since the walk are left out
+            try:
+                info = zipfile.ZipInfo.from_file(full_path, arcname)
+                src = open(full_path, "rb")
+            except OSError:
+                continue
+            # Known up front so zipfile can choose ZIP64 headers for huge files
+            info.file_size = stat.st_size
+            if Path(arcname).suffix.lower() in STORED_EXTENSIONS:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+
+            with src, archive.open(info, mode="w") as dest:
+                while chunk := src.read(ARCHIVE_CHUNK_SIZE):
+                    dest.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+
+    # Central directory is written on close
+    data = sink.drain()
+    if data:
+        yield data
+
+
+@router.get("/{task_id}/files/archive")
+async def download_task_archive(task_id: str, path: str = ""):
+    """
+    Stream a ZIP archive of a folder in task's resources.
+
+    The archive is generated while it is being sent, so arbitrarily large
+    folders are exported without temp files or buffering the whole archive.
+
+    Args:
+        task_id: The task identifier
+        path: Relative path of the folder within resources (optional, defaults to root)
+
+    Returns:
+        Streaming application/zip response
+    """
+    resources_path = _get_task_resources_path(task_id)
+
+    full_path = resources_path
+    if path:
+        # Security: Normalize and check for path traversal
+        normalized = os.path.normpath(path)
+        if normalized.startswith('..') or os.path.isabs(normalized):
+            raise HTTPException(status_code=400, detail="Invalid path")
+        full_path = os.path.join(resources_path, normalized)
+
+    if not os.path.exists(full_path):
+        raise HTTPException(status_code=404, detail="Folder not found")
+
+    if not os.path.isdir(full_path):
+        raise HTTPException(status_code=400, detail="Path is not a directory")
+
+    folder_name = os.path.basename(os.path.normpath(path)) if path else "resources"
+    filename = f"{task_id}-{folder_name}.zip"
+
+    # Sync generator: Starlette iterates it in the thread pool, keeping file I/O
+    # and compression off the event loop.
+    return StreamingResponse(
+        _stream_zip(full_path),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# ==================== Live File Changes ====================
+
+CLOSE_NOT_FOUND = 4404  # Close code when the task or its resources folder does not exist
+
+
+def _serialize_change(resources_path: str, change: FileChange) -> dict:
+    file_info = None
+    if change.event in ("created", "modified"):
+        file_info = _stat_file_info(resources_path, change.path)
+    return {
+        "event": change.event,
+        "path": change.path,
+        "file": file_info.model_dump() if file_info else None,
+    }
+
+
+@router.websocket("/{task_id}/files/watch")
+async def watch_task_files(websocket: WebSocket, task_id: str):
+    """
+    WebSocket feed of changes in task's resources folder.
+
+    Protocol:
+    - Server sends {"type": "ready", "task_id": "..."} once the watch is active
+    - Server sends {"type": "changes", "changes": [{"event", "path", "file"}]} per
+      debounced batch; event is "created", "modified", "deleted" or "resync"
+      ("resync" means events were lost and the client should re-list)
+    - Server sends {"type": "error", "message": "..."} if the watch cannot start;
+      the close code is CLOSE_NOT_FOUND when the task or its resources folder
+      does not exist
+    """
+    await websocket.accept()
+
+    try:
+        resources_path = await asyncio.to_thread(_get_task_resources_path, task_id)
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "message": e.detail})
+        await websocket.close(code=CLOSE_NOT_FOUND)
+        return
+
+    # Watching is read-only: the folder is not created here
+    if not await asyncio.to_thread(os.path.isdir, resources_path):
+        await websocket.send_json({"type": "error", "message": "Resources folder not found"})
+        await websocket.close(code=CLOSE_NOT_FOUND)
+        return
+
+    try:
+        watcher = file_watchers.acquire(resources_path)
+    except OSError as e:
+        logger.error("Cannot watch %s: %s", resources_path, e)
+        await websocket.send_json({"type": "error", "message": f"Cannot watch resources: {e}"})
+        await websocket.close()
+        return
+
+    queue = watcher.subscribe()
+
+    async def forward_changes():
+        while True:
+            changes = await queue.get()
+            await websocket.send_json({
+                "type": "changes",
+                "changes": [_serialize_change(resources_path, c) for c in changes],
+            })
+
+    async def wait_for_disconnect():
+        # Clients never need to send anything; this just notices the close
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    try:
+        await websocket.send_json({"type": "ready", "task_id": task_id})
+        tasks = [
+            asyncio.create_task(forward_changes()),
+            asyncio.create_task(wait_for_disconnect()),
+        ]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error("File watch WebSocket error: %s", e)
+    finally:
+        watcher.unsubscribe(queue)
+        file_watchers.release(watcher)
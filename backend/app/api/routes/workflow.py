@@ -1,15 +1,28 @@
 """Workflow and executor endpoints."""
 
 import asyncio
-from fastapi import APIRouter, HTTPException
+import logging
+import os
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from typing import Optional
 from pydantic import BaseModel
 
-from app.services.atw_client import atw_client
+from app.api.routes.jobs import accepted
+from app.api.sse import sse_response
+from app.config import settings
+from app.services.atw_client import ATWResult, atw_client
+from app.services.executor_probe import executor_probe
+from app.services.jobs import jobs
+from app.services.log_index import log_indexer, parse_level
+from app.services.log_tail import follow
 from app.services.notifications import notify
+from app.services.queue_analytics import queue_analytics
+from app.services.result_cache import result_cache
 
-router = APIRouter(tags=["workflow"])
+logger = logging.getLogger(__name__)
 
+router = APIRouter(tags=["workflow"])
 
 class WorkflowRunOptions(BaseModel):
     restart: bool = False
@@ -30,13 +43,28 @@ class TimesheetRequest(BaseModel):
 
 @router.get("/workflow/queue")
 async def get_queue():
-    """Get workflow queue status."""
-    result = atw_client.workflow_queue()
+    """Get workflow queue status, with wait times and estimated start/finish per task."""
+    result = await result_cache.fetch("workflow", atw_client.workflow_queue)
 
     if not result.success:
         raise HTTPException(status_code=500, detail=result.error)
 
-    return result.data
+    if not isinstance(result.data, dict) or not isinstance(result.data.get("queue"), list):
+        return result.data
+    try:
+        executor = await executor_probe.status()
+        queue_analytics.observe_executor(executor)
+    except RuntimeError:
+        executor = None  # No estimates without knowing the executor's slots
+    items = result.data["queue"]
+    queue_analytics.observe_queue(items)
+    return {**result.data, "queue": queue_analytics.estimate(items, executor)}
+
+
+@router.get("/workflow/queue/stats")
+async def get_queue_stats():
+    """Rolling throughput, wait and run times, overall and per workflow type."""
+    return queue_analytics.stats()
 
 
 @router.delete("/workflow/queue")
@@ -47,13 +75,14 @@ async def clear_queue():
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("workflow", "tasks")
     return {"success": True, "message": "Queue cleared"}
 
 
 @router.get("/workflow/types")
 async def get_workflow_types():
     """Get workflow types with enabled/disabled status."""
-    result = atw_client.workflow_types()
+    result = await result_cache.fetch("workflow", atw_client.workflow_types)
 
     if not result.success:
         raise HTTPException(status_code=500, detail=result.error)
@@ -64,7 +93,7 @@ async def get_workflow_types():
 @router.get("/workflow/status/{task_id}")
 async def get_workflow_status(task_id: str):
     """Get workflow status for a task."""
-    result = atw_client.workflow_status(task_id)
+    result = await result_cache.fetch("workflow", atw_client.workflow_status, task_id)
 
     if not result.success:
         raise HTTPException(status_code=404, detail=result.error)
@@ -83,6 +112,7 @@ async def run_workflow(task_id: str, options: WorkflowRunOptions = WorkflowRunOp
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("tasks", "workflow", "executor")
     await notify("workflow_state_change", task_id=task_id, new_status="queued", detail="Workflow started")
     return {"success": True, "message": f"Workflow started for {task_id}"}
 
@@ -95,6 +125,7 @@ async def stop_workflow(task_id: str):
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("tasks", "workflow", "executor")
     await notify("workflow_state_change", task_id=task_id, new_status="planning", detail="Workflow stopped")
     return {"success": True, "message": f"Workflow stopped for {task_id}"}
 
@@ -107,6 +138,7 @@ async def workflow_done(task_id: str):
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("tasks", "workflow", "executor")
     await notify("workflow_state_change", task_id=task_id, new_status="done", detail="Task marked done")
     return {"success": True, "message": f"Task {task_id} marked as done"}
 
@@ -119,6 +151,7 @@ async def workflow_pass(task_id: str):
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("tasks", "workflow")
     await notify("workflow_state_change", task_id=task_id, new_status="conclude", detail="Testing passed")
     return {"success": True, "message": f"Task {task_id} testing passed"}
 
@@ -131,42 +164,56 @@ async def workflow_fail(task_id: str, body: FailReason = FailReason()):
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("tasks", "workflow")
     await notify("workflow_state_change", task_id=task_id, new_status="redo", detail="Testing failed")
     return {"success": True, "message": f"Task {task_id} testing failed"}
 
 
-@router.post("/workflow/fix/{task_id}")
+@router.post("/workflow/fix/{task_id}", status_code=202)
 async def workflow_fix(task_id: str):
-    """AI-powered diagnosis and fix for stuck or broken tasks."""
-    # Run in thread pool to avoid blocking the event loop (can take up to 120s)
-    result = await asyncio.to_thread(atw_client.workflow_fix, task_id)
-
-    if not result.success:
-        raise HTTPException(status_code=400, detail=result.error)
-
-    await notify("async_task_complete", task_id=task_id, detail="AI fix completed")
-    return {"success": True, "message": f"Task {task_id} fixed", "output": result.raw_output}
+    """AI-powered diagnosis and fix for stuck or broken tasks (as a background job)."""
+
+    async def fixed(result: ATWResult) -> dict:
+        await result_cache.invalidate("tasks", "workflow")
+        return {"success": True, "message": f"Task {task_id} fixed", "output": result.raw_output}
+
+    job, deduplicated = jobs.submit(
+        "workflow_fix",
+        atw_client.workflow_fix_command(task_id),
+        task_id=task_id,
+        label="AI fix",
+        on_success=fixed,
+        stream=True,
+        notice={"event_type": "async_task_complete", "detail": "AI fix completed"},
+    )
+    return accepted(job, deduplicated)
 
 
-@router.post("/workflow/timesheet/{task_id}")
+@router.post("/workflow/timesheet/{task_id}", status_code=202)
 async def workflow_timesheet(task_id: str, body: TimesheetRequest):
-    """Generate timesheets from work done on a task."""
-    # Run in thread pool to avoid blocking the event loop (can take up to 120s)
-    result = await asyncio.to_thread(
-        atw_client.workflow_timesheet, task_id, body.prompt, body.dry_run
+    """Generate timesheets from work done on a task (as a background job)."""
+
+    async def generated(result: ATWResult) -> dict:
+        return {
+            "success": True,
+            "message": f"Timesheet created for task {task_id}" if not body.dry_run else "Dry run completed",
+            "output": result.raw_output,
+            "dry_run": body.dry_run,
+        }
+
+    job, deduplicated = jobs.submit(
+        "timesheet",
+        atw_client.workflow_timesheet_command(task_id, body.prompt, body.dry_run),
+        task_id=task_id,
+        label="Timesheet",
+        on_success=generated,
+        stream=True,
+        notice={
+            "event_type": "async_task_complete",
+            "detail": "Timesheet dry run completed" if body.dry_run else "Timesheet created",
+        },
     )
-
-    if not result.success:
-        raise HTTPException(status_code=400, detail=result.error)
-
-    if not body.dry_run:
-        await notify("async_task_complete", task_id=task_id, detail="Timesheet created")
-    return {
-        "success": True,
-        "message": f"Timesheet created for task {task_id}" if not body.dry_run else "Dry run completed",
-        "output": result.raw_output,
-        "dry_run": body.dry_run,
-    }
+    return accepted(job, deduplicated)
 
 
 # ==================== Executor ====================
@@ -174,13 +221,13 @@ async def workflow_timesheet(task_id: str, body: TimesheetRequest):
 
 @router.get("/executor/status")
 async def get_executor_status():
-    """Get executor status with running tasks."""
-    result = atw_client.executor_status()
-
-    if not result.success:
-        raise HTTPException(status_code=500, detail=result.error)
-
-    return result.data
+    """Get executor status with running tasks, plus CPU, RSS and uptime from /proc."""
+    try:
+        status = await executor_probe.status()
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    queue_analytics.observe_executor(status)
+    return status
 
 
 @router.post("/executor/start")
@@ -191,6 +238,8 @@ async def start_executor():
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("executor")
+    executor_probe.invalidate()
     return {"success": True, "message": "Executor started"}
 
 
@@ -202,46 +251,124 @@ async def stop_executor_task(task_id: str):
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("tasks", "workflow", "executor")
+    executor_probe.invalidate()
     return {"success": True, "message": f"Task {task_id} stopped"}
 
 
 @router.post("/executor/stop")
 async def stop_executor():
     """Stop the workflow executor."""
-    result = atw_client.executor_stop()
+    try:
+        pid = await executor_probe.pid()
+    except RuntimeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if pid is None:
+        return {"success": True, "message": "Executor is not running"}
+
+    result = atw_client.executor_stop(pid)
 
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await result_cache.invalidate("executor")
+    executor_probe.invalidate()
     return {"success": True, "message": "Executor stopped"}
 
 
-@router.post("/executor/run-all")
+@router.post("/executor/run-all", status_code=202)
 async def run_all_tasks():
-    """Queue all pending tasks for execution."""
-    # Run in thread pool to avoid blocking the event loop (can take up to 60s)
-    result = await asyncio.to_thread(atw_client.executor_run_all)
-
-    if not result.success:
-        raise HTTPException(status_code=400, detail=result.error)
-
-    await notify("workflow_state_change", new_status="queued", detail="All tasks queued")
-    return {"success": True, "message": "All tasks queued", "output": result.raw_output}
+    """Queue all pending tasks for execution (as a background job)."""
+
+    async def queued(result: ATWResult) -> dict:
+        await result_cache.invalidate("tasks", "workflow", "executor")
+        return {"success": True, "message": "All tasks queued", "output": result.raw_output}
+
+    job, deduplicated = jobs.submit(
+        "run_all",
+        atw_client.executor_run_all_command(),
+        label="Queue all tasks",
+        on_success=queued,
+        notice={"event_type": "workflow_state_change", "new_status": "queued", "detail": "All tasks queued"},
+    )
+    return accepted(job, deduplicated)
 
 
 # ==================== Logs ====================
 
 
-@router.get("/workflow/logs")
-async def get_workflow_logs(lines: int = 100):
-    """Get workflow logs."""
-    result = atw_client.workflow_logs(lines)
+def _parse_time(value: Optional[str], name: str) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: expected an ISO 8601 time")
 
-    if not result.success:
-        raise HTTPException(status_code=500, detail=result.error)
 
-    # Return raw output as logs are plain text
-    return {"logs": result.raw_output}
+@router.get("/workflow/logs")
+async def get_workflow_logs(
+    lines: int = 100,
+    before: Optional[int] = Query(default=None, ge=0, description="Page of lines before this line number"),
+    after: Optional[int] = Query(default=None, ge=0, description="Page of lines after this line number"),
+    since: Optional[str] = Query(default=None, description="ISO 8601 start time"),
+    until: Optional[str] = Query(default=None, description="ISO 8601 end time"),
+    level: Optional[str] = Query(default=None, description="Minimum level, e.g. warning"),
+    task_id: Optional[str] = None,
+):
+    """
+    Get workflow logs.
+
+    With ATW_WEB_WORKFLOW_LOG_PATH set, pages come from the line index: the
+    last `lines` matching lines (or those before/after a line number), filtered
+    by time range, minimum level and task. The response adds `entries` with
+    each line's number, offset and parsed fields, and `prev`/`next` cursors.
+    Otherwise, or while the index is being rebuilt after a failure, the last
+    `lines` lines come from the CLI and filters are refused.
+    """
+    filtered = any(v is not None for v in (before, after, since, until, level, task_id))
+    index = None
+    if settings.workflow_log_path:
+        index = await log_indexer.get(_workflow_log_path())
+        if index is None and filtered:
+            raise HTTPException(status_code=503, detail="Workflow log index is being rebuilt; try again shortly")
+    if index is None:
+        if filtered:
+            raise HTTPException(
+                status_code=400, detail="Log filters need ATW_WEB_WORKFLOW_LOG_PATH to be configured"
+            )
+        result = await asyncio.to_thread(atw_client.workflow_logs, lines)
+
+        if not result.success:
+            raise HTTPException(status_code=500, detail=result.error)
+
+        # Return raw output as logs are plain text
+        return {"logs": result.raw_output}
+
+    try:
+        min_level = parse_level(level) if level else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        page = await asyncio.to_thread(
+            index.query,
+            before=before,
+            after=after,
+            limit=max(lines, 0),
+            since=_parse_time(since, "since"),
+            until=_parse_time(until, "until"),
+            level=min_level,
+            task_id=task_id,
+        )
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Cannot read workflow log: {e}")
+    return {
+        "logs": "\n".join(entry["text"] for entry in page["lines"]),
+        "entries": page["lines"],
+        "total_lines": page["total_lines"],
+        "prev": page["prev"],
+        "next": page["next"],
+    }
 
 
 @router.delete("/workflow/logs")
@@ -252,4 +379,91 @@ async def clear_workflow_logs():
     if not result.success:
         raise HTTPException(status_code=400, detail=result.error)
 
+    await log_indexer.reset()
     return {"success": True, "message": "Logs cleared"}
+
+
+def _workflow_log_path() -> str:
+    if not settings.workflow_log_path:
+        raise HTTPException(
+            status_code=404, detail="Workflow log file not configured (ATW_WEB_WORKFLOW_LOG_PATH)"
+        )
+    path = os.path.expanduser(settings.workflow_log_path)
+    if not os.path.isdir(os.path.dirname(path) or "."):
+        raise HTTPException(status_code=404, detail="Workflow log directory not found")
+    return path
+
+
+@router.websocket("/workflow/logs/follow")
+async def follow_workflow_logs_ws(
+    websocket: WebSocket,
+    lines: int = Query(default=100, ge=0, le=5000),
+    offset: Optional[int] = None,
+):
+    """
+    WebSocket feed of lines appended to the workflow log.
+
+    Protocol:
+    - Server sends {"type": "backfill", "lines": [...], "offset": n} first: the
+      last `lines` lines (replace the view). Sent again if the client falls behind
+    - Server sends {"type": "lines", "lines": [...], "offset": n} as the file grows
+    - Server sends {"type": "reset"} when the log is cleared or rotated
+    - Reconnect with ?offset=<last offset> to receive only what was missed
+    - Server sends {"type": "error", "message": "..."} if the log cannot be followed
+    """
+    await websocket.accept()
+    try:
+        path = _workflow_log_path()
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "message": e.detail})
+        await websocket.close()
+        return
+
+    async def forward():
+        try:
+            async for message in follow(path, lines, offset):
+                await websocket.send_json(message)
+        except OSError as e:
+            logger.error("Cannot follow %s: %s", path, e)
+            await websocket.send_json({"type": "error", "message": f"Cannot follow workflow log: {e}"})
+
+    async def wait_for_disconnect():
+        # Clients never need to send anything; this just notices the close
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    try:
+        tasks = [asyncio.create_task(forward()), asyncio.create_task(wait_for_disconnect())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error("Workflow log follow WebSocket error: %s", e)
+
+
+@router.get("/workflow/logs/follow")
+async def follow_workflow_logs_sse(
+    request: Request,
+    lines: int = Query(default=100, ge=0, le=5000),
+    offset: Optional[int] = None,
+):
+    """
+    Server-Sent Events version of the /workflow/logs/follow WebSocket.
+
+    Same JSON messages as `data:` lines; backfill and lines events carry
+    `id: <offset>`, so EventSource reconnects resume via Last-Event-ID.
+    """
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        offset = int(last_event_id)
+    return sse_response(
+        follow(_workflow_log_path(), lines, offset), "offset",
+        errors=(OSError,), error_message=lambda e: f"Cannot follow workflow log: {e}",
+    )
@@ -0,0 +1,60 @@
+"""Server-Sent Events responses for follow endpoints."""
+
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Callable
+
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+SSE_HEARTBEAT_INTERVAL = 15  # seconds; comment frames keep proxies from timing out
+SSE_RETRY_MS = 3000
+
+
+def sse_response(
+    messages: AsyncIterator[dict[str, Any]],
+    id_field: str,
+    errors: tuple[type[Exception], ...] = (),
+    error_message: Callable[[Exception], str] = str,
+) -> StreamingResponse:
+    """Stream a follow generator's messages as SSE `data:` lines.
+
+    Messages with `id_field` carry it as `id:`, so EventSource reconnects
+    resume via Last-Event-ID. An exception of one of `errors` from the
+    generator ends the stream with {"type": "error", "message": ...}. The
+    generator is closed when the stream ends or the client goes away.
+    """
+
+    async def stream():
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        # One read is always outstanding so keepalives can go out meanwhile
+        pending = asyncio.ensure_future(messages.__anext__())
+        try:
+            while True:
+                done, _ = await asyncio.wait({pending}, timeout=SSE_HEARTBEAT_INTERVAL)
+                if not done:
+                    yield ": keepalive\n\n"
+                    continue
+                try:
+                    message = pending.result()
+                except StopAsyncIteration:
+                    return
+                except errors as e:
+                    logger.error("SSE stream ended: %s", e)
+                    yield f"data: {json.dumps({'type': 'error', 'message': error_message(e)})}\n\n"
+                    return
+                pending = asyncio.ensure_future(messages.__anext__())
+                event_id = f"id: {message[id_field]}\n" if id_field in message else ""
+                yield f"{event_id}data: {json.dumps(message)}\n\n"
+        finally:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+            await messages.aclose()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
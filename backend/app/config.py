@@ -17,6 +17,40 @@ class Settings(BaseSettings):
     ]
     # Allow all origins in development (set ATW_WEB_CORS_ALLOW_ALL=true)
     cors_allow_all: bool = True
+    # Seconds a terminal session survives without a connected client
+    session_detach_grace: int = 300
+    # Concurrent terminal sessions; at the limit the longest-detached one is evicted
+    max_terminal_sessions: int = 8
+    # Stop sessions with no input or output for this many seconds (0 disables)
+    session_idle_timeout: int = 3600
+    # zlib level for terminal streams opened with compress=deflate (1 fast .. 9 small)
+    terminal_compression_level: int = 6
+    # Record terminal sessions as asciicast v2 (per session: ?record=1 / ?record=0)
+    session_recording: bool = False
+    recordings_dir: str = "~/.local/share/atw-web/recordings"
+    # Notification client that fills its queue: "drop_oldest" or "disconnect"
+    notification_overflow: str = "drop_oldest"
+    # Recent notifications kept for ?since= resume, optionally persisted as JSON lines
+    notification_history: int = 1000
+    notification_log: str = ""
+    # Seconds workflow_state_change events are held so bursts merge (0 disables)
+    notification_coalesce_window: float = 0.25
+    # Unix socket joining the workers of a --workers N server (empty: single worker)
+    ipc_socket: str = ""
+    # CLI read results shared by all workers; seconds they stay fresh (0 disables)
+    result_cache_path: str = "~/.cache/atw-web/results.db"
+    result_cache_ttl: float = 5.0
+    # Log file written by the workflow executor, for /api/workflow/logs/follow
+    workflow_log_path: str = ""
+    # Line index of that log (offsets, timestamps, levels, task ids)
+    log_index_dir: str = "~/.cache/atw-web/log-index"
+    # Executor pidfile, or JSON state file with a "pid", checked via /proc
+    # instead of running the CLI (empty: PID learned from the CLI's status)
+    executor_state_path: str = ""
+    # Long CLI operations run as background jobs: how many at once, and how
+    # many seconds finished jobs stay available for their result
+    max_concurrent_jobs: int = 4
+    job_retention: int = 3600
 
     class Config:
         env_prefix = "ATW_WEB_"
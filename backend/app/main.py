@@ -4,8 +4,16 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
-from app.api.routes import tasks, projects, workflow, sync, health, session, notifications
+from app.api.routes import tasks, projects, workflow, sync, health, session, notifications, jobs
 from app.api.routes.session import cleanup_all_sessions
+from app.services.disk_usage import disk_usage
+from app.services.file_watcher import file_watchers
+from app.services.ipc_bus import worker_bus
+from app.services.jobs import jobs as job_registry
+from app.services.log_index import log_indexer
+from app.services.log_tail import log_tails
+from app.services.notifications import manager as notification_manager
+from app.services.result_cache import result_cache
 
 app = FastAPI(
     title=settings.app_name,
@@ -28,14 +36,30 @@ app.include_router(tasks.router, prefix="/api")
 app.include_router(projects.router, prefix="/api")
 app.include_router(workflow.router, prefix="/api")
 app.include_router(sync.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
 app.include_router(session.router)
 app.include_router(notifications.router)
 
 
+@app.on_event("startup")
+async def startup_event():
+    """Join the other workers' message bus when running with several workers."""
+    if settings.ipc_socket:
+        await worker_bus.start(settings.ipc_socket)
+
+
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Clean up all terminal sessions on server shutdown."""
+    """Clean up terminal sessions, jobs, file watches, the notification log and caches on shutdown."""
     await cleanup_all_sessions()
+    await job_registry.close()
+    disk_usage.close_all()
+    file_watchers.close_all()
+    await log_indexer.close()
+    log_tails.close_all()
+    notification_manager.close()
+    result_cache.close()
+    await worker_bus.close()
 
 
 @app.get("/")
@@ -4,16 +4,66 @@ ATW CLI Client - Communicates with ATW via subprocess calls.
 Ported from atw-ui TUI for web API usage.
 """
 
+import asyncio
 import json
 import os
+import signal
 import subprocess
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
 from app.config import settings
 
 
+TERMINATE_GRACE = 2.0  # Seconds between SIGTERM and SIGKILL for cancelled commands
+READ_CHUNK = 64 * 1024
+LINE_MAX = 64 * 1024  # Longer lines are passed on in pieces
+STDOUT_KEEP = 1024 * 1024  # Output kept for the result; beyond this only the end is kept
+STDERR_KEEP = 64 * 1024
+
+# Receives ("stdout" | "stderr", line) as a command prints
+LineCallback = Callable[[str, str], None]
+
+
+async def _terminate(process: asyncio.subprocess.Process):
+    """Stop a command's whole process group, politely first."""
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            break
+        try:
+            await asyncio.wait_for(process.wait(), TERMINATE_GRACE)
+            break
+        except asyncio.TimeoutError:
+            continue
+    await process.wait()
+
+
+async def _pump(reader: asyncio.StreamReader, stream: str, on_line: Optional[LineCallback],
+                keep: bytearray, keep_max: int):
+    """Pass a pipe's lines on as they arrive, keeping only the last `keep_max` bytes."""
+    pending = b""
+    while True:
+        chunk = await reader.read(READ_CHUNK)
+        if not chunk:
+            break
+        keep.extend(chunk)
+        if len(keep) > keep_max:
+            del keep[:len(keep) - keep_max]
+        if on_line is None:
+            continue
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            on_line(stream, line.decode("utf-8", errors="replace").rstrip("\r"))
+        while len(pending) > LINE_MAX:
+            on_line(stream, pending[:LINE_MAX].decode("utf-8", errors="replace"))
+            pending = pending[LINE_MAX:]
+    if pending and on_line is not None:
+        on_line(stream, pending.decode("utf-8", errors="replace").rstrip("\r"))
+
+
 def _get_subprocess_env() -> dict:
     """Get environment for subprocess calls with proper PATH."""
     env = os.environ.copy()
@@ -59,6 +109,39 @@ class ATWResult:
     raw_output: str = ""
 
 
+@dataclass(frozen=True)
+class ATWCommand:
+    """Arguments and timeout of an ATW invocation, for running it later."""
+
+    args: tuple[str, ...]
+    timeout: int = 30
+
+
+def _parse_result(returncode: int, stdout: str, stderr: str) -> ATWResult:
+    output = stdout.strip()
+
+    if output:
+        try:
+            data = json.loads(output)
+            return ATWResult(
+                success=returncode == 0,
+                data=data,
+                raw_output=output,
+            )
+        except json.JSONDecodeError:
+            return ATWResult(
+                success=returncode == 0,
+                raw_output=output,
+                error=stderr if returncode != 0 else None,
+            )
+
+    return ATWResult(
+        success=returncode == 0,
+        raw_output=output,
+        error=stderr if returncode != 0 else None,
+    )
+
+
 class ATWClient:
     """Client for communicating with ATW CLI."""
 
@@ -78,28 +161,7 @@ class ATWClient:
                 env=_get_subprocess_env(),
             )
 
-            output = result.stdout.strip()
-
-            if output:
-                try:
-                    data = json.loads(output)
-                    return ATWResult(
-                        success=result.returncode == 0,
-                        data=data,
-                        raw_output=output,
-                    )
-                except json.JSONDecodeError:
-                    return ATWResult(
-                        success=result.returncode == 0,
-                        raw_output=output,
-                        error=result.stderr if result.returncode != 0 else None,
-                    )
-
-            return ATWResult(
-                success=result.returncode == 0,
-                raw_output=output,
-                error=result.stderr if result.returncode != 0 else None,
-            )
+            return _parse_result(result.returncode, result.stdout, result.stderr)
 
         except subprocess.TimeoutExpired:
             return ATWResult(success=False, error=f"Command timed out after {timeout}s")
@@ -110,6 +172,58 @@ class ATWClient:
         except Exception as e:
             return ATWResult(success=False, error=str(e))
 
+    def run(self, command: ATWCommand) -> ATWResult:
+        return self._run(*command.args, timeout=command.timeout)
+
+    async def run_async(self, command: ATWCommand, on_line: Optional[LineCallback] = None) -> ATWResult:
+        """Run a command without tying up a thread; cancelling kills it.
+
+        With `on_line`, stdout and stderr lines are handed over as they are
+        printed. Memory use is bounded either way: a huge output keeps only
+        its last STDOUT_KEEP bytes in `raw_output`.
+        """
+        env = _get_subprocess_env()
+        if on_line is not None:
+            env["PYTHONUNBUFFERED"] = "1"  # Progress arrives as printed, not per 8 KiB block
+        try:
+            process = await asyncio.create_subprocess_exec(
+                self.atw_command,
+                *command.args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=env,
+                start_new_session=True,  # Own process group, so helpers die with it
+            )
+        except FileNotFoundError:
+            return ATWResult(
+                success=False, error=f"ATW command not found: {self.atw_command}"
+            )
+        except OSError as e:
+            return ATWResult(success=False, error=str(e))
+
+        stdout, stderr = bytearray(), bytearray()
+
+        async def collect():
+            await asyncio.gather(
+                _pump(process.stdout, "stdout", on_line, stdout, STDOUT_KEEP),
+                _pump(process.stderr, "stderr", on_line, stderr, STDERR_KEEP),
+            )
+            await process.wait()
+
+        try:
+            await asyncio.wait_for(collect(), command.timeout)
+        except asyncio.TimeoutError:
+            await _terminate(process)
+            return ATWResult(success=False, error=f"Command timed out after {command.timeout}s")
+        except asyncio.CancelledError:
+            await asyncio.shield(_terminate(process))
+            raise
+        return _parse_result(
+            process.returncode,
+            stdout.decode("utf-8", errors="replace"),
+            stderr.decode("utf-8", errors="replace"),
+        )
+
     # ==================== Tasks ====================
 
     def tasks_list(
@@ -189,9 +303,12 @@ class ATWClient:
         """Delete a task."""
         return self._run("task", task_id, "--delete", "--skip-deletion-confirmation")
 
+    def task_categorize_command(self, task_id: str) -> ATWCommand:
+        return ATWCommand(("categorize", task_id), timeout=60)
+
     def task_categorize(self, task_id: str) -> ATWResult:
         """Run AI categorization on task."""
-        return self._run("categorize", task_id, timeout=60)
+        return self.run(self.task_categorize_command(task_id))
 
     def task_register(
         self,
@@ -272,16 +389,22 @@ class ATWClient:
             args.extend(["--reason", reason])
         return self._run(*args)
 
+    def workflow_fix_command(self, task_id: str) -> ATWCommand:
+        return ATWCommand(("workflow", "fix", task_id), timeout=120)
+
     def workflow_fix(self, task_id: str) -> ATWResult:
         """AI-powered diagnosis and fix for stuck or broken tasks."""
-        return self._run("workflow", "fix", task_id, timeout=120)
+        return self.run(self.workflow_fix_command(task_id))
 
-    def workflow_timesheet(self, task_id: str, prompt: str, dry_run: bool = False) -> ATWResult:
-        """Generate timesheets from work done on a task."""
+    def workflow_timesheet_command(self, task_id: str, prompt: str, dry_run: bool = False) -> ATWCommand:
         args = ["workflow", "timesheet", task_id, "--prompt", prompt]
         if dry_run:
             args.append("--dry-run")
-        return self._run(*args, timeout=120)
+        return ATWCommand(tuple(args), timeout=120)
+
+    def workflow_timesheet(self, task_id: str, prompt: str, dry_run: bool = False) -> ATWResult:
+        """Generate timesheets from work done on a task."""
+        return self.run(self.workflow_timesheet_command(task_id, prompt, dry_run))
 
     # ==================== Executor ====================
 
@@ -309,26 +432,26 @@ class ATWClient:
         """Stop a specific running task."""
         return self._run("workflow", "executor", "stop-task", task_id)
 
-    def executor_stop(self) -> ATWResult:
-        """Stop the workflow executor by sending SIGTERM to the process."""
-        import os
-        import signal
+    def executor_stop(self, pid: Optional[int] = None) -> ATWResult:
+        """Stop the workflow executor by sending SIGTERM to the process.
 
-        # First get the executor status to find the PID
-        status_result = self.executor_status()
-        if not status_result.success:
-            return ATWResult(success=False, error="Failed to get executor status")
+        Without `pid`, the executor status is asked for it first.
+        """
+        if pid is None:
+            status_result = self.executor_status()
+            if not status_result.success:
+                return ATWResult(success=False, error="Failed to get executor status")
 
-        data = status_result.data
-        if not data:
-            return ATWResult(success=False, error="No executor status data")
+            data = status_result.data
+            if not data:
+                return ATWResult(success=False, error="No executor status data")
 
-        if not data.get("running"):
-            return ATWResult(success=True, raw_output="Executor is not running")
+            if not data.get("running"):
+                return ATWResult(success=True, raw_output="Executor is not running")
 
-        pid = data.get("pid")
-        if not pid:
-            return ATWResult(success=False, error="Executor running but no PID found")
+            pid = data.get("pid")
+            if not pid:
+                return ATWResult(success=False, error="Executor running but no PID found")
 
         try:
             # Send SIGTERM for graceful shutdown
@@ -341,9 +464,12 @@ class ATWClient:
         except Exception as e:
             return ATWResult(success=False, error=f"Failed to stop executor: {str(e)}")
 
+    def executor_run_all_command(self) -> ATWCommand:
+        return ATWCommand(("workflow", "executor", "run", "--all"), timeout=60)
+
     def executor_run_all(self) -> ATWResult:
         """Queue all pending tasks for execution."""
-        return self._run("workflow", "executor", "run", "--all", timeout=60)
+        return self.run(self.executor_run_all_command())
 
     # ==================== Logs ====================
 
@@ -357,13 +483,12 @@ class ATWClient:
 
     # ==================== Sync ====================
 
-    def sync_data(
+    def sync_data_command(
         self,
         dry_run: bool = False,
         to_remote: bool = False,
         from_remote: bool = False,
-    ) -> ATWResult:
-        """Sync data folder."""
+    ) -> ATWCommand:
         args = ["sync", "data"]
         if dry_run:
             args.append("--dry-run")
@@ -371,11 +496,23 @@ class ATWClient:
             args.append("--to-remote")
         if from_remote:
             args.append("--from-remote")
-        return self._run(*args, timeout=120)
+        return ATWCommand(tuple(args), timeout=120)
+
+    def sync_data(
+        self,
+        dry_run: bool = False,
+        to_remote: bool = False,
+        from_remote: bool = False,
+    ) -> ATWResult:
+        """Sync data folder."""
+        return self.run(self.sync_data_command(dry_run, to_remote, from_remote))
+
+    def sync_tasks_command(self) -> ATWCommand:
+        return ATWCommand(("sync", "tasks"), timeout=120)
 
     def sync_tasks(self) -> ATWResult:
         """Sync tasks from Odoo."""
-        return self._run("sync", "tasks", timeout=120)
+        return self.run(self.sync_tasks_command())
 
 
 # Singleton instance
@@ -0,0 +1,349 @@
+"""Incrementally maintained disk usage index for resource folders.
+
+The first query for a folder walks it once in a worker thread. After that the
+index is kept current from inotify change batches (see ``file_watcher``): only
+the parent directories of changed paths are rescanned and the size deltas are
+propagated up to the root, so queries are answered from memory. Where inotify
+is unavailable the index falls back to an mtime sweep that only rescans
+directories whose mtime moved.
+
+Like the file explorer, hidden entries and ``__pycache__`` are not counted.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from app.services.file_watcher import FileChange, file_watchers
+
+logger = logging.getLogger(__name__)
+
+MTIME_REVALIDATE_INTERVAL = 30.0  # Seconds between sweeps when inotify is unavailable
+INDEX_IDLE_TTL = 600.0  # Drop indexes (and their watches) unused for this long
+
+
+@dataclass
+class _DirNode:
+    own_size: int = 0
+    own_files: int = 0
+    total_size: int = 0
+    total_files: int = 0
+    mtime: float = 0.0
+    subdirs: set[str] = field(default_factory=set)
+
+
+def _parent(rel_path: str) -> str:
+    return os.path.dirname(rel_path)
+
+
+class DiskUsageIndex:
+    """Per-directory size totals for one folder tree."""
+
+    def __init__(self, root: str):
+        self.root = os.path.normpath(root)
+        self._nodes: dict[str, _DirNode] = {}
+        self._lock = threading.Lock()
+        self._dirty: set[str] = set()
+        self._rebuild_needed = False
+        self._apply_task: Optional[asyncio.Task] = None
+        self._watcher = None
+        self.indexed_at: float = 0.0
+        self.last_access: float = time.monotonic()
+
+    # -------------------- building --------------------
+
+    def _scan_dir(self, rel_dir: str) -> Optional[_DirNode]:
+        """Stat the direct entries of rel_dir (no recursion)."""
+        full = os.path.join(self.root, rel_dir) if rel_dir else self.root
+        node = _DirNode()
+        try:
+            node.mtime = os.stat(full).st_mtime
+            with os.scandir(full) as entries:
+                for entry in entries:
+                    if entry.name.startswith(".") or entry.name == "__pycache__":
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            rel = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                            node.subdirs.add(rel)
+                        elif entry.is_file(follow_symlinks=False):
+                            node.own_size += entry.stat(follow_symlinks=False).st_size
+                            node.own_files += 1
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        return node
+
+    def _build_subtree(self, rel_dir: str) -> dict[str, _DirNode]:
+        """Scan rel_dir recursively and return nodes with totals filled in."""
+        nodes: dict[str, _DirNode] = {}
+        order: list[str] = []
+        stack = [rel_dir]
+        while stack:
+            current = stack.pop()
+            node = self._scan_dir(current)
+            if node is None:
+                continue
+            nodes[current] = node
+            order.append(current)
+            stack.extend(node.subdirs)
+
+        # Children always come after their parent in `order`; fold bottom-up
+        for rel in reversed(order):
+            node = nodes[rel]
+            node.subdirs = {d for d in node.subdirs if d in nodes}
+            node.total_size = node.own_size + sum(nodes[d].total_size for d in node.subdirs)
+            node.total_files = node.own_files + sum(nodes[d].total_files for d in node.subdirs)
+        return nodes
+
+    def build(self):
+        """Full walk of the tree (blocking; run in a worker thread)."""
+        started = time.monotonic()
+        nodes = self._build_subtree("")
+        with self._lock:
+            self._nodes = nodes
+            self.indexed_at = time.time()
+        logger.info(
+            "Indexed disk usage of %s: %d directories in %.0f ms",
+            self.root, len(nodes), (time.monotonic() - started) * 1000,
+        )
+
+    # -------------------- incremental updates --------------------
+
+    def _propagate(self, rel_dir: str, size_delta: int, files_delta: int):
+        """Apply a delta to rel_dir's ancestors (caller holds the lock)."""
+        current = rel_dir
+        while True:
+            node = self._nodes.get(current)
+            if node is None:
+                return
+            node.total_size += size_delta
+            node.total_files += files_delta
+            if not current:
+                return
+            current = _parent(current)
+
+    def _remove_subtree(self, rel_dir: str):
+        node = self._nodes.get(rel_dir)
+        if node is None:
+            return
+        size, files = node.total_size, node.total_files
+        stack = [rel_dir]
+        while stack:
+            removed = self._nodes.pop(stack.pop(), None)
+            if removed:
+                stack.extend(removed.subdirs)
+        parent = self._nodes.get(_parent(rel_dir)) if rel_dir else None
+        if parent:
+            parent.subdirs.discard(rel_dir)
+            self._propagate(_parent(rel_dir), -size, -files)
+
+    def _refresh_dir(self, rel_dir: str):
+        """Rescan one directory's direct entries and reconcile its subdirectories."""
+        fresh = self._scan_dir(rel_dir)
+        with self._lock:
+            old = self._nodes.get(rel_dir)
+            if old is None:
+                return
+            if fresh is None:
+                self._remove_subtree(rel_dir)
+                return
+            removed = old.subdirs - fresh.subdirs
+            added = fresh.subdirs - old.subdirs
+            for sub in removed:
+                self._remove_subtree(sub)
+            size_delta = fresh.own_size - old.own_size
+            files_delta = fresh.own_files - old.own_files
+            old.own_size, old.own_files, old.mtime = fresh.own_size, fresh.own_files, fresh.mtime
+            self._propagate(rel_dir, size_delta, files_delta)
+
+        for sub in added:
+            subtree = self._build_subtree(sub)
+            if sub not in subtree:
+                continue
+            with self._lock:
+                parent = self._nodes.get(rel_dir)
+                if parent is None or sub in self._nodes:
+                    continue
+                self._nodes.update(subtree)
+                parent.subdirs.add(sub)
+                self._propagate(rel_dir, subtree[sub].total_size, subtree[sub].total_files)
+
+    def _apply_dirty(self):
+        """Process accumulated changes (blocking; run in a worker thread)."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            rebuild, self._rebuild_needed = self._rebuild_needed, False
+        if rebuild:
+            self.build()
+            return
+        # Parents before children so new subtrees are attached only once
+        for rel_dir in sorted(dirty, key=lambda p: p.count(os.sep) if p else -1):
+            self._refresh_dir(rel_dir)
+        with self._lock:
+            self.indexed_at = time.time()
+
+    def revalidate_by_mtime(self):
+        """Rescan directories whose mtime changed (fallback when inotify is absent)."""
+        with self._lock:
+            known = {rel: node.mtime for rel, node in self._nodes.items()}
+        for rel, mtime in known.items():
+            full = os.path.join(self.root, rel) if rel else self.root
+            try:
+                current = os.stat(full).st_mtime
+            except OSError:
+                current = None
+            if current != mtime:
+                with self._lock:
+                    self._dirty.add(rel)
+        self._apply_dirty()
+
+    # -------------------- watching --------------------
+
+    def _on_changes(self, changes: list[FileChange]):
+        with self._lock:
+            for change in changes:
+                if change.event == "resync":
+                    self._rebuild_needed = True
+                else:
+                    self._dirty.add(_parent(change.path))
+        # Changes that arrive during the initial walk are applied once it ends
+        if self.indexed_at:
+            self.schedule_apply()
+
+    def schedule_apply(self):
+        """Apply pending changes in a worker thread unless already doing so."""
+        if not (self._dirty or self._rebuild_needed):
+            return
+        if self._apply_task is None or self._apply_task.done():
+            self._apply_task = asyncio.create_task(self._apply_soon())
+
+    async def _apply_soon(self):
+        while self._dirty or self._rebuild_needed:
+            await asyncio.to_thread(self._apply_dirty)
+
+    def attach_watcher(self) -> bool:
+        """Keep the index live from inotify. Returns False if watching failed."""
+        try:
+            self._watcher = file_watchers.acquire(self.root)
+        except OSError as e:
+            logger.warning("Disk usage for %s falls back to mtime sweeps: %s", self.root, e)
+            return False
+        self._watcher.add_listener(self._on_changes)
+        return True
+
+    def close(self):
+        if self._watcher:
+            self._watcher.remove_listener(self._on_changes)
+            file_watchers.release(self._watcher)
+            self._watcher = None
+        if self._apply_task:
+            self._apply_task.cancel()
+
+    @property
+    def live(self) -> bool:
+        return self._watcher is not None
+
+    # -------------------- queries --------------------
+
+    def usage(self, rel_dir: str = "") -> Optional[dict]:
+        """Totals for rel_dir and its immediate subdirectories, from memory."""
+        key = os.path.normpath(rel_dir) if rel_dir else ""
+        if key == ".":
+            key = ""
+        with self._lock:
+            node = self._nodes.get(key)
+            if node is None:
+                return None
+            children = []
+            for sub in node.subdirs:
+                child = self._nodes[sub]
+                children.append({
+                    "name": os.path.basename(sub),
+                    "path": sub,
+                    "size": child.total_size,
+                    "files": child.total_files,
+                })
+            return {
+                "path": key or "/",
+                "size": node.total_size,
+                "files": node.total_files,
+                "own_size": node.own_size,
+                "own_files": node.own_files,
+                "children": sorted(children, key=lambda c: c["size"], reverse=True),
+                "indexed_at": self.indexed_at,
+                "live": self.live,
+            }
+
+
+class DiskUsageService:
+    """Registry of usage indexes keyed by folder."""
+
+    def __init__(self):
+        self._indexes: dict[str, DiskUsageIndex] = {}
+        self._building: dict[str, asyncio.Task] = {}
+        self._last_sweep: dict[str, float] = {}
+
+    async def _get_index(self, root: str) -> DiskUsageIndex:
+        key = os.path.normpath(root)
+        index = self._indexes.get(key)
+        if index is not None:
+            return index
+
+        task = self._building.get(key)
+        if task is None:
+            task = asyncio.create_task(self._create_index(key))
+            self._building[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._building.pop(key, None)
+
+    async def _create_index(self, root: str) -> DiskUsageIndex:
+        index = DiskUsageIndex(root)
+        # Watch first so changes made during the initial walk are not lost
+        index.attach_watcher()
+        await asyncio.to_thread(index.build)
+        index.schedule_apply()
+        self._indexes[root] = index
+        self._last_sweep[root] = time.monotonic()
+        return index
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for key, index in list(self._indexes.items()):
+            if now - index.last_access > INDEX_IDLE_TTL:
+                logger.info("Dropping idle disk usage index for %s", key)
+                index.close()
+                self._indexes.pop(key, None)
+                self._last_sweep.pop(key, None)
+
+    async def usage(self, root: str, rel_dir: str = "") -> Optional[dict]:
+        """Usage of root/rel_dir, building the index on first use."""
+        self._evict_idle()
+        index = await self._get_index(root)
+        index.last_access = time.monotonic()
+
+        if not index.live:
+            now = time.monotonic()
+            if now - self._last_sweep.get(index.root, 0) > MTIME_REVALIDATE_INTERVAL:
+                self._last_sweep[index.root] = now
+                await asyncio.to_thread(index.revalidate_by_mtime)
+
+        return index.usage(rel_dir)
+
+    def close_all(self):
+        for index in self._indexes.values():
+            index.close()
+        self._indexes.clear()
+        self._last_sweep.clear()
+
+
+# Singleton instance
+disk_usage = DiskUsageService()
@@ -0,0 +1,159 @@
+"""Executor status without spawning the CLI for every poll.
+
+The frontend polls executor status every few seconds, and most of the time
+the question is only "is the executor process alive?". The probe answers it
+in-process:
+
+- the executor's PID comes from ``settings.executor_state_path`` (a file
+  holding a bare PID or a JSON object with a "pid" and other status fields),
+  or else from the last CLI status, remembered with the process start time
+  so a reused PID is not mistaken for the executor
+- /proc confirms the process is alive and gives its CPU, RSS and uptime
+
+The CLI (``atw workflow executor status``, through the shared result cache)
+is only run for what the probe cannot know: the running-task list while the
+executor is up, or whether one was started when there is no PID to check.
+Probe results are reused for PROBE_TTL seconds.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Optional
+
+from app.config import settings
+from app.services.atw_client import atw_client
+from app.services.procfs import CpuSampler, ProcessStats, read_process_stats
+from app.services.result_cache import result_cache
+
+logger = logging.getLogger(__name__)
+
+PROBE_TTL = 0.5  # Seconds a probe result is reused
+CLI_STATUS_TTL = 2.0  # The running-task list changes on its own, so it is cached briefly
+START_TIME_TOLERANCE = 2.0  # Seconds; a larger difference means the PID was reused
+
+
+def _format_uptime(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes}m"
+    if minutes:
+        return f"{minutes}m {secs}s"
+    return f"{secs}s"
+
+
+def _read_state_file(path: str) -> Optional[dict[str, Any]]:
+    """The state file as a dict ({"pid": n} for a plain pidfile), or None."""
+    try:
+        with open(os.path.expanduser(path)) as f:
+            text = f.read().strip()
+    except OSError:
+        return None
+    if text.isdigit():
+        return {"pid": int(text)}
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        logger.warning("Unreadable executor state file %s", path)
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class ExecutorProbe:
+    """Cached executor status from the pidfile and /proc (singleton)."""
+
+    def __init__(self):
+        self._cached: Optional[tuple[float, dict[str, Any]]] = None
+        self._inflight: Optional[asyncio.Task] = None
+        self._known: Optional[tuple[int, float]] = None  # (pid, start time) from the CLI
+        self._cpu: Optional[tuple[int, CpuSampler]] = None
+
+    def invalidate(self):
+        """Forget the cached result (after starting or stopping the executor)."""
+        self._cached = None
+
+    async def status(self) -> dict[str, Any]:
+        """Executor status in the CLI's shape plus cpu_percent, rss_bytes and uptime.
+
+        Raises RuntimeError with the CLI's error when it had to be asked and failed.
+        """
+        if self._cached and time.monotonic() - self._cached[0] < PROBE_TTL:
+            return self._cached[1]
+        if self._inflight is None:
+            self._inflight = asyncio.create_task(self._probe())
+            self._inflight.add_done_callback(lambda _: setattr(self, "_inflight", None))
+        # Shielded: one caller going away must not cancel the probe others share
+        return await asyncio.shield(self._inflight)
+
+    async def pid(self) -> Optional[int]:
+        """PID of the running executor, or None if it is not running."""
+        status = await self.status()
+        return status.get("pid") if status.get("running") else None
+
+    async def _probe(self) -> dict[str, Any]:
+        state = await asyncio.to_thread(_read_state_file, settings.executor_state_path) \
+            if settings.executor_state_path else None
+        if state is not None:
+            stats = await self._stats(state.get("pid"))
+        else:
+            stats = await self._stats(self._known[0]) if self._known else None
+            if stats and abs(time.time() - stats.uptime_seconds - self._known[1]) > START_TIME_TOLERANCE:
+                stats = None  # The remembered PID now belongs to another process
+
+        if state is not None and stats is None:
+            # The state file is authoritative: no process, no executor
+            status = {**state, "running": False, "pid": None, "running_tasks": [], "slots_used": 0}
+        elif state is not None and "running_tasks" in state:
+            status = {**state, "running": True}
+        elif state is not None:
+            # Alive per the state file; the CLI is only needed for the task list
+            status = {**state, **await self._from_cli(), "running": True}
+        else:
+            status = await self._from_cli()
+            pid = status.get("pid")
+            if status.get("running") and isinstance(pid, int) and (stats is None or stats.pid != pid):
+                # The CLI's answer may be a few seconds old; check the PID it names
+                stats = await self._stats(pid)
+                if stats is None:
+                    status = {**status, "running": False, "running_tasks": [], "slots_used": 0}
+                else:
+                    self._known = (pid, time.time() - stats.uptime_seconds)
+
+        if not status.get("running"):
+            self._known = None
+        elif stats is not None:
+            status["pid"] = stats.pid
+            status.update(self._process_fields(stats))
+        status["is_running"] = bool(status.get("running"))
+        self._cached = (time.monotonic(), status)
+        return status
+
+    async def _stats(self, pid: Any) -> Optional[ProcessStats]:
+        """/proc stats of a live process, or None."""
+        if not isinstance(pid, int) or pid <= 0:
+            return None
+        stats = await asyncio.to_thread(read_process_stats, pid)
+        return stats if stats is not None and stats.state not in ("Z", "X") else None
+
+    async def _from_cli(self) -> dict[str, Any]:
+        result = await result_cache.fetch("executor", atw_client.executor_status, ttl=CLI_STATUS_TTL)
+        if not result.success:
+            raise RuntimeError(result.error or "Failed to get executor status")
+        return dict(result.data) if isinstance(result.data, dict) else {}
+
+    def _process_fields(self, stats: ProcessStats) -> dict[str, Any]:
+        if self._cpu is None or self._cpu[0] != stats.pid:
+            self._cpu = (stats.pid, CpuSampler())
+        return {
+            "cpu_percent": self._cpu[1].sample(stats),
+            "rss_bytes": stats.rss_bytes,
+            "uptime_seconds": round(stats.uptime_seconds, 1),
+            "uptime": _format_uptime(stats.uptime_seconds),
+        }
+
+
+# Singleton instance
+executor_probe = ExecutorProbe()
@@ -0,0 +1,373 @@
+"""Recursive directory watching via Linux inotify.
+
+inotify is driven straight from the event loop (``loop.add_reader`` on the
+inotify fd), so an idle watch costs nothing: no polling threads, no periodic
+rescans. Bursts of raw events are debounced into batches of
+created/modified/deleted changes that subscribers receive on a queue.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# inotify event masks (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+)
+
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+READ_BUFFER_SIZE = 64 * 1024
+
+# Debounce configuration
+DEBOUNCE_DELAY = 0.2  # Flush once events have been quiet for this long
+DEBOUNCE_MAX_DELAY = 1.0  # ...but never hold a change longer than this
+SUBSCRIBER_QUEUE_SIZE = 256  # Pending batches per subscriber before it must resync
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    return _libc
+
+
+def inotify_available() -> bool:
+    """Check whether inotify can be used on this platform."""
+    try:
+        return hasattr(_get_libc(), "inotify_init1")
+    except OSError:
+        return False
+
+
+def is_hidden(rel_path: str) -> bool:
+    """Match the file explorer's rule for hidden entries."""
+    return any(
+        part.startswith(".") or part == "__pycache__"
+        for part in rel_path.split(os.sep)
+        if part
+    )
+
+
+class Inotify:
+    """Thin wrapper around an inotify file descriptor."""
+
+    def __init__(self):
+        libc = _get_libc()
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.fd = fd
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = _get_libc().inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        _get_libc().inotify_rm_watch(self.fd, wd)
+
+    def read_events(self) -> list[tuple[int, int, int, str]]:
+        """Read all queued events as (wd, mask, cookie, name) tuples."""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, READ_BUFFER_SIZE)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = -1
+
+
+@dataclass
+class FileChange:
+    """A debounced change to a path relative to the watched root."""
+
+    event: str  # "created", "modified", "deleted" or "resync"
+    path: str
+    is_dir: bool = False
+
+
+@dataclass
+class _Pending:
+    created: bool = False
+    is_dir: bool = False
+
+
+class DirectoryWatcher:
+    """Watches a directory tree and fans debounced changes out to subscribers."""
+
+    def __init__(self, root: str):
+        self.root = os.path.normpath(root)
+        self._inotify: Optional[Inotify] = None
+        self._wd_to_dir: dict[int, str] = {}
+        self._dir_to_wd: dict[str, int] = {}
+        self._pending: dict[str, _Pending] = {}
+        self._first_event_at: Optional[float] = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: set[asyncio.Queue] = set()
+        self._listeners: list[Callable[[list[FileChange]], None]] = []
+
+    # -------------------- lifecycle --------------------
+
+    def start(self):
+        """Create the inotify instance, watch the tree and attach to the loop."""
+        self._loop = asyncio.get_running_loop()
+        self._inotify = Inotify()
+        try:
+            self._watch_tree("")
+        except OSError:
+            self._inotify.close()
+            self._inotify = None
+            raise
+        self._loop.add_reader(self._inotify.fd, self._on_readable)
+        logger.info("Watching %s (%d directories)", self.root, len(self._wd_to_dir))
+
+    def close(self):
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._inotify:
+            if self._loop:
+                self._loop.remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+        self._wd_to_dir.clear()
+        self._dir_to_wd.clear()
+        logger.info("Stopped watching %s", self.root)
+
+    # -------------------- subscribers --------------------
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def add_listener(self, callback: Callable[[list[FileChange]], None]):
+        """Register a callback invoked on the loop with every flushed batch."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[list[FileChange]], None]):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    # -------------------- watches --------------------
+
+    def _watch_tree(self, rel_dir: str, report: bool = False):
+        """Add watches for rel_dir and every visible directory below it.
+
+        With `report`, everything already inside is marked created: it
+        appeared before the watch existed, so no event will announce it.
+        """
+        stack = [rel_dir]
+        while stack:
+            current = stack.pop()
+            full = os.path.join(self.root, current) if current else self.root
+            try:
+                wd = self._inotify.add_watch(full, WATCH_MASK | IN_ONLYDIR)
+            except OSError:
+                if not current:
+                    raise
+                continue
+            self._wd_to_dir[wd] = current
+            self._dir_to_wd[current] = wd
+            try:
+                with os.scandir(full) as entries:
+                    for entry in entries:
+                        rel = os.path.join(current, entry.name) if current else entry.name
+                        if is_hidden(rel):
+                            continue
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        if report:
+                            self._pending.setdefault(rel, _Pending(is_dir=is_dir)).created = True
+                        if is_dir:
+                            stack.append(rel)
+            except OSError:
+                continue
+
+    def _forget_tree(self, rel_dir: str):
+        """Drop bookkeeping for rel_dir and its subdirectories."""
+        prefix = rel_dir + os.sep
+        for path in [p for p in self._dir_to_wd if p == rel_dir or p.startswith(prefix)]:
+            wd = self._dir_to_wd.pop(path)
+            self._wd_to_dir.pop(wd, None)
+            if self._inotify:
+                # Moved-away directories keep their watch alive; drop it explicitly
+                self._inotify.rm_watch(wd)
+
+    # -------------------- events --------------------
+
+    def _on_readable(self):
+        if not self._inotify:
+            return
+        for wd, mask, _cookie, name in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                self._pending.clear()
+                self._publish([FileChange(event="resync", path="")])
+                continue
+
+            rel_dir = self._wd_to_dir.get(wd)
+            if rel_dir is None:
+                continue
+
+            if mask & IN_IGNORED:
+                self._wd_to_dir.pop(wd, None)
+                if self._dir_to_wd.get(rel_dir) == wd:
+                    self._dir_to_wd.pop(rel_dir, None)
+                continue
+
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF) or not name:
+                continue
+
+            rel = os.path.join(rel_dir, name) if rel_dir else name
+            if is_hidden(rel):
+                continue
+
+            is_dir = bool(mask & IN_ISDIR)
+            pending = self._pending.setdefault(rel, _Pending(is_dir=is_dir))
+
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                pending.created = True
+                if is_dir:
+                    self._watch_tree(rel, report=True)
+            elif mask & (IN_DELETE | IN_MOVED_FROM) and is_dir:
+                self._forget_tree(rel)
+
+        if self._pending:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        now = self._loop.time()
+        if self._first_event_at is None:
+            self._first_event_at = now
+        when = min(now + DEBOUNCE_DELAY, self._first_event_at + DEBOUNCE_MAX_DELAY)
+        if self._flush_handle:
+            self._flush_handle.cancel()
+        self._flush_handle = self._loop.call_at(when, self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        self._first_event_at = None
+        pending, self._pending = self._pending, {}
+
+        changes = []
+        for rel, state in sorted(pending.items()):
+            exists = os.path.lexists(os.path.join(self.root, rel))
+            if not exists:
+                if state.created:
+                    continue  # Created and removed within one window
+                changes.append(FileChange(event="deleted", path=rel, is_dir=state.is_dir))
+            elif state.created:
+                changes.append(FileChange(event="created", path=rel, is_dir=state.is_dir))
+            else:
+                changes.append(FileChange(event="modified", path=rel, is_dir=state.is_dir))
+
+        if changes:
+            self._publish(changes)
+
+    def _publish(self, changes: list[FileChange]):
+        for queue in self._subscribers:
+            if queue.full():
+                # Subscriber is too far behind; tell it to re-list instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait([FileChange(event="resync", path="")])
+            else:
+                queue.put_nowait(changes)
+        for callback in list(self._listeners):
+            try:
+                callback(changes)
+            except Exception:
+                logger.exception("File watch listener failed for %s", self.root)
+
+
+@dataclass
+class _Entry:
+    watcher: DirectoryWatcher
+    refs: int = field(default=0)
+
+
+class FileWatcherRegistry:
+    """Shares one DirectoryWatcher per root among all interested subscribers."""
+
+    def __init__(self):
+        self._watchers: dict[str, _Entry] = {}
+
+    def acquire(self, root: str) -> DirectoryWatcher:
+        """Return the watcher for root, starting it if needed. Pair with release()."""
+        key = os.path.normpath(root)
+        entry = self._watchers.get(key)
+        if entry is None:
+            watcher = DirectoryWatcher(key)
+            watcher.start()
+            entry = _Entry(watcher=watcher)
+            self._watchers[key] = entry
+        entry.refs += 1
+        return entry.watcher
+
+    def release(self, watcher: DirectoryWatcher):
+        entry = self._watchers.get(watcher.root)
+        if entry is None or entry.watcher is not watcher:
+            return
+        entry.refs -= 1
+        if entry.refs <= 0:
+            self._watchers.pop(watcher.root, None)
+            watcher.close()
+
+    def close_all(self):
+        for entry in self._watchers.values():
+            entry.watcher.close()
+        self._watchers.clear()
+
+
+# Singleton instance
+file_watchers = FileWatcherRegistry()
@@ -0,0 +1,310 @@
+"""Message bus between uvicorn workers over a Unix-domain socket.
+
+With ``--workers N`` every worker is a separate process with its own
+notification clients and terminal sessions. The bus relays messages between
+them so those per-process singletons behave as one.
+
+Topology: one worker is the hub. It holds an exclusive flock on
+``<socket>.lock`` and listens on the socket; the others connect to it. The hub
+relays every published message to all other workers. If the hub exits, its
+lock is released, the peers see EOF and one of them takes over.
+
+Framing is one JSON object per line:
+
+- ``{"kind": "event", "topic", "payload", "origin"}``: delivered to every
+  other worker
+- ``{"kind": "hub", "topic", "payload", "origin"}``: handled by the hub only
+- ``{"kind": "request", "id", "topic", "payload", "origin"}`` /
+  ``{"kind": "reply", "id", "to", "payload", "origin"}``: request/reply, one
+  reply per other worker
+- ``{"kind": "members", "count"}``: sent by the hub when workers come and go
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import socket
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+READ_LIMIT = 16 * 1024 * 1024  # Longest accepted message line
+REJOIN_DELAY = 0.2  # Seconds between attempts to reach or become the hub
+CONNECT_ATTEMPTS = 25
+REQUEST_TIMEOUT = 1.0
+
+EventHandler = Callable[[Any], None]
+RequestHandler = Callable[[Any], Awaitable[Any]]
+RoleHandler = Callable[[bool], None]
+
+
+class WorkerBus:
+    """Publish/subscribe and request/reply between the workers of one server."""
+
+    def __init__(self):
+        self.path = ""
+        self.worker_id = str(os.getpid())
+        self.is_hub = False
+        self.members = 1
+        self._lock_fd: Optional[int] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._peers: set[asyncio.StreamWriter] = set()
+        self._peer_tasks: set[asyncio.Task] = set()
+        self._hub: Optional[asyncio.StreamWriter] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._joined = asyncio.Event()
+        self._handlers: dict[str, EventHandler] = {}
+        self._request_handlers: dict[str, RequestHandler] = {}
+        self._role_handlers: list[RoleHandler] = []
+        self._pending: dict[str, tuple[asyncio.Future, list]] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def active(self) -> bool:
+        return self._runner is not None
+
+    # -------------------- handlers --------------------
+
+    def on(self, topic: str, handler: EventHandler):
+        """Handle events (and hub messages) on `topic` published by other workers."""
+        self._handlers[topic] = handler
+
+    def on_request(self, topic: str, handler: RequestHandler):
+        """Answer requests on `topic` from other workers."""
+        self._request_handlers[topic] = handler
+
+    def on_role(self, handler: RoleHandler):
+        """Be told (True/False) when this worker becomes or stops being the hub."""
+        self._role_handlers.append(handler)
+
+    def _set_hub(self, is_hub: bool):
+        if self.is_hub == is_hub:
+            return
+        self.is_hub = is_hub
+        for handler in self._role_handlers:
+            try:
+                handler(is_hub)
+            except Exception:
+                logger.exception("IPC bus role handler failed")
+
+    # -------------------- lifecycle --------------------
+
+    async def start(self, path: str):
+        """Join the bus at `path`, becoming the hub if nobody else is."""
+        self.path = os.path.expanduser(path)
+        self.worker_id = str(os.getpid())
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._runner = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._joined.wait(), REJOIN_DELAY * CONNECT_ATTEMPTS)
+        except asyncio.TimeoutError:
+            logger.warning("Worker %s could not join the IPC bus yet", self.worker_id)
+
+    async def close(self):
+        if self._runner:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        self._leave()
+        if self._peer_tasks:
+            # Closed peer sockets end their relay loops; let them finish cleanly
+            await asyncio.wait(self._peer_tasks, timeout=REQUEST_TIMEOUT)
+
+    def _leave(self):
+        self._set_hub(False)  # Before the lock is released to the next hub
+        for writer in self._peers:
+            writer.close()
+        self._peers.clear()
+        if self._server:
+            self._server.close()
+            self._server = None
+        if self._hub:
+            self._hub.close()
+            self._hub = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # Releases the flock for the next hub
+            self._lock_fd = None
+        self.members = 1
+        self._joined.clear()
+
+    def _try_lock(self) -> bool:
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def _run(self):
+        """Stay on the bus: become the hub or connect to it, rejoining on loss."""
+        while True:
+            try:
+                if self._try_lock():
+                    await self._serve()
+                else:
+                    await self._follow()
+            except asyncio.CancelledError:
+                raise
+            except (OSError, ValueError) as e:
+                logger.debug("IPC bus join failed for worker %s: %s", self.worker_id, e)
+            self._leave()
+            await asyncio.sleep(REJOIN_DELAY)
+
+    async def _serve(self):
+        # The lock guarantees no live hub owns the socket file
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self._server = await asyncio.start_unix_server(self._on_peer, sock=sock, limit=READ_LIMIT)
+        self._set_hub(True)
+        self._joined.set()
+        logger.info("Worker %s is the IPC bus hub (%s)", self.worker_id, self.path)
+        await asyncio.Event().wait()  # Serve until cancelled
+
+    async def _follow(self):
+        reader, writer = None, None
+        for _ in range(CONNECT_ATTEMPTS):
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=READ_LIMIT)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(REJOIN_DELAY)  # Hub holds the lock but is still binding
+        if writer is None:
+            return
+        self._hub = writer
+        self._joined.set()
+        logger.info("Worker %s joined the IPC bus", self.worker_id)
+        while True:
+            line = await reader.readline()
+            if not line:
+                logger.info("IPC bus hub went away; worker %s rejoining", self.worker_id)
+                return
+            self._dispatch(json.loads(line))
+
+    async def _on_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Hub side: relay a worker's messages until it disconnects."""
+        task = asyncio.current_task()
+        self._peers.add(writer)
+        self._peer_tasks.add(task)
+        self._announce_members()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message["kind"] != "hub":
+                    for peer in self._peers:
+                        if peer is not writer:
+                            peer.write(line)
+                self._dispatch(message)
+        except (ConnectionError, ValueError):  # Includes bad JSON and over-long lines
+            pass
+        finally:
+            self._peers.discard(writer)
+            self._peer_tasks.discard(task)
+            writer.close()
+            self._announce_members()
+
+    def _announce_members(self):
+        self.members = len(self._peers) + 1
+        self._write_all({"kind": "members", "count": self.members})
+
+    # -------------------- sending --------------------
+
+    def _write_all(self, message: dict):
+        line = (json.dumps(message) + "\n").encode("utf-8")
+        if self.is_hub:
+            for peer in self._peers:
+                peer.write(line)
+        elif self._hub:
+            self._hub.write(line)
+
+    def publish(self, topic: str, payload: Any):
+        """Deliver an event to every other worker (not to this one)."""
+        self._write_all({"kind": "event", "topic": topic, "payload": payload, "origin": self.worker_id})
+
+    def send_to_hub(self, topic: str, payload: Any):
+        """Have the hub worker handle a message (handled here if this is the hub)."""
+        if self.is_hub or not self._hub:
+            self._handle(topic, payload)
+            return
+        message = {"kind": "hub", "topic": topic, "payload": payload, "origin": self.worker_id}
+        self._hub.write((json.dumps(message) + "\n").encode("utf-8"))
+
+    async def request(self, topic: str, payload: Any = None, timeout: float = REQUEST_TIMEOUT) -> list:
+        """Ask every other worker and collect their replies (stops at timeout)."""
+        expected = self.members - 1
+        if expected <= 0 or not (self.is_hub or self._hub):
+            return []
+        request_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        replies: list = []
+        self._pending[request_id] = (future, replies)
+        self._write_all({
+            "kind": "request", "id": request_id, "topic": topic,
+            "payload": payload, "origin": self.worker_id,
+        })
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            logger.debug("IPC request %s got %d/%d replies", topic, len(replies), expected)
+        finally:
+            self._pending.pop(request_id, None)
+        return replies
+
+    # -------------------- receiving --------------------
+
+    def _dispatch(self, message: dict):
+        kind = message.get("kind")
+        if kind == "members":
+            self.members = message["count"]
+        elif kind in ("event", "hub"):
+            if kind == "hub" and not self.is_hub:
+                return
+            self._handle(message["topic"], message["payload"])
+        elif kind == "request":
+            handler = self._request_handlers.get(message["topic"])
+            if handler:
+                task = asyncio.create_task(self._answer(handler, message))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        elif kind == "reply" and message.get("to") == self.worker_id:
+            pending = self._pending.get(message["id"])
+            if pending:
+                future, replies = pending
+                replies.append(message["payload"])
+                if len(replies) >= self.members - 1 and not future.done():
+                    future.set_result(None)
+
+    def _handle(self, topic: str, payload: Any):
+        handler = self._handlers.get(topic)
+        if handler is None:
+            return
+        try:
+            handler(payload)
+        except Exception:
+            logger.exception("IPC bus handler for %s failed", topic)
+
+    async def _answer(self, handler: RequestHandler, message: dict):
+        try:
+            result = await handler(message["payload"])
+        except Exception:
+            logger.exception("IPC bus request handler for %s failed", message["topic"])
+            result = None
+        # Always reply so the requester can stop waiting early
+        self._write_all({
+            "kind": "reply", "id": message["id"], "to": message["origin"],
+            "payload": result, "origin": self.worker_id,
+        })
+
+
+# Singleton instance
+worker_bus = WorkerBus()
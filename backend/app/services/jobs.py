@@ -0,0 +1,318 @@
+"""Background jobs for long-running ATW commands.
+
+Endpoints that used to hold the request open for a minute or two submit a job
+instead and answer at once with its id. The job runs the CLI as an async
+subprocess (cancelling the job kills it), at most
+``settings.max_concurrent_jobs`` at a time, and its completion is announced
+through ``notify()``.
+
+Submitting a command identical to one still queued or running returns the
+existing job, so a client retrying after a proxy timeout does not start a
+duplicate. Finished jobs are kept for ``settings.job_retention`` seconds.
+
+Jobs submitted with ``stream=True`` keep their output lines, numbered, in a
+ring of the last JOB_OUTPUT_LINES (and JOB_OUTPUT_BYTES) as the command prints them; ``follow_output``
+feeds them to WebSocket/SSE followers, who only ever read from that ring, so a
+slow follower costs no memory and just skips what was evicted.
+
+With several workers a job lives in the worker that accepted it; lookups and
+cancellations for unknown ids are forwarded over the worker bus, and output
+of a job in another worker is polled over it.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from app.config import settings
+from app.services.atw_client import ATWCommand, ATWResult, atw_client
+from app.services.ipc_bus import worker_bus
+from app.services.notifications import notify
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = ("queued", "running")
+JOB_OUTPUT_LINES = 2000  # Output kept per streamed job for (late) followers...
+JOB_OUTPUT_BYTES = 1024 * 1024  # ...within this much text
+REMOTE_OUTPUT_POLL = 0.5  # Seconds between polls for a job in another worker
+
+# Turns a successful result into the job's response, running the endpoint's
+# side effects such as cache invalidation
+OnSuccess = Callable[[ATWResult], Awaitable[dict[str, Any]]]
+
+
+@dataclass
+class Job:
+    """One submitted command and, once finished, its outcome."""
+
+    id: str
+    kind: str
+    key: str
+    command: ATWCommand
+    task_id: str = ""
+    label: str = ""
+    status: str = "queued"  # queued, running, succeeded, failed, cancelled
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    response: Optional[dict[str, Any]] = None
+    on_success: Optional[OnSuccess] = field(default=None, repr=False)
+    notice: dict[str, Any] = field(default_factory=dict, repr=False)
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+    stream: bool = False
+    output: deque = field(default_factory=deque, repr=False)
+    output_bytes: int = 0
+    output_seq: int = 0  # Number of the last line printed
+    followers: set[asyncio.Event] = field(default_factory=set, repr=False)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATES
+
+    def add_line(self, stream: str, text: str):
+        self.output_seq += 1
+        self.output.append({"seq": self.output_seq, "stream": stream, "text": text})
+        self.output_bytes += len(text)
+        while len(self.output) > JOB_OUTPUT_LINES or self.output_bytes > JOB_OUTPUT_BYTES:
+            self.output_bytes -= len(self.output.popleft()["text"])
+        self.wake_followers()
+
+    def wake_followers(self):
+        for event in self.followers:
+            event.set()
+
+    def output_since(self, after: int) -> tuple[list[dict[str, Any]], int]:
+        """Lines numbered above `after`, and how many before them were evicted."""
+        if not self.output:
+            return [], 0
+        first = self.output[0]["seq"]
+        skipped = max(0, first - after - 1)
+        return list(itertools.islice(self.output, max(0, after - first + 1), None)), skipped
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "task_id": self.task_id or None,
+            "label": self.label,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "stream": self.stream,
+        }
+
+
+def _output_messages(lines: list[dict[str, Any]], skipped: int) -> list[dict[str, Any]]:
+    messages = []
+    if skipped:
+        messages.append({"type": "skipped", "count": skipped})
+    if lines:
+        messages.append({"type": "output", "lines": lines, "seq": lines[-1]["seq"]})
+    return messages
+
+
+class JobRegistry:
+    """Runs and tracks background jobs (singleton)."""
+
+    def __init__(self):
+        self._jobs: dict[str, Job] = {}
+        self._active_by_key: dict[str, Job] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        worker_bus.on_request("jobs.get", self._remote_get)
+        worker_bus.on_request("jobs.cancel", self._remote_cancel)
+        worker_bus.on_request("jobs.output", self._remote_output)
+
+    def submit(
+        self,
+        kind: str,
+        command: ATWCommand,
+        task_id: str = "",
+        label: str = "",
+        on_success: Optional[OnSuccess] = None,
+        notice: Optional[dict[str, Any]] = None,
+        stream: bool = False,
+    ) -> tuple[Job, bool]:
+        """Start a job, or return the identical one in flight (second value True).
+
+        `notice` holds the ``notify()`` arguments announcing success; failure
+        and cancellation are announced as ``job_failed`` / ``job_cancelled``.
+        `stream` keeps the command's output lines for ``follow_output``.
+        """
+        self._prune()
+        key = json.dumps([kind, command.args])
+        existing = self._active_by_key.get(key)
+        if existing is not None:
+            return existing, True
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(settings.max_concurrent_jobs)
+        job = Job(
+            id=uuid.uuid4().hex[:12], kind=kind, key=key, command=command,
+            task_id=task_id, label=label or kind, on_success=on_success,
+            notice=notice or {"event_type": "job_complete", "detail": f"{label or kind} completed"},
+            stream=stream,
+        )
+        self._jobs[job.id] = job
+        self._active_by_key[key] = job
+        job.task = asyncio.create_task(self._run(job))
+        logger.info("Job %s (%s) submitted", job.id, job.label)
+        return job, False
+
+    async def _run(self, job: Job):
+        try:
+            async with self._slots:
+                job.status = "running"
+                job.started_at = time.time()
+                result = await atw_client.run_async(job.command, job.add_line if job.stream else None)
+                if result.success:
+                    if job.on_success:
+                        job.response = await job.on_success(result)
+                    else:
+                        job.response = {"success": True, "output": result.raw_output}
+                    job.status = "succeeded"
+                else:
+                    job.status = "failed"
+                    job.error = result.error or "Command failed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            logger.exception("Job %s failed", job.id)
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            job.on_success = None
+            if self._active_by_key.get(job.key) is job:
+                del self._active_by_key[job.key]
+            job.wake_followers()
+            logger.info("Job %s (%s) %s", job.id, job.label, job.status)
+
+        # Announced once the outcome is recorded, so a client reacting to the
+        # notification finds the result
+        if job.status == "succeeded":
+            await notify(task_id=job.task_id, job_id=job.id, **job.notice)
+        elif job.status == "failed":
+            await notify("job_failed", task_id=job.task_id, detail=f"{job.label} failed: {job.error}", job_id=job.id)
+        elif job.status == "cancelled":
+            await notify("job_cancelled", task_id=job.task_id, detail=f"{job.label} cancelled", job_id=job.id)
+
+    def _prune(self):
+        cutoff = time.time() - settings.job_retention
+        for job_id in [j.id for j in self._jobs.values() if not j.active and (j.finished_at or 0) < cutoff]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> list[Job]:
+        self._prune()
+        return sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a job if it has not finished; returns it, or None if unknown."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job.active and job.task:
+            job.task.cancel()
+            await asyncio.gather(job.task, return_exceptions=True)
+        return job
+
+    async def lookup(self, job_id: str) -> Optional[dict[str, Any]]:
+        """A job's details with its response, from this worker or another."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return {**job.to_dict(), "response": job.response}
+        for remote in await worker_bus.request("jobs.get", job_id):
+            if remote:
+                return remote
+        return None
+
+    async def cancel_anywhere(self, job_id: str) -> Optional[dict[str, Any]]:
+        job = await self.cancel(job_id)
+        if job is not None:
+            return job.to_dict()
+        for remote in await worker_bus.request("jobs.cancel", job_id, timeout=5.0):
+            if remote:
+                return remote
+        return None
+
+    async def follow_output(self, job_id: str, after: int = 0) -> AsyncIterator[dict[str, Any]]:
+        """Output messages for one follower of a job.
+
+        - ``{"type": "output", "lines": [{"seq", "stream", "text"}], "seq"}``
+        - ``{"type": "skipped", "count"}``: lines evicted before they were read
+        - ``{"type": "end", ...job}``: the job finished; nothing follows
+
+        Passing the last ``seq`` back as `after` resumes without repeats.
+        Raises KeyError for an unknown job.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            async for message in self._follow_remote(job_id, after):
+                yield message
+            return
+
+        wake = asyncio.Event()
+        job.followers.add(wake)
+        try:
+            while True:
+                wake.clear()
+                for message in _output_messages(*job.output_since(after)):
+                    after = message.get("seq", after)
+                    yield message
+                if not job.active:
+                    yield {"type": "end", **job.to_dict()}
+                    return
+                await wake.wait()
+        finally:
+            job.followers.discard(wake)
+
+    async def _follow_remote(self, job_id: str, after: int) -> AsyncIterator[dict[str, Any]]:
+        while True:
+            replies = [r for r in await worker_bus.request("jobs.output", {"job_id": job_id, "after": after}) if r]
+            if not replies:
+                raise KeyError(job_id)
+            reply = replies[0]
+            for message in _output_messages(reply["lines"], reply["skipped"]):
+                after = message.get("seq", after)
+                yield message
+            if reply["job"]["status"] not in ACTIVE_STATES:
+                yield {"type": "end", **reply["job"]}
+                return
+            await asyncio.sleep(REMOTE_OUTPUT_POLL)
+
+    async def _remote_output(self, payload: dict[str, Any]) -> Optional[dict[str, Any]]:
+        job = self._jobs.get(payload["job_id"])
+        if job is None:
+            return None
+        lines, skipped = job.output_since(payload["after"])
+        return {"lines": lines, "skipped": skipped, "job": job.to_dict()}
+
+    async def _remote_get(self, job_id: str) -> Optional[dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return {**job.to_dict(), "response": job.response} if job else None
+
+    async def _remote_cancel(self, job_id: str) -> Optional[dict[str, Any]]:
+        job = await self.cancel(job_id)
+        return job.to_dict() if job else None
+
+    async def close(self):
+        """Cancel whatever is still running (app shutdown)."""
+        tasks = [job.task for job in self._jobs.values() if job.active and job.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Singleton instance
+jobs = JobRegistry()
@@ -0,0 +1,466 @@
+"""Line index of the workflow log for paging and filtering without rescans.
+
+A background indexer reads the log once and then only what is appended to it
+(woken by the shared ``LogTail`` from ``log_tail``). For every line it keeps
+the byte offset plus the fields parsed from it:
+
+- timestamp: a leading ``YYYY-MM-DD HH:MM:SS`` (``T`` separator, fractions and
+  a ``[`` prefix allowed), as local time
+- level: the first DEBUG / INFO / WARNING / ERROR / CRITICAL word near the start
+- task id: ``task=<id>``, ``task_id: <id>`` and similar
+
+Lines without a timestamp or level (tracebacks, wrapped output) inherit them
+from the line above, so they stay with their entry under every filter.
+
+Columns are ``array`` objects, with per-task and per-level line lists, so a
+query is a few bisects over memory plus one read per returned line. The index
+is mirrored to fixed-size records under ``settings.log_index_dir`` (by the
+worker holding its flock), so a restart only indexes what was appended since.
+Truncation or rotation of the log resets it.
+"""
+
+import asyncio
+import bisect
+import fcntl
+import functools
+import hashlib
+import heapq
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Any, Iterable, Optional
+
+from app.config import settings
+from app.services.log_tail import log_tails
+
+logger = logging.getLogger(__name__)
+
+LEVELS = {"DEBUG": 1, "INFO": 2, "WARNING": 3, "ERROR": 4, "CRITICAL": 5}
+LEVEL_NAMES = {code: name for name, code in LEVELS.items()}
+_LEVEL_ALIASES = {"WARN": "WARNING", "FATAL": "CRITICAL"}
+
+_TIMESTAMP = re.compile(rb"^\[?(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})(?:[.,](\d{1,6}))?")
+_LEVEL = re.compile(rb"\b(DEBUG|INFO|WARNING|WARN|ERROR|CRITICAL|FATAL)\b")
+_TASK = re.compile(rb"\btask(?:[_ ]?id)?\s*[=:]\s*['\"]?([A-Za-z0-9][\w.-]*)", re.IGNORECASE)
+LEVEL_SCAN = 120  # Bytes at the start of a line searched for a level
+
+_RECORD = struct.Struct("<QdBI")  # offset, timestamp, level, task code
+READ_BLOCK = 1024 * 1024
+INDEX_VERSION = 1
+RESTART_DELAY = 1  # Seconds before rebuilding a failed index; doubles per failure...
+RESTART_MAX_DELAY = 300  # ...up to this
+
+
+@functools.lru_cache(maxsize=64)
+def _hour_start(date_hour: bytes) -> float:
+    """Epoch seconds of a local "YYYY-MM-DD HH" (strptime is too slow per line)."""
+    return datetime.strptime(date_hour.decode(), "%Y-%m-%d %H").timestamp()
+
+
+def _parse(line: bytes) -> tuple[Optional[float], int, Optional[str]]:
+    timestamp = None
+    match = _TIMESTAMP.match(line)
+    if match:
+        clock = match[2]
+        try:
+            timestamp = _hour_start(match[1] + b" " + clock[:2]) + int(clock[3:5]) * 60 + int(clock[6:8])
+        except ValueError:
+            pass
+        else:
+            if match[3]:
+                timestamp += int(match[3]) / 10 ** len(match[3])
+    level = 0
+    match = _LEVEL.search(line, 0, LEVEL_SCAN)
+    if match:
+        name = match[1].decode()
+        level = LEVELS[_LEVEL_ALIASES.get(name, name)]
+    match = _TASK.search(line)
+    return timestamp, level, match[1].decode() if match else None
+
+
+def parse_level(name: str) -> int:
+    """Level code for a name such as "error" or "warn" (ValueError if unknown)."""
+    name = name.upper()
+    name = _LEVEL_ALIASES.get(name, name)
+    if name not in LEVELS:
+        raise ValueError(f"Unknown log level: {name.lower()}")
+    return LEVELS[name]
+
+
+class LogIndex:
+    """Offsets and parsed fields of every complete line of one log file."""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self._lock = threading.Lock()
+        self._store_lock_fd: Optional[int] = None
+        self._records = None  # Open .idx file while this worker persists the index
+        self._tasks_file = None
+        self._reset_state(None)
+        name = hashlib.sha1(self.path.encode()).hexdigest()[:16]
+        self._store = os.path.join(os.path.expanduser(settings.log_index_dir), name)
+
+    def _reset_state(self, inode: Optional[int]):
+        self.inode = inode
+        self.indexed = 0  # Bytes of the log covered by the index
+        self._offsets = array("Q")
+        self._times = array("d")
+        self._levels = array("B")
+        self._task_codes = array("I")
+        self._task_ids: list[str] = [""]  # Code 0: no task
+        self._codes: dict[str, int] = {}
+        self._by_task: dict[int, array] = {}
+        self._by_level: dict[int, array] = {}
+        self._inherited = (0.0, 0, 0)  # Timestamp, level, task of the previous entry
+
+    @property
+    def lines(self) -> int:
+        return len(self._offsets)
+
+    # -------------------- persistence --------------------
+
+    def open_store(self):
+        """Load the persisted index and keep it updated if no other worker does."""
+        os.makedirs(os.path.dirname(self._store), exist_ok=True)
+        fd = os.open(self._store + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self._store_lock_fd = fd
+        except BlockingIOError:
+            os.close(fd)  # Another worker persists it; index in memory only
+        loaded = self._load()
+        if self._store_lock_fd is None:
+            return
+        if loaded:
+            # Drop records written after the last meta update, then keep appending
+            with open(self._store + ".idx", "r+b") as f:
+                f.truncate(self.lines * _RECORD.size)
+            with open(self._store + ".tasks", "w", encoding="utf-8") as f:
+                f.writelines(task_id + "\n" for task_id in self._task_ids[1:])
+            self._records = open(self._store + ".idx", "ab")
+            self._tasks_file = open(self._store + ".tasks", "a", encoding="utf-8")
+        else:
+            self._rewrite_store()
+
+    def _load(self) -> bool:
+        try:
+            with open(self._store + ".meta", encoding="utf-8") as f:
+                meta = json.load(f)
+            st = os.stat(self.path)
+        except (OSError, ValueError):
+            return False
+        if meta.get("version") != INDEX_VERSION or meta.get("inode") != st.st_ino or meta.get("indexed", 0) > st.st_size:
+            return False
+        try:
+            with open(self._store + ".tasks", encoding="utf-8") as f:
+                task_ids = [""] + f.read().splitlines()
+            with open(self._store + ".idx", "rb") as f:
+                raw = f.read(meta["lines"] * _RECORD.size)
+        except OSError:
+            return False
+        if len(raw) != meta["lines"] * _RECORD.size:
+            return False
+
+        self._reset_state(st.st_ino)
+        self._task_ids = task_ids
+        self._codes = {task_id: code for code, task_id in enumerate(task_ids) if code}
+        for line, (offset, timestamp, level, task) in enumerate(_RECORD.iter_unpack(raw)):
+            if task >= len(task_ids):
+                self._reset_state(None)
+                return False
+            self._append(line, offset, timestamp, level, task)
+        self.indexed = meta["indexed"]
+        if self.lines:
+            self._inherited = (self._times[-1], self._levels[-1], self._task_codes[-1])
+        logger.info("Loaded log index for %s: %d lines", self.path, self.lines)
+        return True
+
+    def _rewrite_store(self):
+        """Write the whole in-memory index out, then append to it from here on."""
+        self._close_files()
+        with open(self._store + ".idx", "wb") as f:
+            for line in range(self.lines):
+                f.write(_RECORD.pack(self._offsets[line], self._times[line], self._levels[line], self._task_codes[line]))
+        with open(self._store + ".tasks", "w", encoding="utf-8") as f:
+            f.writelines(task_id + "\n" for task_id in self._task_ids[1:])
+        self._records = open(self._store + ".idx", "ab")
+        self._tasks_file = open(self._store + ".tasks", "a", encoding="utf-8")
+        self._write_meta()
+
+    def _write_meta(self):
+        temporary = self._store + ".meta.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "inode": self.inode, "indexed": self.indexed, "lines": self.lines}, f)
+        os.replace(temporary, self._store + ".meta")
+
+    def _close_files(self):
+        for f in (self._records, self._tasks_file):
+            if f:
+                f.close()
+        self._records = self._tasks_file = None
+
+    def close(self):
+        self._close_files()
+        if self._store_lock_fd is not None:
+            os.close(self._store_lock_fd)
+            self._store_lock_fd = None
+
+    # -------------------- indexing (worker thread) --------------------
+
+    def _append(self, line: int, offset: int, timestamp: float, level: int, task: int):
+        self._offsets.append(offset)
+        self._times.append(timestamp)
+        self._levels.append(level)
+        self._task_codes.append(task)
+        if task:
+            self._by_task.setdefault(task, array("I")).append(line)
+        if level:
+            self._by_level.setdefault(level, array("I")).append(line)
+
+    def _task_code(self, task_id: str) -> int:
+        code = self._codes.get(task_id)
+        if code is None:
+            code = len(self._task_ids)
+            self._task_ids.append(task_id)
+            self._codes[task_id] = code
+            if self._tasks_file:
+                self._tasks_file.write(task_id + "\n")
+        return code
+
+    def reset(self, inode: Optional[int] = None):
+        with self._lock:
+            self._reset_state(inode)
+            if self._store_lock_fd is not None:
+                self._rewrite_store()
+
+    def catch_up(self):
+        """Index everything appended since the last call."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self.lines:
+                self.reset()
+            return
+        if st.st_ino != self.inode or st.st_size < self.indexed:
+            logger.info("Workflow log truncated or rotated; reindexing %s", self.path)
+            self.reset(st.st_ino)
+        if st.st_size == self.indexed:
+            return
+
+        started = time.monotonic()
+        before = self.lines
+        with open(self.path, "rb") as f:
+            f.seek(self.indexed)
+            while True:
+                block = f.read(READ_BLOCK)
+                end = block.rfind(b"\n")
+                if end < 0:
+                    break  # Nothing left, or only a partial last line
+                records = []
+                position = 0
+                with self._lock:
+                    timestamp, level, task = self._inherited
+                    while position <= end:
+                        newline = block.index(b"\n", position)
+                        parsed_time, parsed_level, task_id = _parse(block[position:newline])
+                        if parsed_time is not None:
+                            # A new entry: its own fields, nothing inherited
+                            timestamp, level, task = parsed_time, parsed_level, 0
+                        elif parsed_level:
+                            level = parsed_level
+                        if task_id:
+                            task = self._task_code(task_id)
+                        line = self.lines
+                        self._append(line, self.indexed + position, timestamp, level, task)
+                        records.append(_RECORD.pack(self.indexed + position, timestamp, level, task))
+                        position = newline + 1
+                    self._inherited = (timestamp, level, task)
+                    self.indexed += end + 1
+                if self._records:
+                    self._records.write(b"".join(records))
+                f.seek(self.indexed)
+        if self._records:
+            self._records.flush()
+            self._tasks_file.flush()
+            self._write_meta()
+        if self.lines - before > 10000:
+            logger.info("Indexed %d log lines in %.1fs", self.lines - before, time.monotonic() - started)
+
+    # -------------------- queries --------------------
+
+    def query(
+        self,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+        limit: int = 100,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        level: Optional[int] = None,
+        task_id: Optional[str] = None,
+    ) -> dict[str, Any]:
+        """A page of matching lines.
+
+        Without `after` the page is the last `limit` matches before line
+        `before` (default: the end); with `after` it is the first `limit`
+        matches after that line. Lines come back in file order with cursors
+        for the neighbouring pages.
+        """
+        with self._lock:
+            total = self.lines
+            lo, hi = 0, total
+            if since is not None:
+                lo = bisect.bisect_left(self._times, since)
+            if until is not None:
+                hi = bisect.bisect_right(self._times, until)
+            forward = after is not None
+            if forward:
+                lo = max(lo, after + 1)
+            elif before is not None:
+                hi = min(hi, before)
+
+            candidates: Iterable[int]
+            check_level = None
+            if task_id is not None:
+                code = self._codes.get(task_id)
+                candidates = self._slice(self._by_task.get(code, ()), lo, hi, forward)
+                check_level = level
+            elif level is not None:
+                lists = [self._slice(lines, lo, hi, forward) for code, lines in self._by_level.items() if code >= level]
+                candidates = heapq.merge(*lists, reverse=not forward)
+            else:
+                candidates = range(lo, hi) if forward else range(hi - 1, lo - 1, -1)
+
+            matches: list[int] = []
+            for line in candidates:
+                if check_level is not None and self._levels[line] < check_level:
+                    continue
+                matches.append(line)
+                if len(matches) > limit:
+                    break
+            more = len(matches) > limit
+            matches = sorted(matches[:limit])
+            entries = [
+                (line, self._offsets[line],
+                 self._offsets[line + 1] if line + 1 < total else self.indexed,
+                 self._times[line], self._levels[line], self._task_ids[self._task_codes[line]])
+                for line in matches
+            ]
+
+        lines = []
+        with open(self.path, "rb") as f:
+            for line, start, end, timestamp, level_code, task in entries:
+                f.seek(start)
+                text = f.read(end - start).rstrip(b"\r\n").decode("utf-8", errors="replace")
+                lines.append({
+                    "line": line,
+                    "offset": start,
+                    "timestamp": datetime.fromtimestamp(timestamp).isoformat() if timestamp else None,
+                    "level": LEVEL_NAMES.get(level_code),
+                    "task_id": task or None,
+                    "text": text,
+                })
+        first, last = (matches[0], matches[-1]) if matches else (None, None)
+        if forward:
+            prev, next_ = first, last if more else None
+        else:
+            prev, next_ = first if more else None, last if before is not None else None
+        return {"lines": lines, "total_lines": total, "prev": prev, "next": next_}
+
+    @staticmethod
+    def _slice(lines: Iterable[int], lo: int, hi: int, forward: bool) -> Iterable[int]:
+        """Entries of a sorted line list within [lo, hi), in scan order."""
+        start = bisect.bisect_left(lines, lo)
+        end = bisect.bisect_left(lines, hi)
+        return (lines[i] for i in (range(start, end) if forward else range(end - 1, start - 1, -1)))
+
+
+class LogIndexer:
+    """Keeps a LogIndex of the workflow log current in the background (singleton).
+
+    If indexing fails the index is marked failed (``get`` returns None) and
+    rebuilt after a delay that doubles up to RESTART_MAX_DELAY.
+    """
+
+    def __init__(self):
+        self.index: Optional[LogIndex] = None
+        self.failed = False
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+        self._updating = asyncio.Lock()  # One catch-up or reset at a time
+
+    async def get(self, path: str) -> Optional[LogIndex]:
+        """The index for path, started on first use and caught up to the file end.
+
+        None while the indexer has failed and not yet recovered.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(path))
+        await self._ready.wait()
+        return None if self.failed else self.index
+
+    async def _run(self, path: str):
+        delay = RESTART_DELAY
+        while True:
+            self.index = index = LogIndex(path)
+            try:
+                await self._follow(index)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                if not self.failed:
+                    delay = RESTART_DELAY  # It was working; start the backoff over
+                logger.exception("Workflow log indexer failed; restarting in %ds", delay)
+                self.failed = True
+                self._ready.set()
+            async with self._updating:
+                index.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RESTART_MAX_DELAY)
+
+    async def _follow(self, index: LogIndex):
+        tail = log_tails.acquire(index.path)
+        queue, _ = tail.subscribe()
+        try:
+            async with self._updating:
+                await asyncio.to_thread(index.open_store)
+                await asyncio.to_thread(index.catch_up)
+            self.failed = False
+            self._ready.set()
+            while True:
+                # The tail only wakes us up; the index reads the file itself
+                messages = [await queue.get()]
+                while not queue.empty():
+                    messages.append(queue.get_nowait())
+                async with self._updating:
+                    if any(m["type"] == "reset" for m in messages):
+                        await asyncio.to_thread(index.reset)
+                    await asyncio.to_thread(index.catch_up)
+        finally:
+            tail.unsubscribe(queue)
+            log_tails.release(tail)
+
+    async def reset(self):
+        """Drop the index (after the log was cleared) and rebuild it."""
+        if self.index is None or self.failed:
+            return
+        async with self._updating:
+            await asyncio.to_thread(self.index.reset)
+            await asyncio.to_thread(self.index.catch_up)
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.index:
+            self.index.close()
+
+
+# Singleton instance
+log_indexer = LogIndexer()
@@ -0,0 +1,288 @@
+"""Follow a log file by byte offset, publishing only appended lines.
+
+One ``LogTail`` per file is shared by every follower (see ``log_tails``). It
+watches the file's directory with inotify from the event loop, so an idle log
+costs nothing; on each change it reads from its offset to the end of the file
+and hands the new complete lines to subscribers. Truncation (``logs --clear``)
+and rotation (a new inode at the same path) restart it from offset 0 and tell
+subscribers to clear what they show. Without inotify the file is polled.
+
+Backfill for a new follower is read backwards from its starting offset, so
+its cost depends on the number of lines asked for, not the file size.
+"""
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Optional
+
+from app.services.file_watcher import (
+    IN_CLOSE_WRITE,
+    IN_CREATE,
+    IN_DELETE,
+    IN_MODIFY,
+    IN_MOVED_FROM,
+    IN_MOVED_TO,
+    IN_Q_OVERFLOW,
+    Inotify,
+    inotify_available,
+)
+
+logger = logging.getLogger(__name__)
+
+TAIL_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_CREATE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM
+POLL_INTERVAL = 1.0  # Seconds between checks when inotify is unavailable
+READ_MAX = 1024 * 1024  # Bytes read per loop iteration; the rest is read on the next one
+BACKFILL_BLOCK = 64 * 1024
+RESUME_MAX = 4 * 1024 * 1024  # Further behind than this, a resuming follower gets a backfill
+SUBSCRIBER_QUEUE_SIZE = 256  # Pending messages per follower before it is resynced
+
+
+def _split_lines(data: bytes) -> list[str]:
+    return [line.decode("utf-8", errors="replace").rstrip("\r") for line in data.split(b"\n")]
+
+
+def read_tail(path: str, lines: int, end: int) -> list[str]:
+    """The last `lines` complete lines before byte offset `end`."""
+    if lines <= 0 or end <= 0:
+        return []
+    chunks: list[bytes] = []
+    newlines = 0
+    position = end
+    with open(path, "rb") as f:
+        # One extra newline: the line before the first one returned must be complete
+        while position > 0 and newlines <= lines:
+            size = min(BACKFILL_BLOCK, position)
+            position -= size
+            f.seek(position)
+            chunk = f.read(size)
+            newlines += chunk.count(b"\n")
+            chunks.append(chunk)
+    data = b"".join(reversed(chunks))
+    if data.endswith(b"\n"):
+        data = data[:-1]
+    result = _split_lines(data)
+    if position > 0:
+        result = result[1:]  # Starts mid-line
+    return result[-lines:]
+
+
+def read_range(path: str, start: int, end: int) -> list[str]:
+    """Complete lines between two line-aligned byte offsets."""
+    if end <= start:
+        return []
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return _split_lines(data[:-1] if data.endswith(b"\n") else data)
+
+
+class LogTail:
+    """Tails one file and fans appended lines out to subscriber queues."""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.offset = 0  # End of the last complete line read
+        self._partial = b""
+        self._inode: Optional[int] = None
+        self._inotify: Optional[Inotify] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._poll_handle: Optional[asyncio.TimerHandle] = None
+        self._read_again: Optional[asyncio.Handle] = None
+        self._subscribers: set[asyncio.Queue] = set()
+
+    # -------------------- lifecycle --------------------
+
+    def start(self):
+        """Start at the current end of the file and watch it for changes."""
+        self._loop = asyncio.get_running_loop()
+        try:
+            st = os.stat(self.path)
+            self._inode, self.offset = st.st_ino, st.st_size
+        except FileNotFoundError:
+            pass  # Followed from offset 0 once it is created
+        if inotify_available():
+            self._inotify = Inotify()
+            try:
+                self._inotify.add_watch(os.path.dirname(self.path), TAIL_MASK)
+            except OSError:
+                self._inotify.close()
+                self._inotify = None
+                raise
+            self._loop.add_reader(self._inotify.fd, self._on_readable)
+        else:
+            self._poll_handle = self._loop.call_later(POLL_INTERVAL, self._poll)
+        logger.info("Following %s from offset %d", self.path, self.offset)
+
+    def close(self):
+        for handle in (self._poll_handle, self._read_again):
+            if handle:
+                handle.cancel()
+        self._poll_handle = self._read_again = None
+        if self._inotify:
+            if self._loop:
+                self._loop.remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+        logger.info("Stopped following %s", self.path)
+
+    # -------------------- subscribers --------------------
+
+    def subscribe(self) -> tuple[asyncio.Queue, int]:
+        """A queue of messages plus the offset they continue from."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue, self.offset
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def _publish(self, message: dict[str, Any]):
+        for queue in self._subscribers:
+            if queue.full():
+                # Follower is too far behind; it backfills from here instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync", "offset": self.offset})
+            else:
+                queue.put_nowait(message)
+
+    # -------------------- reading --------------------
+
+    def _on_readable(self):
+        if not self._inotify:
+            return
+        name = os.path.basename(self.path)
+        relevant = False
+        for _wd, mask, _cookie, event_name in self._inotify.read_events():
+            if event_name == name or mask & IN_Q_OVERFLOW:
+                relevant = True
+        if relevant:
+            self._read()
+
+    def _poll(self):
+        self._poll_handle = self._loop.call_later(POLL_INTERVAL, self._poll)
+        self._read()
+
+    def _reset(self, inode: Optional[int]):
+        self._inode = inode
+        self.offset = 0
+        self._partial = b""
+        self._publish({"type": "reset"})
+
+    def _read(self):
+        self._read_again = None
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self._inode is not None:
+                self._reset(None)  # Removed; follow the next file from its start
+            return
+        except OSError:
+            return
+
+        position = self.offset + len(self._partial)
+        if st.st_ino != self._inode or st.st_size < position:
+            self._reset(st.st_ino)  # Rotated or truncated
+            position = 0
+        if st.st_size == position:
+            return
+
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(position)
+                chunk = f.read(min(st.st_size - position, READ_MAX))
+        except OSError as e:
+            logger.warning("Cannot read %s: %s", self.path, e)
+            return
+
+        data = self._partial + chunk
+        end = data.rfind(b"\n")
+        if end < 0:
+            self._partial = data
+        else:
+            self._partial = data[end + 1:]
+            self.offset += end + 1
+            self._publish({"type": "lines", "lines": _split_lines(data[:end]), "offset": self.offset})
+        if position + len(chunk) < st.st_size:
+            # More than READ_MAX was appended; continue without starving the loop
+            self._read_again = self._loop.call_soon(self._read)
+
+
+@dataclass
+class _Entry:
+    tail: LogTail
+    refs: int = field(default=0)
+
+
+class LogTailRegistry:
+    """Shares one LogTail per file among all followers."""
+
+    def __init__(self):
+        self._tails: dict[str, _Entry] = {}
+
+    def acquire(self, path: str) -> LogTail:
+        """Return the tail for path, starting it if needed. Pair with release()."""
+        key = os.path.abspath(path)
+        entry = self._tails.get(key)
+        if entry is None:
+            tail = LogTail(key)
+            tail.start()
+            entry = _Entry(tail=tail)
+            self._tails[key] = entry
+        entry.refs += 1
+        return entry.tail
+
+    def release(self, tail: LogTail):
+        entry = self._tails.get(tail.path)
+        if entry is None or entry.tail is not tail:
+            return
+        entry.refs -= 1
+        if entry.refs <= 0:
+            self._tails.pop(tail.path, None)
+            tail.close()
+
+    def close_all(self):
+        for entry in self._tails.values():
+            entry.tail.close()
+        self._tails.clear()
+
+
+# Singleton instance
+log_tails = LogTailRegistry()
+
+
+async def follow(path: str, lines: int = 100, resume: Optional[int] = None) -> AsyncIterator[dict[str, Any]]:
+    """Messages for one follower of `path`.
+
+    - ``{"type": "backfill", "lines", "offset"}``: replace the view with these
+      lines (first message, and again after falling behind)
+    - ``{"type": "lines", "lines", "offset"}``: append these lines
+    - ``{"type": "reset"}``: the file was truncated or rotated; clear the view
+
+    ``offset`` is the byte offset after the last line; passing it back as
+    `resume` continues without a gap (a backfill is sent if that is no longer
+    possible).
+    """
+    tail = log_tails.acquire(path)
+    queue, start = tail.subscribe()
+    try:
+        if resume is not None and 0 <= resume <= start and start - resume <= RESUME_MAX:
+            missed = await asyncio.to_thread(read_range, tail.path, resume, start)
+            if missed:
+                yield {"type": "lines", "lines": missed, "offset": start}
+        else:
+            backfill = await asyncio.to_thread(read_tail, tail.path, lines, start) if start else []
+            yield {"type": "backfill", "lines": backfill, "offset": start}
+
+        while True:
+            message = await queue.get()
+            if message["type"] == "resync":
+                end = message["offset"]
+                backfill = await asyncio.to_thread(read_tail, tail.path, lines, end) if end else []
+                message = {"type": "backfill", "lines": backfill, "offset": end}
+            yield message
+    finally:
+        tail.unsubscribe(queue)
+        log_tails.release(tail)
@@ -1,46 +1,556 @@
-"""Real-time notification broadcasting via WebSocket."""
+"""Real-time notification broadcasting via WebSocket.
+
+Each client gets a bounded outbound queue drained by its own writer task, so
+``broadcast`` never awaits a socket: it serialises the event once and appends
+the text to every queue. A slow client only delays itself; once its queue is
+full the overflow policy either drops its oldest pending message or
+disconnects it.
+
+Clients may narrow what they receive with a subscription (task ids, projects,
+event types). A subscription index maps each value to its subscribers, so an
+event is matched by a few set lookups instead of a scan over every client.
+
+Every event gets a sequence number and is kept in a ring buffer (optionally
+mirrored to a JSON-lines file so it survives restarts). A reconnecting client
+passes the last sequence number it saw and receives only the gap, or a
+"resync" message when the gap is no longer in the buffer.
+
+Bursty event types (see COALESCED_EVENTS) are held for a short window: events
+for the same task merge into one carrying the latest state, and everything
+flushed together reaches each client as a single "batch" frame.
+
+With several uvicorn workers (``settings.ipc_socket``) every worker hands its
+events to the bus hub, which coalesces, numbers and logs them and publishes
+the result; each worker then fans it out to its own clients. Sequence numbers
+therefore stay global and only the hub writes the log file.
+"""
 
 import asyncio
+import bisect
+import itertools
+import json
 import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any
+from typing import Any, Callable, Optional
 
 from fastapi import WebSocket
 
+from app.config import settings
+from app.services.atw_client import atw_client
+from app.services.ipc_bus import worker_bus
+
 logger = logging.getLogger(__name__)
 
+CLIENT_QUEUE_SIZE = 256  # Pending messages per client before the overflow policy applies
+PROJECT_CACHE_TTL = 600.0  # Seconds a task -> project lookup is reused
+COALESCED_EVENTS = {"workflow_state_change"}
+
+# Event fields a subscription can filter on
+SUBSCRIPTION_FIELDS = ("task_ids", "projects", "events")
+
+
+def _filter_values(event: dict[str, Any]) -> dict[str, Optional[str]]:
+    """The value an event has for each subscription field (None: not set)."""
+    return {
+        "task_ids": event.get("task_id") or None,
+        "projects": event.get("project") or None,
+        "events": event.get("type") or None,
+    }
+
+
+@dataclass(frozen=True)
+class Subscription:
+    """What a client wants to receive; an empty set means "any"."""
+
+    task_ids: frozenset[str] = frozenset()
+    projects: frozenset[str] = frozenset()
+    events: frozenset[str] = frozenset()
+
+    @classmethod
+    def from_message(cls, message: dict[str, Any]) -> "Subscription":
+        def values(key: str) -> frozenset[str]:
+            raw = message.get(key) or []
+            if isinstance(raw, str):
+                raw = [raw]
+            return frozenset(str(v) for v in raw if v)
+
+        return cls(**{key: values(key) for key in SUBSCRIPTION_FIELDS})
+
+    def to_dict(self) -> dict[str, list[str]]:
+        return {key: sorted(getattr(self, key)) for key in SUBSCRIPTION_FIELDS}
+
+    def matches(self, event: dict[str, Any]) -> bool:
+        """Single-event check (replay); live delivery uses SubscriptionIndex."""
+        for key, value in _filter_values(event).items():
+            allowed = getattr(self, key)
+            if allowed and value is not None and value not in allowed:
+                return False
+        return True
+
+
+class EventLog:
+    """The most recent events by sequence number, optionally persisted.
+
+    Only the worker that numbers events (the single worker, or the bus hub)
+    calls ``open()`` to load, compact and append to the file; the others
+    fill their buffer through ``store()``.
+    """
+
+    def __init__(self, size: int, path: str = ""):
+        self._events: deque[tuple[int, dict[str, Any], str]] = deque(maxlen=size)
+        self.last_seq = 0
+        self._path = os.path.expanduser(path) if path else ""
+        self._file = None
+
+    def open(self):
+        """Restore the tail of the log file and continue numbering from it."""
+        if not self._path or self._file:
+            return
+        lines: deque[str] = deque(maxlen=self._events.maxlen)
+        total = 0
+        try:
+            with open(self._path, encoding="utf-8") as f:
+                for line in f:
+                    lines.append(line)
+                    total += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Cannot read notification log %s: %s", self._path, e)
+
+        loaded: deque[tuple[int, dict[str, Any], str]] = deque(maxlen=self._events.maxlen)
+        for line in lines:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            loaded.append((event["seq"], event, line.rstrip("\n")))
+        if loaded:
+            # The file has everything delivered so far, including what this
+            # worker may have missed as a bus follower
+            self._events = loaded
+            self.last_seq = max(self.last_seq, loaded[-1][0])
+
+        try:
+            os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+            if total > 4 * len(lines):
+                # Compact: keep only what the ring buffer holds
+                with open(self._path, "w", encoding="utf-8") as f:
+                    f.writelines(lines)
+            self._file = open(self._path, "a", encoding="utf-8", buffering=1)
+        except OSError as e:
+            logger.warning("Notification log disabled (%s): %s", self._path, e)
+        logger.info("Loaded %d notifications (last seq %d)", len(self._events), self.last_seq)
+
+    def append(self, event: dict[str, Any]) -> str:
+        """Number the event, store it and return its serialised form."""
+        self.last_seq += 1
+        event["seq"] = self.last_seq
+        text = json.dumps(event)
+        self._events.append((self.last_seq, event, text))
+        if self._file:
+            try:
+                self._file.write(text + "\n")
+            except OSError as e:
+                logger.warning("Notification log write failed: %s", e)
+        return text
+
+    def store(self, event: dict[str, Any]) -> str:
+        """Keep an event numbered by another worker (memory only)."""
+        self.last_seq = max(self.last_seq, event["seq"])
+        text = json.dumps(event)
+        self._events.append((event["seq"], event, text))
+        return text
+
+    def since(self, seq: int) -> Optional[list[tuple[dict[str, Any], str]]]:
+        """Events after seq, or None if some of them are no longer buffered."""
+        if seq == self.last_seq:
+            return []
+        if seq > self.last_seq or not self._events:
+            return None  # From before a restart, or the buffer is empty
+        if seq < self._events[0][0] - 1:
+            return None
+        # By sequence number: the buffer can have gaps (unreadable log lines,
+        # deliveries missed while rejoining the bus)
+        start = bisect.bisect_right(self._events, seq, key=lambda entry: entry[0])
+        return [(event, text) for _, event, text in itertools.islice(self._events, start, None)]
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class NotificationClient:
+    """One subscriber with its outbound queue.
+
+    WebSocket clients get a writer task draining the queue; SSE clients are
+    drained by their response generator via next(), so an idle SSE
+    subscriber costs no task of its own.
+    """
+
+    def __init__(self, ws: Optional[WebSocket] = None, address: str = "unknown",
+                 max_queued: int = CLIENT_QUEUE_SIZE):
+        self.ws = ws
+        self.address = address
+        self.max_queued = max_queued
+        self.dropped = 0
+        self.sent = 0
+        self.closed = False
+        self.subscription = Subscription()
+        self._queue: deque[tuple[Optional[int], str]] = deque()  # (seq, text)
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    @property
+    def transport(self) -> str:
+        return "websocket" if self.ws is not None else "sse"
+
+    def start(self, on_failure: Callable[["NotificationClient"], None]):
+        self._writer = asyncio.create_task(self._write_loop(on_failure))
+
+    def enqueue(self, text: str, seq: Optional[int] = None) -> bool:
+        """Queue pre-serialised text. Returns False if the client must be dropped."""
+        if self.closed:
+            return False
+        if len(self._queue) >= self.max_queued:
+            if settings.notification_overflow == "disconnect":
+                return False
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append((seq, text))
+        self._ready.set()
+        return True
+
+    def send_json(self, message: dict[str, Any]):
+        """Queue a control message (ping, connected) for this client only."""
+        self.enqueue(json.dumps(message))
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    async def next(self, timeout: float) -> Optional[tuple[Optional[int], str]]:
+        """Next (seq, text) to send, or None after `timeout` idle seconds or on close."""
+        if not self._queue and not self.closed:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if not self._queue:
+            return None
+        self.sent += 1
+        return self._queue.popleft()
+
+    async def _write_loop(self, on_failure: Callable[["NotificationClient"], None]):
+        try:
+            while True:
+                while not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                _seq, text = self._queue.popleft()
+                await self.ws.send_text(text)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            on_failure(self)
+
+    async def close(self):
+        self.closed = True
+        self._queue.clear()
+        self._ready.set()  # Wake an SSE generator waiting in next()
+        if self._writer and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+
+    async def abort(self):
+        """Stop writing and close the transport; the endpoint then sees the disconnect."""
+        await self.close()
+        if self.ws is None:
+            return
+        try:
+            await self.ws.close()
+        except Exception:
+            pass
+
+
+class SubscriptionIndex:
+    """Inverted index from subscription values to clients.
+
+    For each field, clients either listed specific values (``_by_value``) or
+    accept anything (``_any``). Matching an event is one union per field and
+    an intersection across fields.
+    """
+
+    def __init__(self):
+        self._by_value: dict[str, dict[str, set[NotificationClient]]] = {
+            key: {} for key in SUBSCRIPTION_FIELDS
+        }
+        self._any: dict[str, set[NotificationClient]] = {key: set() for key in SUBSCRIPTION_FIELDS}
+        self._all: set[NotificationClient] = set()
+
+    def add(self, client: NotificationClient):
+        self._all.add(client)
+        for key in SUBSCRIPTION_FIELDS:
+            values = getattr(client.subscription, key)
+            if not values:
+                self._any[key].add(client)
+            for value in values:
+                self._by_value[key].setdefault(value, set()).add(client)
+
+    def remove(self, client: NotificationClient):
+        self._all.discard(client)
+        for key in SUBSCRIPTION_FIELDS:
+            self._any[key].discard(client)
+            for value in getattr(client.subscription, key):
+                subscribers = self._by_value[key].get(value)
+                if subscribers is not None:
+                    subscribers.discard(client)
+                    if not subscribers:
+                        del self._by_value[key][value]
+
+    def filters_on(self, key: str) -> bool:
+        """Whether any client filters on this field."""
+        return bool(self._by_value[key])
+
+    def match(self, event: dict[str, Any]) -> set[NotificationClient]:
+        """Clients whose subscription accepts the event.
+
+        Events without a task id or project (e.g. "all tasks queued") concern
+        every task, so they pass those filters.
+        """
+        candidates: list[set[NotificationClient]] = []
+        for key, value in _filter_values(event).items():
+            if value is None or not self._by_value[key]:
+                continue
+            candidates.append(self._any[key] | self._by_value[key].get(value, set()))
+        if not candidates:
+            return set(self._all)
+        candidates.sort(key=len)
+        return candidates[0].intersection(*candidates[1:])
+
 
 class NotificationManager:
     """In-memory WebSocket broadcast manager (singleton)."""
 
     def __init__(self):
-        self._clients: set[WebSocket] = set()
-        self._lock = asyncio.Lock()
+        self._clients: set[NotificationClient] = set()
+        self._aborting: set[asyncio.Task] = set()
+        self._resolving: set[asyncio.Task] = set()  # One project lookup per task id
+        self._waiting: dict[str, list[dict[str, Any]]] = {}  # Task id -> events held for its lookup
+        self._index = SubscriptionIndex()
+        self._project_cache: dict[str, tuple[float, str]] = {}
+        self._log = EventLog(settings.notification_history, settings.notification_log)
+        # Coalescing window: task id -> merged event awaiting flush
+        self._pending: dict[str, dict[str, Any]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        if not settings.ipc_socket:
+            self._log.open()  # Otherwise opened by whichever worker becomes the bus hub
+        worker_bus.on("notify", self._accept)
+        worker_bus.on("notify.deliver", self._on_remote_delivery)
+        worker_bus.on_role(self._on_bus_role)
+
+    @property
+    def last_seq(self) -> int:
+        return self._log.last_seq
+
+    def _on_bus_role(self, is_hub: bool):
+        """Only the hub numbers events, so only it reads and writes the log file."""
+        if is_hub:
+            self._log.open()
+        else:
+            self._log.close()
+
+    @property
+    def clients(self) -> list[NotificationClient]:
+        return list(self._clients)
 
-    async def connect(self, ws: WebSocket):
-        async with self._lock:
-            self._clients.add(ws)
-        logger.info("Notification client connected (%d total)", len(self._clients))
+    def _add(self, client: NotificationClient) -> NotificationClient:
+        self._clients.add(client)
+        self._index.add(client)
+        logger.info("Notification %s client connected (%d total)", client.transport, len(self._clients))
+        return client
 
-    async def disconnect(self, ws: WebSocket):
-        async with self._lock:
-            self._clients.discard(ws)
-        logger.info("Notification client disconnected (%d total)", len(self._clients))
+    async def connect(self, ws: WebSocket) -> NotificationClient:
+        addr = ws.client
+        client = NotificationClient(ws, address=f"{addr.host}:{addr.port}" if addr else "unknown")
+        client.start(self._drop)
+        return self._add(client)
+
+    async def connect_stream(self, address: str = "unknown") -> NotificationClient:
+        """Register an SSE subscriber; its response generator drains the queue."""
+        return self._add(NotificationClient(address=address))
+
+    async def disconnect(self, client: NotificationClient):
+        if client in self._clients:
+            self._clients.discard(client)
+            self._index.remove(client)
+        await client.close()
+        logger.info("Notification %s client disconnected (%d total)", client.transport, len(self._clients))
+
+    def _drop(self, client: NotificationClient):
+        """Forget a client whose socket failed or who fell too far behind.
+
+        Closing happens in the background so the caller never waits on the
+        socket.
+        """
+        if client in self._clients:
+            self._clients.discard(client)
+            self._index.remove(client)
+            logger.info("Removed dead notification client (%d total)", len(self._clients))
+        client.closed = True
+        task = asyncio.create_task(client.abort())
+        self._aborting.add(task)
+        task.add_done_callback(self._aborting.discard)
+
+    def subscribe(self, client: NotificationClient, subscription: Subscription):
+        """Replace a client's subscription."""
+        if client not in self._clients:
+            return
+        self._index.remove(client)
+        client.subscription = subscription
+        self._index.add(client)
+
+    def _cached_project(self, task_id: str) -> Optional[str]:
+        cached = self._project_cache.get(task_id)
+        if cached and time.monotonic() - cached[0] < PROJECT_CACHE_TTL:
+            return cached[1]
+        return None
+
+    async def _resolve_and_send(self, task_id: str):
+        """Look up a task's project with the CLI, then send the events held for it."""
+        project = ""
+        try:
+            result = await asyncio.to_thread(atw_client.task_detail, task_id)
+            if result.success and isinstance(result.data, dict):
+                raw = result.data.get("project")
+                project = raw.get("name", "") if isinstance(raw, dict) else (raw or "")
+            self._project_cache[task_id] = (time.monotonic(), project)
+        except Exception:
+            logger.exception("Project lookup for %s failed", task_id)
+        for event in self._waiting.pop(task_id, []):
+            event["project"] = event.get("project") or project
+            self._send(event)
 
     async def broadcast(self, event: dict[str, Any]):
         event["timestamp"] = datetime.now(timezone.utc).isoformat()
+        task_id = event.get("task_id")
+        if task_id in self._waiting:
+            # Queue behind the events already waiting, so the task's events
+            # stay in order and share the lookup in flight
+            self._waiting[task_id].append(event)
+            return
+        # Project filters need the task's project. Other workers' subscriptions
+        # are unknown here, so it is also resolved whenever there are any
+        if task_id and not event.get("project") and (
+            self._index.filters_on("projects") or worker_bus.members > 1
+        ):
+            project = self._cached_project(task_id)
+            if project is None:
+                # The lookup runs the CLI; send once it is done instead of
+                # holding up the caller (the event is numbered when sent)
+                self._waiting[task_id] = [event]
+                task = asyncio.create_task(self._resolve_and_send(task_id))
+                self._resolving.add(task)
+                task.add_done_callback(self._resolving.discard)
+                return
+            event["project"] = project
+        self._send(event)
+
+    def _send(self, event: dict[str, Any]):
+        if worker_bus.active and not worker_bus.is_hub:
+            worker_bus.send_to_hub("notify", event)
+        else:
+            self._accept(event)
+
+    def _accept(self, event: dict[str, Any]):
+        window = settings.notification_coalesce_window
+        if window > 0 and event.get("type") in COALESCED_EVENTS:
+            self._coalesce(event, window)
+        else:
+            self._deliver([event])
+
+    def _coalesce(self, event: dict[str, Any], window: float):
+        """Merge the event into the pending one for its task; flush when the window ends."""
+        key = event.get("task_id") or ""
+        previous = self._pending.get(key)
+        if previous is not None:
+            merged = {**previous, **{k: v for k, v in event.items() if v not in ("", None)}}
+            # Report the whole transition: first old status, latest new status
+            merged["old_status"] = previous.get("old_status") or event.get("old_status", "")
+            merged["merged"] = previous.get("merged", 1) + 1
+            event = merged
+        self._pending[key] = event
+        if self._flush_handle is None:
+            # Fixed window from the first event, so a steady stream cannot starve delivery
+            self._flush_handle = asyncio.get_running_loop().call_later(window, self.flush_pending)
+
+    def flush_pending(self):
+        """Deliver everything held by the coalescing window."""
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = list(self._pending.values()), {}
+        if pending:
+            self._deliver(pending)
+
+    def _deliver(self, events: list[dict[str, Any]]):
+        """Number and log the events, then fan them out here and on other workers."""
+        texts = [self._log.append(event) for event in events]
+        if worker_bus.active:
+            worker_bus.publish("notify.deliver", {"events": events})
+        self._fan_out(events, texts)
+
+    def _on_remote_delivery(self, payload: dict[str, Any]):
+        """Fan out events the hub numbered to this worker's clients."""
+        events = payload["events"]
+        self._fan_out(events, [self._log.store(event) for event in events])
+
+    def _fan_out(self, events: list[dict[str, Any]], texts: list[str]):
+        """Queue the events for every matching local client.
+
+        Each event is serialised once. A client matching several events gets
+        them as one batch frame; clients matching the same events share it.
+        """
+        per_client: dict[NotificationClient, list[int]] = {}
+        for i, event in enumerate(events):
+            for client in self._index.match(event):
+                per_client.setdefault(client, []).append(i)
+
+        frames: dict[tuple[int, ...], str] = {}
+        for client, indexes in per_client.items():
+            key = tuple(indexes)
+            frame = frames.get(key)
+            if frame is None:
+                if len(indexes) == 1:
+                    frame = texts[indexes[0]]
+                else:
+                    frame = '{"type": "batch", "events": [' + ", ".join(texts[i] for i in indexes) + "]}"
+                frames[key] = frame
+            # A batch resumes after its last event
+            if not client.enqueue(frame, events[indexes[-1]]["seq"]):
+                logger.warning("Notification client fell behind; disconnecting")
+                self._drop(client)
+
+    def replay(self, client: NotificationClient, since: int):
+        """Queue the events a reconnecting client missed, or ask it to resync."""
+        missed = self._log.since(since)
+        if missed is None:
+            client.send_json({"type": "resync", "seq": self.last_seq})
+            return
+        for event, text in missed:
+            if client.subscription.matches(event):
+                client.enqueue(text, event["seq"])
 
-        async with self._lock:
-            dead: list[WebSocket] = []
-            for ws in self._clients:
-                try:
-                    await ws.send_json(event)
-                except Exception:
-                    dead.append(ws)
-            for ws in dead:
-                self._clients.discard(ws)
-            if dead:
-                logger.info("Removed %d dead notification clients", len(dead))
+    def close(self):
+        self.flush_pending()
+        self._log.close()
 
 
 # Singleton instance
@@ -51,16 +561,22 @@ async def notify(
     event_type: str,
     task_id: str = "",
     task_name: str = "",
+    project: str = "",
     old_status: str = "",
     new_status: str = "",
     detail: str = "",
+    job_id: str = "",
 ):
     """Convenience function for route handlers to broadcast a notification."""
-    await manager.broadcast({
+    event = {
         "type": event_type,
         "task_id": task_id,
         "task_name": task_name,
+        "project": project,
         "old_status": old_status,
         "new_status": new_status,
         "detail": detail,
-    })
+    }
+    if job_id:
+        event["job_id"] = job_id
+    await manager.broadcast(event)
@@ -0,0 +1,82 @@
+"""Process statistics read straight from /proc (Linux only).
+
+Cheap enough to call per request: one small read per process, no
+subprocesses. Returns None where /proc is unavailable or the process is gone.
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+@dataclass
+class ProcessStats:
+    """Resource usage of one process."""
+
+    pid: int
+    state: str
+    cpu_seconds: float  # User + system time
+    rss_bytes: int
+    uptime_seconds: float
+
+
+def _boot_time() -> Optional[float]:
+    try:
+        with open("/proc/stat") as f:
+            for line in f:
+                if line.startswith("btime "):
+                    return float(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+_BOOT_TIME = _boot_time()
+
+
+def read_process_stats(pid: int) -> Optional[ProcessStats]:
+    """Stats for pid from /proc/<pid>/stat, or None if it does not exist."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            raw = f.read()
+    except OSError:
+        return None
+    # comm (field 2) may contain spaces and parentheses; split after the last ")"
+    fields = raw[raw.rfind(")") + 2:].split()
+    try:
+        state = fields[0]
+        utime, stime = int(fields[11]), int(fields[12])
+        start_ticks = int(fields[19])
+        rss_pages = int(fields[21])
+    except (IndexError, ValueError):
+        return None
+
+    uptime = 0.0
+    if _BOOT_TIME is not None:
+        uptime = max(0.0, time.time() - (_BOOT_TIME + start_ticks / _CLOCK_TICKS))
+    return ProcessStats(
+        pid=pid,
+        state=state,
+        cpu_seconds=(utime + stime) / _CLOCK_TICKS,
+        rss_bytes=rss_pages * _PAGE_SIZE,
+        uptime_seconds=uptime,
+    )
+
+
+class CpuSampler:
+    """Turns successive cumulative CPU readings into a utilisation percentage."""
+
+    def __init__(self):
+        self._last: Optional[tuple[float, float]] = None  # (monotonic, cpu_seconds)
+
+    def sample(self, stats: ProcessStats) -> Optional[float]:
+        """Percent of one core used since the previous sample (None on the first)."""
+        now = time.monotonic()
+        last, self._last = self._last, (now, stats.cpu_seconds)
+        if last is None or now <= last[0]:
+            return None
+        return round(100.0 * (stats.cpu_seconds - last[1]) / (now - last[0]), 1)
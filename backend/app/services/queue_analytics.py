@@ -0,0 +1,213 @@
+"""Queue wait times, run times, throughput and ETAs from status snapshots.
+
+The CLI reports only the current queue and the running tasks. Every snapshot
+the API serves is fed to ``queue_analytics``, which diffs it against the
+previous one:
+
+- a task first seen in the queue was enqueued then
+- a task first seen running started ``runtime_seconds`` ago; its wait is the
+  time since it was enqueued
+- a task no longer running finished between the last snapshot that showed
+  it and this one; its run time is recorded up to the midpoint, unless the
+  two are more than MAX_POLL_GAP apart (nobody was polling)
+
+Wait and run times go into per-workflow-type rolling windows that keep
+running sums, so statistics are O(1) to read and each snapshot costs
+O(queue length). ETAs replay the queue over the executor's slots using the
+mean run time of each type.
+
+Each worker keeps its own statistics, from the snapshots it served.
+"""
+
+import heapq
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+WINDOW = 6 * 3600.0  # Seconds of history the statistics cover
+LEFT_GRACE = 120.0  # Seconds a task that left the queue may take to show up as running
+MAX_POLL_GAP = 300.0  # Seconds between snapshots past which a finish time is too vague to record
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp is not None else None
+
+
+class _Rolling:
+    """Samples of the last WINDOW seconds, with a running sum for the mean."""
+
+    def __init__(self):
+        self._samples: deque[tuple[float, float]] = deque()
+        self._sum = 0.0
+
+    def add(self, at: float, value: float):
+        self._samples.append((at, value))
+        self._sum += value
+
+    def trim(self, now: float):
+        while self._samples and self._samples[0][0] < now - WINDOW:
+            self._sum -= self._samples.popleft()[1]
+
+    @property
+    def count(self) -> int:
+        return len(self._samples)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self._sum / len(self._samples) if self._samples else None
+
+
+class _TypeStats:
+    def __init__(self):
+        self.waits = _Rolling()
+        self.durations = _Rolling()
+
+
+class QueueAnalytics:
+    """Per-type queue statistics and ETAs (singleton)."""
+
+    def __init__(self):
+        self._stats: dict[str, _TypeStats] = {}
+        self._all = _TypeStats()
+        self._enqueued: dict[str, float] = {}  # In the queue: source_id -> first seen
+        self._left: dict[str, tuple[float, float]] = {}  # Left the queue: (enqueued, left), not yet running
+        self._running: dict[str, tuple[str, float, float]] = {}  # source_id -> (type, started, last seen)
+        self._since: Optional[float] = None  # First executor snapshot
+
+    def _type(self, name: str) -> _TypeStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = _TypeStats()
+        return stats
+
+    def _trim(self, now: float):
+        for stats in (self._all, *self._stats.values()):
+            stats.waits.trim(now)
+            stats.durations.trim(now)
+
+    # -------------------- snapshots --------------------
+
+    def observe_queue(self, items: list[dict[str, Any]], now: Optional[float] = None):
+        """Record a queue snapshot (the "queue" list of ``workflow queue``)."""
+        now = now or time.time()
+        ids = {item.get("source_id") for item in items}
+        ids.discard(None)
+        for source_id in ids:
+            # A cached snapshot may still list a task the executor has started
+            if source_id not in self._enqueued and source_id not in self._running:
+                left = self._left.pop(source_id, None)
+                self._enqueued[source_id] = left[0] if left else now
+        for source_id in [s for s in self._enqueued if s not in ids]:
+            self._left[source_id] = (self._enqueued.pop(source_id), now)
+        for source_id in [s for s, (_, left) in self._left.items() if now - left > LEFT_GRACE]:
+            del self._left[source_id]
+
+    def observe_executor(self, status: dict[str, Any], now: Optional[float] = None):
+        """Record an executor status snapshot (its "running_tasks")."""
+        now = now or time.time()
+        if self._since is None:
+            self._since = now
+        if not status.get("running"):
+            # Tasks cut short by stopping the executor say nothing about run times
+            self._running.clear()
+            return
+        tasks = {task.get("source_id"): task for task in status.get("running_tasks") or []}
+        tasks.pop(None, None)
+        self._trim(now)
+
+        for source_id, task in tasks.items():
+            if source_id in self._running:
+                kind, started, _ = self._running[source_id]
+                self._running[source_id] = (kind, started, now)
+                continue
+            kind = task.get("type") or "unknown"
+            started = now - float(task.get("runtime_seconds") or 0)
+            self._running[source_id] = (kind, started, now)
+            enqueued = self._enqueued.pop(source_id, None)
+            left = self._left.pop(source_id, None)
+            if enqueued is None and left:
+                enqueued = left[0]
+            if enqueued is not None and started >= enqueued:
+                for stats in (self._all, self._type(kind)):
+                    stats.waits.add(started, started - enqueued)
+
+        for source_id in [s for s in self._running if s not in tasks]:
+            kind, started, seen = self._running.pop(source_id)
+            if now - seen > MAX_POLL_GAP:
+                continue
+            finished = (seen + now) / 2
+            for stats in (self._all, self._type(kind)):
+                stats.durations.add(finished, finished - started)
+
+    # -------------------- results --------------------
+
+    def _mean_duration(self, kind: str) -> Optional[float]:
+        stats = self._stats.get(kind)
+        mean = stats.durations.mean if stats else None
+        return mean if mean is not None else self._all.durations.mean
+
+    def estimate(
+        self, items: list[dict[str, Any]], executor: Optional[dict[str, Any]], now: Optional[float] = None
+    ) -> list[dict[str, Any]]:
+        """Queue items with enqueued_at, wait_seconds, estimated_start and estimated_finish.
+
+        Estimates are None while the executor is stopped or no run time has
+        been seen yet. Cost is O(queue length x log slots).
+        """
+        now = now or time.time()
+        slots: Optional[list[float]] = None
+        if executor and executor.get("running") and self._all.durations.count:
+            slots = []
+            for kind, started, _ in self._running.values():
+                slots.append(max(now, started + self._mean_duration(kind)))
+            free = max(int(executor.get("max_parallel") or 1) - len(slots), 0)
+            slots.extend([now] * free)
+            if not slots:
+                slots = [now]
+            heapq.heapify(slots)
+
+        result = []
+        for item in items:
+            enqueued = self._enqueued.get(item.get("source_id"))
+            start = finish = None
+            if slots is not None:
+                start = heapq.heappop(slots)
+                finish = start + self._mean_duration(item.get("type") or "unknown")
+                heapq.heappush(slots, finish)
+            result.append({
+                **item,
+                "enqueued_at": _iso(enqueued),
+                "wait_seconds": round(now - enqueued, 1) if enqueued is not None else None,
+                "estimated_start": _iso(start),
+                "estimated_finish": _iso(finish),
+            })
+        return result
+
+    def stats(self, now: Optional[float] = None) -> dict[str, Any]:
+        """Rolling throughput and latency, overall and per workflow type."""
+        now = now or time.time()
+        self._trim(now)
+        # Until a full window has been observed, rates are over what was
+        hours = max(min(WINDOW, now - (self._since or now)), 60.0) / 3600
+
+        def summary(stats: _TypeStats) -> dict[str, Any]:
+            mean_wait, mean_duration = stats.waits.mean, stats.durations.mean
+            return {
+                "completed": stats.durations.count,
+                "throughput_per_hour": round(stats.durations.count / hours, 2),
+                "mean_wait_seconds": round(mean_wait, 1) if mean_wait is not None else None,
+                "mean_duration_seconds": round(mean_duration, 1) if mean_duration is not None else None,
+            }
+
+        return {
+            "window_seconds": WINDOW,
+            "queued": len(self._enqueued),
+            "running": len(self._running),
+            "overall": summary(self._all),
+            "types": {kind: summary(stats) for kind, stats in sorted(self._stats.items())},
+        }
+
+
+# Singleton instance
+queue_analytics = QueueAnalytics()
@@ -0,0 +1,258 @@
+"""Terminal session recording in asciicast v2 format with a seek index.
+
+Each recording is three files in ``settings.recordings_dir/<task_id>/``:
+
+- ``<name>.cast``: standard asciicast v2 (header line, then ``[t, "o"|"r", data]``
+  events), playable by any asciicast player
+- ``<name>.kf``: zlib-compressed screen keyframes (the session scrollback at
+  that moment), concatenated
+- ``<name>.idx``: one JSON line per keyframe with its time, the byte offset of
+  the next event in the .cast file and the keyframe's location in the .kf file
+
+Seeking to time t reads the last keyframe before t and only the events after
+it, so cost is bounded no matter how long the recording is.
+
+All file I/O happens on a per-recorder writer thread; the event loop only
+enqueues events.
+"""
+
+import bisect
+import codecs
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+KEYFRAME_INTERVAL = 30.0  # Seconds of activity between keyframes
+WRITE_BUFFER_SIZE = 64 * 1024
+FLUSH_INTERVAL = 1.0  # Flush buffered events at least this often while idle
+
+_CLOSE = object()
+
+
+def recordings_root() -> Path:
+    return Path(os.path.expanduser(settings.recordings_dir))
+
+
+def _safe_name(value: str) -> bool:
+    """A single path component that stays inside its parent directory."""
+    return bool(value) and "/" not in value and "\0" not in value and not value.startswith(".")
+
+
+class SessionRecorder:
+    """Appends a session's output and resizes to an asciicast v2 file."""
+
+    def __init__(self, task_id: str, cols: int = 80, rows: int = 24):
+        if not _safe_name(task_id):
+            raise ValueError(f"Invalid task id for a recording: {task_id!r}")
+        self.task_id = task_id
+        started = datetime.now(timezone.utc)
+        self.name = started.strftime("%Y%m%dT%H%M%SZ")
+        directory = recordings_root() / task_id
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / f"{self.name}.cast"
+
+        self._started = time.monotonic()
+        self._last_keyframe = 0.0
+        self._output_since_keyframe = False
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        header = {
+            "version": 2,
+            "width": cols,
+            "height": rows,
+            "timestamp": int(started.timestamp()),
+            "title": task_id,
+            "env": {"TERM": "xterm-256color"},
+        }
+        self._thread = threading.Thread(
+            target=self._writer, args=(header,), name=f"recorder-{task_id}", daemon=True
+        )
+        self._thread.start()
+        logger.info("Recording session for task %s to %s", task_id, self.path)
+
+    def _now(self) -> float:
+        return time.monotonic() - self._started
+
+    # -------------------- event loop side --------------------
+
+    def output(self, data: bytes):
+        self._queue.put(("o", self._now(), data))
+        self._output_since_keyframe = True
+
+    def resize(self, rows: int, cols: int):
+        self._queue.put(("r", self._now(), f"{cols}x{rows}"))
+
+    def keyframe_due(self) -> bool:
+        return self._output_since_keyframe and self._now() - self._last_keyframe >= KEYFRAME_INTERVAL
+
+    def keyframe(self, screen: bytes):
+        """Record a screen snapshot that playback can start from."""
+        now = self._now()
+        self._last_keyframe = now
+        self._output_since_keyframe = False
+        self._queue.put(("k", now, screen))
+
+    def close(self):
+        self._queue.put(_CLOSE)
+
+    # -------------------- writer thread --------------------
+
+    def _writer(self, header: dict):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        try:
+            cast = open(self.path, "wb", buffering=WRITE_BUFFER_SIZE)
+            keyframes = open(self.path.with_suffix(".kf"), "wb")
+            index = open(self.path.with_suffix(".idx"), "w", encoding="utf-8")
+        except OSError as e:
+            logger.error("Cannot open recording %s: %s", self.path, e)
+            return
+
+        with cast, keyframes, index:
+            line = (json.dumps(header) + "\n").encode("utf-8")
+            cast.write(line)
+            offset = len(line)
+            kf_offset = 0
+
+            while True:
+                try:
+                    item = self._queue.get(timeout=FLUSH_INTERVAL)
+                except queue.Empty:
+                    cast.flush()
+                    index.flush()
+                    continue
+                if item is _CLOSE:
+                    break
+
+                kind, t, payload = item
+                t = round(t, 6)
+                if kind == "k":
+                    blob = zlib.compress(payload)
+                    keyframes.write(blob)
+                    keyframes.flush()
+                    index.write(json.dumps({
+                        "t": t, "offset": offset, "kf_offset": kf_offset, "kf_length": len(blob),
+                    }) + "\n")
+                    kf_offset += len(blob)
+                    continue
+
+                if kind == "o":
+                    payload = decoder.decode(payload)
+                    if not payload:
+                        continue
+                line = (json.dumps([t, kind, payload], ensure_ascii=False) + "\n").encode("utf-8")
+                cast.write(line)
+                offset += len(line)
+
+        logger.info("Recording closed: %s", self.path)
+
+
+# ==================== Playback ====================
+
+
+def list_recordings(task_id: Optional[str] = None) -> list[dict]:
+    """List recordings, newest first."""
+    root = recordings_root()
+    if not root.is_dir() or (task_id and not _safe_name(task_id)):
+        return []
+    directories = [root / task_id] if task_id else [d for d in root.iterdir() if d.is_dir()]
+    recordings = []
+    for directory in directories:
+        if not directory.is_dir():
+            continue
+        for cast in directory.glob("*.cast"):
+            stat = cast.stat()
+            recordings.append({
+                "task_id": directory.name,
+                "name": cast.stem,
+                "size": stat.st_size,
+                "modified": stat.st_mtime,
+            })
+    recordings.sort(key=lambda r: r["name"], reverse=True)
+    return recordings
+
+
+def recording_path(task_id: str, name: str) -> Optional[Path]:
+    """Resolve a recording's .cast path, refusing anything outside the root."""
+    if not (_safe_name(task_id) and _safe_name(name)):
+        return None
+    path = recordings_root() / task_id / f"{name}.cast"
+    return path if path.is_file() else None
+
+
+def _load_index(cast_path: Path) -> list[dict]:
+    index_path = cast_path.with_suffix(".idx")
+    if not index_path.is_file():
+        return []
+    entries = []
+    with open(index_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break  # Partially written last line of a live recording
+    return entries
+
+
+def seek_recording(cast_path: Path, start: float, duration: float) -> dict:
+    """Return the screen at `start` and the events in [start, start + duration).
+
+    The screen is rebuilt from the nearest keyframe at or before `start` plus
+    the output events between that keyframe and `start`, so the caller can
+    render it directly and then play the returned events.
+    """
+    entries = _load_index(cast_path)
+    times = [e["t"] for e in entries]
+    position = bisect.bisect_right(times, start) - 1
+
+    screen = b""
+    keyframe_t = 0.0
+    offset = None
+    if position >= 0:
+        entry = entries[position]
+        keyframe_t = entry["t"]
+        offset = entry["offset"]
+        with open(cast_path.with_suffix(".kf"), "rb") as kf:
+            kf.seek(entry["kf_offset"])
+            screen = zlib.decompress(kf.read(entry["kf_length"]))
+
+    end = start + duration
+    prefix: list[str] = []
+    events: list[list] = []
+    has_more = False
+    with open(cast_path, "rb") as cast:
+        header = json.loads(cast.readline())
+        if offset is not None:
+            cast.seek(offset)
+        for raw in cast:
+            try:
+                event = json.loads(raw)
+            except json.JSONDecodeError:
+                break  # Partially written last line of a live recording
+            t = event[0]
+            if t >= end:
+                has_more = True
+                break
+            if t < start:
+                if event[1] == "o":
+                    prefix.append(event[2])
+                continue
+            events.append(event)
+
+    return {
+        "header": header,
+        "start": start,
+        "keyframe_t": keyframe_t,
+        "screen": screen.decode("utf-8", errors="replace") + "".join(prefix),
+        "events": events,
+        "has_more": has_more,
+    }
@@ -0,0 +1,250 @@
+"""Read cache for ATW CLI results, shared by all workers through SQLite.
+
+Results are stored in a WAL-mode SQLite file (``settings.result_cache_path``)
+so every uvicorn worker reads what any one of them fetched. Entries expire
+after a TTL and belong to a namespace ("tasks", "workflow", "executor",
+"projects") with a generation counter:
+
+- ``invalidate(namespace)`` bumps the generation in the database, so the
+  change is seen by every worker on its next read without any messaging
+- an entry is stored with the generation current when its fetch *started*;
+  a fetch that races an invalidation therefore lands already stale
+
+Refreshes are single-flight: within a worker concurrent misses share one
+fetch, and across workers a lease row lets one worker run the CLI while the
+others wait for its result. Failed results are never cached.
+"""
+
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from app.config import settings
+from app.services.atw_client import ATWResult
+
+logger = logging.getLogger(__name__)
+
+LEASE_TIMEOUT = 35.0  # Longer than the CLI's own 30 s timeout
+LEASE_POLL_INTERVAL = 0.05
+BUSY_TIMEOUT_MS = 2000
+
+NAMESPACES = ("tasks", "workflow", "executor", "projects")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (namespace TEXT PRIMARY KEY, generation INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    stored REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_namespace ON results (namespace);
+CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, expires REAL NOT NULL);
+"""
+
+
+def _contended(error: Exception) -> bool:
+    """SQLITE_BUSY/SQLITE_LOCKED: a concurrent writer, gone by the next call."""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+class ResultCache:
+    """TTL + generation cache for ``ATWResult`` values (singleton)."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._disabled = False
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.result_cache_ttl > 0 and bool(settings.result_cache_path) and not self._disabled
+
+    # -------------------- database (worker threads) --------------------
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            path = os.path.expanduser(settings.result_cache_path)
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _generation(self, conn: sqlite3.Connection, namespace: str) -> int:
+        row = conn.execute("SELECT generation FROM generations WHERE namespace = ?", (namespace,)).fetchone()
+        return row[0] if row else 0
+
+    def _lookup(self, namespace: str, key: str, ttl: float) -> tuple[Optional[ATWResult], int]:
+        """Fresh cached result (or None) and the namespace's current generation."""
+        conn = self._db()
+        generation = self._generation(conn, namespace)
+        row = conn.execute(
+            "SELECT generation, stored, payload FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        if row and row[0] == generation and time.time() - row[1] < ttl:
+            return ATWResult(**json.loads(row[2])), generation
+        return None, generation
+
+    def _acquire_lease(self, key: str) -> bool:
+        conn = self._db()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM leases WHERE key = ? AND expires < ?", (key, now))
+            acquired = conn.execute(
+                "INSERT OR IGNORE INTO leases (key, expires) VALUES (?, ?)", (key, now + LEASE_TIMEOUT)
+            ).rowcount == 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return acquired
+
+    def _lease_held(self, key: str) -> bool:
+        row = self._db().execute("SELECT expires FROM leases WHERE key = ?", (key,)).fetchone()
+        return bool(row) and row[0] >= time.time()
+
+    def _store(self, namespace: str, key: str, generation: int, result: Optional[ATWResult]):
+        """Save a successful result and release the lease in one transaction."""
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if result is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, namespace, generation, stored, payload) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, namespace, generation, time.time(), json.dumps(dataclasses.asdict(result))),
+                )
+            conn.execute("DELETE FROM leases WHERE key = ?", (key,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _invalidate(self, namespaces: tuple[str, ...]):
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for namespace in namespaces:
+                conn.execute(
+                    "INSERT INTO generations (namespace, generation) VALUES (?, 1) "
+                    "ON CONFLICT (namespace) DO UPDATE SET generation = generation + 1",
+                    (namespace,),
+                )
+                conn.execute("DELETE FROM results WHERE namespace = ?", (namespace,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # -------------------- public API --------------------
+
+    async def fetch(
+        self,
+        namespace: str,
+        func: Callable[..., ATWResult],
+        *args: Any,
+        ttl: Optional[float] = None,
+        **kwargs: Any,
+    ) -> ATWResult:
+        """Return func(*args, **kwargs), from the cache when fresh.
+
+        The CLI call runs in a worker thread either way.
+        """
+        if not self.enabled:
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+        key = f"{func.__name__}:{json.dumps([args, kwargs], sort_keys=True, default=str)}"
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(
+                self._get_or_refresh(namespace, key, ttl or settings.result_cache_ttl, func, args, kwargs)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded: one caller going away must not cancel the fetch others share
+        return await asyncio.shield(task)
+
+    async def _get_or_refresh(
+        self, namespace: str, key: str, ttl: float, func: Callable[..., ATWResult], args: tuple, kwargs: dict
+    ) -> ATWResult:
+        try:
+            deadline = time.monotonic() + LEASE_TIMEOUT
+            while True:
+                cached, generation = await asyncio.to_thread(self._lookup, namespace, key, ttl)
+                if cached is not None:
+                    self.hits += 1
+                    return cached
+                if await asyncio.to_thread(self._acquire_lease, key):
+                    break
+                # Another worker is refreshing this key; wait for its result
+                await asyncio.sleep(LEASE_POLL_INTERVAL)
+                if time.monotonic() > deadline or not await asyncio.to_thread(self._lease_held, key):
+                    cached, generation = await asyncio.to_thread(self._lookup, namespace, key, ttl)
+                    if cached is not None:
+                        self.hits += 1
+                        return cached
+                    if time.monotonic() > deadline:
+                        break  # Give up waiting and run the command ourselves
+        except (sqlite3.Error, OSError) as e:
+            if _contended(e):
+                # Another worker holds the database; only this call goes without the cache
+                logger.debug("Result cache busy, bypassing it: %s", e)
+            else:
+                logger.warning("Result cache unavailable, disabling it: %s", e)
+                self._disabled = True
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+        self.misses += 1
+        result = None
+        try:
+            result = await asyncio.to_thread(func, *args, **kwargs)
+            return result
+        finally:
+            try:
+                await asyncio.to_thread(
+                    self._store, namespace, key, generation, result if result and result.success else None
+                )
+            except sqlite3.Error as e:
+                logger.warning("Result cache write failed: %s", e)
+
+    async def invalidate(self, *namespaces: str):
+        """Expire every cached result in `namespaces` (default: all), in all workers."""
+        if not self.enabled:
+            return
+        try:
+            await asyncio.to_thread(self._invalidate, namespaces or NAMESPACES)
+        except sqlite3.Error as e:
+            logger.warning("Result cache invalidation failed: %s", e)
+
+    def stats(self) -> dict[str, Any]:
+        return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses, "inflight": len(self._inflight)}
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+# Singleton instance
+result_cache = ResultCache()
@@ -31,11 +31,25 @@ export default function SessionPage({ params }: PageProps) {
     [write]
   );
 
-  const handleReady = useCallback(() => {
-    // Use immediate write for status messages
-    writeImmediate("\r\n\x1b[32mSession started. Interact with Claude below.\x1b[0m\r\n\r\n");
-    focus();
-  }, [writeImmediate, focus]);
+  const handleReplay = useCallback(
+    (data: string) => {
+      // Reattached: reset the screen, then redraw from the server's scrollback
+      writeImmediate("\x1bc");
+      write(data);
+    },
+    [write, writeImmediate]
+  );
+
+  const handleReady = useCallback(
+    (resumed: boolean) => {
+      // Use immediate write for status messages
+      if (!resumed) {
+        writeImmediate("\r\n\x1b[32mSession started. Interact with Claude below.\x1b[0m\r\n\r\n");
+      }
+      focus();
+    },
+    [writeImmediate, focus]
+  );
 
   const handleExit = useCallback(
     (code: number) => {
@@ -51,10 +65,11 @@ export default function SessionPage({ params }: PageProps) {
     [writeImmediate]
   );
 
-  const { status, connect, disconnect, sendInput, sendResize, stop } =
+  const { status, writer, connect, disconnect, sendInput, sendResize, stop } =
     useTerminalSession({
       taskId,
       onOutput: handleOutput,
+      onReplay: handleReplay,
       onReady: handleReady,
       onExit: handleExit,
       onError: handleError,
@@ -167,12 +182,15 @@ export default function SessionPage({ params }: PageProps) {
             {getStatusLabel()}
           </Badge>
 
+          {/* Another window holds input control */}
+          {status === "connected" && !writer && <Badge variant="warning">View only</Badge>}
+
           {/* Stop button */}
           <Button
             variant="destructive"
             size="sm"
             onClick={handleStop}
-            disabled={status !== "connected"}
+            disabled={status !== "connected" || !writer}
           >
             <Square className="h-4 w-4 mr-2" />
             Stop Session
@@ -21,6 +21,9 @@ interface NotificationEvent {
   new_status?: string;
   detail?: string;
   timestamp?: string;
+  seq?: number;
+  merged?: number;
+  events?: NotificationEvent[];
 }
 
 function getWsUrl(): string {
@@ -35,6 +38,7 @@ function getWsUrl(): string {
 }
 
 function buildToastMessage(event: NotificationEvent): string {
+  if (event.type === "batch") return event.detail ?? "Tasks updated";
   const label = event.task_id || "Task";
   if (event.detail) return `${label}: ${event.detail}`;
   if (event.new_status) return `${label} → ${event.new_status}`;
@@ -47,6 +51,8 @@ export function useNotifications() {
   const wsRef = useRef<WebSocket | null>(null);
   const swRef = useRef<SwReg>(null);
   const reconnectTimer = useRef<ReturnType<typeof setTimeout> | undefined>(undefined);
+  // Last event sequence number seen; reconnects ask only for what came after
+  const lastSeqRef = useRef<number | null>(null);
   const queryClient = useQueryClient();
   const { showToast } = useToast();
 
@@ -76,6 +82,12 @@ export function useNotifications() {
     setBrowserPermission(result);
   }, []);
 
+  const invalidateAll = useCallback(() => {
+    queryClient.invalidateQueries({ queryKey: ["tasks"] });
+    queryClient.invalidateQueries({ queryKey: ["workflow"] });
+    queryClient.invalidateQueries({ queryKey: ["executor"] });
+  }, [queryClient]);
+
   const handleEvent = useCallback(
     (event: NotificationEvent) => {
       if (event.type === "ping" || event.type === "connected") return;
@@ -98,11 +110,9 @@ export function useNotifications() {
       }
 
       // Invalidate React Query caches for instant UI refresh
-      queryClient.invalidateQueries({ queryKey: ["tasks"] });
-      queryClient.invalidateQueries({ queryKey: ["workflow"] });
-      queryClient.invalidateQueries({ queryKey: ["executor"] });
+      invalidateAll();
     },
-    [queryClient, showToast],
+    [invalidateAll, showToast],
   );
 
   useEffect(() => {
@@ -117,7 +127,8 @@ export function useNotifications() {
       if (disposed) return;
 
       setStatus("connecting");
-      const ws = new WebSocket(url);
+      const since = lastSeqRef.current;
+      const ws = new WebSocket(since === null ? url : `${url}?since=${since}`);
       wsRef.current = ws;
 
       ws.onopen = () => {
@@ -134,6 +145,34 @@ export function useNotifications() {
             ws.send(JSON.stringify({ type: "pong" }));
             return;
           }
+          if (data.type === "connected") {
+            lastSeqRef.current ??= data.seq ?? null;
+            return;
+          }
+          if (data.type === "resync") {
+            // Missed events are gone from the server buffer; refetch everything
+            lastSeqRef.current = data.seq ?? null;
+            invalidateAll();
+            return;
+          }
+          if (data.type === "batch") {
+            // Coalesced burst: one toast and one refetch for the whole frame
+            const events = data.events ?? [];
+            for (const event of events) {
+              if (event.seq !== undefined) {
+                lastSeqRef.current = Math.max(lastSeqRef.current ?? 0, event.seq);
+              }
+            }
+            if (events.length === 1) {
+              handleEvent(events[0]);
+            } else if (events.length > 1) {
+              handleEvent({ type: "batch", detail: `${events.length} tasks updated` });
+            }
+            return;
+          }
+          if (data.seq !== undefined) {
+            lastSeqRef.current = Math.max(lastSeqRef.current ?? 0, data.seq);
+          }
           console.log("[WS] Received event:", data.type, data.detail);
           handleEvent(data);
           console.log("[WS] Event handled OK");
@@ -165,7 +204,7 @@ export function useNotifications() {
         wsRef.current = null;
       }
     };
-  }, [handleEvent]);
+  }, [handleEvent, invalidateAll]);
 
   return { status, browserPermission, requestPermission };
 }
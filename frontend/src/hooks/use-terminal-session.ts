@@ -8,18 +8,32 @@ import { useEffect, useRef, useCallback, useState } from "react";
 
 type SessionStatus = "connecting" | "connected" | "disconnected" | "error";
 
+// Binary frame types (first byte of every binary WebSocket message)
+const FRAME_OUTPUT = 0x00;
+const FRAME_REPLAY = 0x01;
+// Client -> server: FRAME_INPUT byte + raw stdin bytes
+const FRAME_INPUT = 0x00;
+const inputEncoder = new TextEncoder();
+
+// Reattach after an unexpected drop (phone lock, network switch)
+const RECONNECT_DELAY_MS = 1000;
+const MAX_RECONNECT_ATTEMPTS = 10;
+
 interface TerminalMessage {
-  type: "output" | "ready" | "exit" | "error";
+  type: "output" | "replay" | "ready" | "exit" | "error" | "role";
   data?: string;
   message?: string;
   code?: number;
   task_id?: string;
+  resumed?: boolean;
+  writer?: boolean;
 }
 
 interface UseTerminalSessionOptions {
   taskId: string;
   onOutput?: (data: string) => void;
-  onReady?: () => void;
+  onReplay?: (data: string) => void;
+  onReady?: (resumed: boolean) => void;
   onExit?: (code: number) => void;
   onError?: (message: string) => void;
 }
@@ -27,38 +41,74 @@ interface UseTerminalSessionOptions {
 export function useTerminalSession({
   taskId,
   onOutput,
+  onReplay,
   onReady,
   onExit,
   onError,
 }: UseTerminalSessionOptions) {
   const wsRef = useRef<WebSocket | null>(null);
   const [status, setStatus] = useState<SessionStatus>("disconnected");
-  const callbacksRef = useRef({ onOutput, onReady, onExit, onError });
+  // False while another window holds input control (read-only viewer)
+  const [writer, setWriter] = useState(true);
+  const callbacksRef = useRef({ onOutput, onReplay, onReady, onExit, onError });
+  // Set when the session ended or the user closed it; suppresses reconnects
+  const finishedRef = useRef(false);
+  const reconnectAttemptsRef = useRef(0);
+  const reconnectTimer = useRef<ReturnType<typeof setTimeout> | undefined>(undefined);
+  const connectRef = useRef<() => void>(() => {});
 
   // Update callbacks ref to avoid stale closures
   useEffect(() => {
-    callbacksRef.current = { onOutput, onReady, onExit, onError };
-  }, [onOutput, onReady, onExit, onError]);
+    callbacksRef.current = { onOutput, onReplay, onReady, onExit, onError };
+  }, [onOutput, onReplay, onReady, onExit, onError]);
 
   const getWsUrl = useCallback(() => {
     if (typeof window === "undefined") return "";
     const protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
     const hostname = window.location.hostname;
-    return `${protocol}//${hostname}:8000/ws/session/${taskId}`;
+    return `${protocol}//${hostname}:8000/ws/session/${taskId}?encoding=binary`;
   }, [taskId]);
 
+  const emitReplay = useCallback((data: string) => {
+    const { onReplay: replay, onOutput: output } = callbacksRef.current;
+    if (replay) {
+      replay(data);
+    } else {
+      output?.(data);
+    }
+  }, []);
+
   const connect = useCallback(() => {
     if (wsRef.current?.readyState === WebSocket.OPEN) return;
 
+    finishedRef.current = false;
     setStatus("connecting");
     const ws = new WebSocket(getWsUrl());
+    ws.binaryType = "arraybuffer";
     wsRef.current = ws;
+    // Streaming decoder keeps multibyte characters split across frames intact
+    const decoder = new TextDecoder("utf-8");
 
     ws.onopen = () => {
       setStatus("connected");
+      reconnectAttemptsRef.current = 0;
     };
 
     ws.onmessage = (event) => {
+      if (event.data instanceof ArrayBuffer) {
+        const frame = new Uint8Array(event.data);
+        if (frame.length < 2) return;
+        if (frame[0] === FRAME_OUTPUT) {
+          const text = decoder.decode(frame.subarray(1), { stream: true });
+          if (text) {
+            callbacksRef.current.onOutput?.(text);
+          }
+        } else if (frame[0] === FRAME_REPLAY) {
+          emitReplay(new TextDecoder("utf-8").decode(frame.subarray(1)));
+        }
+        return;
+      }
+
       try {
         const message: TerminalMessage = JSON.parse(event.data);
 
@@ -68,10 +118,20 @@ export function useTerminalSession({
               callbacksRef.current.onOutput?.(message.data);
             }
             break;
+          case "replay":
+            if (message.data) {
+              emitReplay(message.data);
+            }
+            break;
           case "ready":
-            callbacksRef.current.onReady?.();
+            setWriter(message.writer ?? true);
+            callbacksRef.current.onReady?.(message.resumed ?? false);
+            break;
+          case "role":
+            setWriter(message.writer ?? false);
             break;
           case "exit":
+            finishedRef.current = true;
             callbacksRef.current.onExit?.(message.code ?? 0);
             setStatus("disconnected");
             break;
@@ -91,11 +151,25 @@ export function useTerminalSession({
     };
 
     ws.onclose = () => {
+      if (wsRef.current !== ws) return;
+      wsRef.current = null;
       setStatus("disconnected");
+
+      // The server keeps the process alive for a grace period; reattach
+      if (!finishedRef.current && reconnectAttemptsRef.current < MAX_RECONNECT_ATTEMPTS) {
+        reconnectAttemptsRef.current += 1;
+        reconnectTimer.current = setTimeout(() => connectRef.current(), RECONNECT_DELAY_MS);
+      }
     };
-  }, [getWsUrl]);
+  }, [getWsUrl, emitReplay]);
+
+  useEffect(() => {
+    connectRef.current = connect;
+  }, [connect]);
 
   const disconnect = useCallback(() => {
+    finishedRef.current = true;
+    clearTimeout(reconnectTimer.current);
     if (wsRef.current) {
       // Send stop signal before closing so the backend kills the PTY process
       if (wsRef.current.readyState === WebSocket.OPEN) {
@@ -109,7 +183,11 @@ export function useTerminalSession({
 
   const sendInput = useCallback((data: string) => {
     if (wsRef.current?.readyState === WebSocket.OPEN) {
-      wsRef.current.send(JSON.stringify({ type: "input", data }));
+      const bytes = inputEncoder.encode(data);
+      const frame = new Uint8Array(bytes.length + 1);
+      frame[0] = FRAME_INPUT;
+      frame.set(bytes, 1);
+      wsRef.current.send(frame);
     }
   }, []);
 
@@ -120,6 +198,7 @@ export function useTerminalSession({
   }, []);
 
   const stop = useCallback(() => {
+    finishedRef.current = true;
     if (wsRef.current?.readyState === WebSocket.OPEN) {
       wsRef.current.send(JSON.stringify({ type: "stop" }));
     }
@@ -128,12 +207,15 @@ export function useTerminalSession({
   // Cleanup on unmount
   useEffect(() => {
     return () => {
+      finishedRef.current = true;
+      clearTimeout(reconnectTimer.current);
       wsRef.current?.close();
     };
   }, []);
 
   return {
     status,
+    writer,
     connect,
     disconnect,
     sendInput,
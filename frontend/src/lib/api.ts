@@ -91,6 +91,49 @@ async function request<T>(
   }
 }
 
+// ==================== Jobs ====================
+
+interface Job {
+  job_id: string;
+  kind: string;
+  task_id: string | null;
+  label: string;
+  status: "queued" | "running" | "succeeded" | "failed" | "cancelled";
+  created_at: number;
+  started_at: number | null;
+  finished_at: number | null;
+  error: string | null;
+  stream: boolean;
+  deduplicated?: boolean;
+}
+
+const JOB_POLL_INTERVAL = 1000;
+
+export const jobsApi = {
+  list: (): Promise<{ jobs: Job[] }> => request("/api/jobs"),
+
+  get: (jobId: string): Promise<Job> => request(`/api/jobs/${jobId}`),
+
+  result: (jobId: string): Promise<any> => request(`/api/jobs/${jobId}/result`),
+
+  cancel: (jobId: string): Promise<Job> => request(`/api/jobs/${jobId}`, { method: "DELETE" }),
+
+  // EventSource URL for a streamed job's output lines (fix, timesheet, data sync)
+  outputUrl: (jobId: string, after = 0): string =>
+    `${getApiBaseUrl()}/api/jobs/${jobId}/output?after=${after}`,
+};
+
+// Long operations answer 202 with a job; resolve with the job's result once it
+// finishes, so callers see the same response as before
+async function runJob(endpoint: string, options: RequestOptions = {}): Promise<any> {
+  let job = await request<Job>(endpoint, options);
+  while (job.status === "queued" || job.status === "running") {
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL));
+    job = await jobsApi.get(job.job_id);
+  }
+  return jobsApi.result(job.job_id);
+}
+
 // ==================== Tasks API ====================
 
 export const tasksApi = {
@@ -123,6 +166,11 @@ export const tasksApi = {
     return `${getApiBaseUrl()}/api/tasks/${taskId}/files/raw?${params}`;
   },
 
+  archiveUrl: (taskId: string, path?: string): string => {
+    const params = new URLSearchParams(path ? { path } : {});
+    return `${getApiBaseUrl()}/api/tasks/${taskId}/files/archive?${params}`;
+  },
+
   approve: (taskId: string): Promise<any> =>
     request(`/api/tasks/${taskId}/approve`, { method: "POST" }),
 
@@ -148,7 +196,7 @@ export const tasksApi = {
     }),
 
   categorize: (taskId: string): Promise<any> =>
-    request(`/api/tasks/${taskId}/categorize`, { method: "POST" }),
+    runJob(`/api/tasks/${taskId}/categorize`, { method: "POST" }),
 
   delete: (taskId: string): Promise<any> =>
     request(`/api/tasks/${taskId}`, { method: "DELETE" }),
@@ -180,6 +228,8 @@ export const projectsApi = {
 export const workflowApi = {
   queue: (): Promise<any> => request("/api/workflow/queue"),
 
+  queueStats: (): Promise<any> => request("/api/workflow/queue/stats"),
+
   clearQueue: (): Promise<any> => request("/api/workflow/queue", { method: "DELETE" }),
 
   types: (): Promise<any> => request("/api/workflow/types"),
@@ -208,13 +258,12 @@ export const workflowApi = {
     }),
 
   fix: (taskId: string): Promise<any> =>
-    request(`/api/workflow/fix/${taskId}`, { method: "POST", timeout: 180000 }), // 3 min
+    runJob(`/api/workflow/fix/${taskId}`, { method: "POST" }),
 
   timesheet: (taskId: string, prompt: string, dryRun: boolean = false): Promise<any> =>
-    request(`/api/workflow/timesheet/${taskId}`, {
+    runJob(`/api/workflow/timesheet/${taskId}`, {
       method: "POST",
       body: JSON.stringify({ prompt, dry_run: dryRun }),
-      timeout: 180000, // 3 min
     }),
 };
 
@@ -230,7 +279,7 @@ export const executorApi = {
   stopTask: (taskId: string): Promise<any> =>
     request(`/api/executor/stop-task/${taskId}`, { method: "POST" }),
 
-  runAll: (): Promise<any> => request("/api/executor/run-all", { method: "POST" }),
+  runAll: (): Promise<any> => runJob("/api/executor/run-all", { method: "POST" }),
 };
 
 // ==================== Logs API ====================
@@ -250,12 +299,12 @@ export const syncApi = {
     to_remote?: boolean;
     from_remote?: boolean;
   }): Promise<any> =>
-    request("/api/sync/data", {
+    runJob("/api/sync/data", {
       method: "POST",
       body: JSON.stringify(options || {}),
     }),
 
-  tasks: (): Promise<any> => request("/api/sync/tasks", { method: "POST" }),
+  tasks: (): Promise<any> => runJob("/api/sync/tasks", { method: "POST" }),
 };
 
 // ==================== Health API ====================
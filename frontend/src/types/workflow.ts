@@ -23,6 +23,9 @@ export interface ExecutorStatus {
   tasks_processed: number;
   tasks_completed: number;
   tasks_failed: number;
+  pid?: number | null;
+  cpu_percent?: number | null; // Executor process, from /proc (null on the first sample)
+  rss_bytes?: number;
 }
 
 export interface QueueItem {
@@ -33,6 +36,11 @@ export interface QueueItem {
   priority: number;
   status: string;
   project: string;
+  // Analytics; estimates are null until a run time has been observed
+  enqueued_at: string | null;
+  wait_seconds: number | null;
+  estimated_start: string | null;
+  estimated_finish: string | null;
 }
 
 export interface QueueStatus {
@@ -40,6 +48,21 @@ export interface QueueStatus {
   total: number;
 }
 
+export interface QueueTypeStats {
+  completed: number;
+  throughput_per_hour: number;
+  mean_wait_seconds: number | null;
+  mean_duration_seconds: number | null;
+}
+
+export interface QueueStats {
+  window_seconds: number;
+  queued: number;
+  running: number;
+  overall: QueueTypeStats;
+  types: Record<string, QueueTypeStats>;
+}
+
 export interface WorkflowType {
   name: string;
   enabled: boolean;